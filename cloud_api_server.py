@@ -2,15 +2,31 @@
 云端数据API服务器
 提供RESTful API供本地客户端调用
 """
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 import sqlite3
 import json
 from datetime import datetime, timedelta
 import os
+import sys
 import gzip
 import io
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'storage'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'collectors'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'ui'))
+from columnar_archive import (COLUMNAR_DIR, TABLES as COLUMNAR_TABLES, day_path, list_files,
+                              read as read_columnar, to_parquet_bytes)
+from database import connect_reader
+from export_stream import FORMATS as EXPORT_FORMATS, TIME_COLUMNS, ExportPage
+from indicator_store import query_history
+from live_feed import SSE_HEADERS, get_hub
+from orderbook_codec import decode_row
+from replication import changes as table_changes, tables_info
+from response_cache import ResponseCache
+from snapshot import SNAPSHOT_DIR, building as building_snapshot, last_error, request_snapshot, snapshot_path
+from trade_rollup import flow_totals
+
 app = Flask(__name__)
 CORS(app)  # 允许跨域访问
 
@@ -18,9 +34,7 @@ DB_PATH = 'crypto_data.db'
 
 def get_db():
     """获取数据库连接"""
-    db = sqlite3.connect(DB_PATH)
-    db.row_factory = sqlite3.Row
-    return db
+    return connect_reader(DB_PATH, row_factory=sqlite3.Row)
 
 # ==================== 健康检查 ====================
 @app.route('/health', methods=['GET'])
@@ -100,6 +114,28 @@ def get_latest_price(symbol):
             'message': 'No data found'
         }), 404
 
+@app.route('/api/events', methods=['GET'])
+def live_events():
+    """
+    实时推送（Server-Sent Events）：price（最新价、买卖比、最近成交）和 kline（新收盘K线）
+    数据来自采集进程的推送（本机组播或 LIVE_FEED_DIR 中的 Unix 套接字，见 live_feed），每个连接只读内存，不查询数据库
+    参数: symbols=ethusdt,btcusdt（默认全部）
+    """
+    symbols = request.args.get('symbols')
+    symbols = [s.strip().lower() for s in symbols.split(',') if s.strip()] if symbols else None
+    try:
+        hub = get_hub()
+    except OSError as e:
+        return jsonify({'status': 'error', 'message': f'Live feed unavailable: {e}'}), 503
+    stream = hub.stream(symbols)
+    if stream is None:
+        # 连接数达到上限（见 live_feed.MAX_STREAMS），浏览器退回轮询
+        response = jsonify({'status': 'error', 'message': 'Too many live connections'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    return Response(stream_with_context(stream), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 # ==================== 交易数据 ====================
 @app.route('/api/trades/<symbol>', methods=['GET'])
 def get_trades(symbol):
@@ -139,6 +175,24 @@ def get_trades(symbol):
     })
 
 # ==================== K线数据 ====================
+# 滚动窗口 -> 毫秒
+FLOW_WINDOWS = {'1m': 60000, '5m': 300000, '15m': 900000, '1h': 3600000, '4h': 14400000}
+
+@app.route('/api/flow/<symbol>', methods=['GET'])
+def get_trade_flow(symbol):
+    """获取主动买卖量汇总（1m/5m/15m/1h/4h 窗口，读每分钟汇总表）"""
+    windows = request.args.get('windows', ','.join(FLOW_WINDOWS)).split(',')
+    
+    db = get_db()
+    flow = {name: flow_totals(db, symbol.lower(), FLOW_WINDOWS[name]) for name in windows if name in FLOW_WINDOWS}
+    db.close()
+    
+    return jsonify({
+        'status': 'success',
+        'symbol': symbol,
+        'data': flow
+    })
+
 @app.route('/api/klines/<symbol>/<interval>', methods=['GET'])
 def get_klines(symbol, interval):
     """获取K线数据"""
@@ -175,6 +229,25 @@ def get_klines(symbol, interval):
         'data': klines
     })
 
+@app.route('/api/indicators/<symbol>/<interval>', methods=['GET'])
+def get_indicators(symbol, interval):
+    """获取技术指标历史（K线收盘时写入的快照）"""
+    limit = request.args.get('limit', 100, type=int)
+    start_time = request.args.get('start_time', type=int)
+    end_time = request.args.get('end_time', type=int)
+    
+    db = get_db()
+    indicators = query_history(db, symbol, interval, start_time, end_time, limit)
+    db.close()
+    
+    return jsonify({
+        'status': 'success',
+        'symbol': symbol,
+        'interval': interval,
+        'count': len(indicators),
+        'data': indicators
+    })
+
 # ==================== 合约数据 ====================
 @app.route('/api/futures/open_interest/<symbol>', methods=['GET'])
 def get_open_interest(symbol):
@@ -255,29 +328,98 @@ def get_long_short_ratio(symbol):
     })
 
 # ==================== 数据下载 ====================
+SNAPSHOT_RETRY_AFTER = 5    # 快照生成中时客户端的轮询间隔（秒）
+
+def _snapshot_building(name):
+    response = jsonify({'status': 'building', 'snapshot': name, 'message': 'Snapshot is being created'})
+    response.status_code = 202
+    response.headers['Retry-After'] = str(SNAPSHOT_RETRY_AFTER)
+    return response
+
 @app.route('/api/download/database', methods=['GET'])
 def download_database():
-    """下载整个数据库文件（压缩）"""
+    """
+    下载数据库快照（在线备份 API 生成的一致副本，压缩后落盘，见 snapshot）
+    参数: compression=gzip|zstd, snapshot=<名字>（续传时取回同一个快照）
+    没有可复用的快照时在后台生成并返回 202 和快照名（Retry-After 秒后再请求），不在请求线程里等待；
+    生成需要约 2 倍数据库大小的剩余磁盘空间，不足时返回 507
+    支持 Range / If-Range 断点续传；响应头 X-Snapshot 为快照名
+    """
     if not os.path.exists(DB_PATH):
         return jsonify({
             'status': 'error',
             'message': 'Database not found'
         }), 404
     
-    # 压缩数据库文件
-    memory_file = io.BytesIO()
-    with open(DB_PATH, 'rb') as f:
-        with gzip.GzipFile(fileobj=memory_file, mode='wb') as gz:
-            gz.write(f.read())
-    
-    memory_file.seek(0)
-    
-    return send_file(
-        memory_file,
-        mimetype='application/gzip',
+    name = request.args.get('snapshot')
+    if name:
+        path = snapshot_path(name, SNAPSHOT_DIR)
+        if path is None:
+            if building_snapshot(SNAPSHOT_DIR) == name:
+                return _snapshot_building(name)
+            if last_error(name):
+                return jsonify({'status': 'error', 'message': last_error(name)}), 500
+            return jsonify({'status': 'error', 'message': 'Snapshot expired'}), 404
+    else:
+        try:
+            path, name = request_snapshot(DB_PATH, SNAPSHOT_DIR, request.args.get('compression', 'gzip'))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 507
+        if path is None:
+            return _snapshot_building(name)
+    
+    name = os.path.basename(path)
+    response = send_file(
+        os.path.abspath(path),
+        mimetype='application/zstd' if name.endswith('.zst') else 'application/gzip',
         as_attachment=True,
-        download_name=f'crypto_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.db.gz'
+        download_name=name,
+        conditional=True
     )
+    response.headers['X-Snapshot'] = name
+    return response
+
+# ==================== 增量复制 ====================
+@app.route('/api/changes', methods=['GET'])
+def list_changes():
+    """可增量复制的表：复制方式、建表语句、唯一索引和当前高水位（见 replication）"""
+    db = get_db()
+    info = tables_info(db)
+    db.close()
+    return jsonify({
+        'status': 'success',
+        'server_time': int(datetime.now().timestamp() * 1000),
+        'tables': info
+    })
+
+@app.route('/api/changes/<table>', methods=['GET'])
+def get_changes(table):
+    """
+    高水位之后的一批行（列名 + 行数组，客户端支持时 gzip 压缩）
+    参数: after（id 表为上次的最大 id；原地更新的表为上次的最大 change_seq）, limit
+    """
+    after = request.args.get('after')
+    try:
+        after = json.loads(after) if after else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid after'}), 400
+    
+    db = connect_reader(DB_PATH)
+    try:
+        batch = table_changes(db, table, after, request.args.get('limit', 50000, type=int))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    finally:
+        db.close()
+    
+    body = json.dumps(batch, separators=(',', ':')).encode()
+    response = Response(body, mimetype='application/json')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 @app.route('/api/export/<table>', methods=['GET'])
 def export_table(table):
@@ -304,14 +446,18 @@ def export_table(table):
         query += ' WHERE symbol = ?'
         params.append(symbol.lower())
     
-    query += ' ORDER BY timestamp DESC LIMIT ?'
+    query += f' ORDER BY {TIME_COLUMNS[table]} DESC LIMIT ?'
     params.append(limit)
     
     cursor.execute(query, params)
     rows = cursor.fetchall()
     db.close()
     
-    data = [dict(row) for row in rows]
+    if table == 'orderbook':
+        # 二进制档位列还原为 bids/asks 列表
+        data = [decode_row(row) for row in rows]
+    else:
+        data = [dict(row) for row in rows]
     
     return jsonify({
         'status': 'success',
@@ -320,17 +466,129 @@ def export_table(table):
         'data': data
     })
 
+@app.route('/api/export/<table>/stream', methods=['GET'])
+def stream_export(table):
+    """
+    流式导出（NDJSON 或 CSV），按 (时间, id) 键集分页，边读游标边输出
+    参数: symbol（必填）, interval（klines/indicators 必填）, start_time, end_time（毫秒，左闭右开）,
+         format=ndjson|csv, limit（每页行数）, after（上一页的续传令牌）
+    响应头 X-Next-Token 为下一页的令牌，没有该响应头表示已经到末尾
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': 'format must be ndjson or csv'}), 400
+    
+    db = connect_reader(DB_PATH, check_same_thread=False, row_factory=sqlite3.Row)
+    try:
+        page = ExportPage(
+            db, table, request.args.get('symbol'),
+            start_time=request.args.get('start_time', type=int),
+            end_time=request.args.get('end_time', type=int),
+            after=request.args.get('after'),
+            limit=request.args.get('limit', 100000, type=int),
+            interval=request.args.get('interval')
+        )
+    except ValueError as e:
+        db.close()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    def generate():
+        try:
+            yield from page.chunks(fmt)
+        finally:
+            db.close()
+    
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    if page.next_token:
+        response.headers['X-Next-Token'] = page.next_token
+    return response
+
+# ==================== 列式归档 ====================
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+
+@app.route('/api/archive/<table>', methods=['GET'])
+def list_archive(table):
+    """已导出的 Parquet 文件列表（见 columnar_archive）"""
+    if table not in COLUMNAR_TABLES:
+        return jsonify({'status': 'error', 'message': 'Invalid table name'}), 400
+    
+    files = list_files(COLUMNAR_DIR, table, request.args.get('symbol'))
+    for item in files:
+        item['url'] = f"/api/archive/{table}/{item['symbol']}/{item['date']}"
+    
+    return jsonify({
+        'status': 'success',
+        'table': table,
+        'count': len(files),
+        'data': files
+    })
+
+@app.route('/api/archive/<table>/<symbol>/<date>', methods=['GET'])
+def download_archive_file(table, symbol, date):
+    """下载一个交易对一天的 Parquet 文件（支持 Range 断点续传和 If-Modified-Since）"""
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid date'}), 400
+    if table not in COLUMNAR_TABLES or not symbol.isalnum():
+        return jsonify({'status': 'error', 'message': 'Invalid table or symbol'}), 400
+    
+    path = day_path(COLUMNAR_DIR, table, symbol, date)
+    if not os.path.exists(path):
+        return jsonify({'status': 'error', 'message': 'Archive not found'}), 404
+    
+    return send_file(
+        os.path.abspath(path),
+        mimetype=PARQUET_MIMETYPE,
+        as_attachment=True,
+        download_name=f'{table}_{symbol.lower()}_{date}.parquet',
+        conditional=True
+    )
+
+@app.route('/api/archive/<table>/<symbol>', methods=['GET'])
+def get_archive_slice(table, symbol):
+    """
+    按时间范围和列读取归档切片，返回 Parquet
+    参数: start_time / end_time（毫秒）, columns（逗号分隔）
+    """
+    if table not in COLUMNAR_TABLES:
+        return jsonify({'status': 'error', 'message': 'Invalid table name'}), 400
+    start_time = request.args.get('start_time', type=int)
+    end_time = request.args.get('end_time', type=int)
+    columns = request.args.get('columns')
+    columns = columns.split(',') if columns else None
+    
+    try:
+        data = read_columnar(COLUMNAR_DIR, table, symbol, start_time, end_time, columns)
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 501
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    response = send_file(
+        io.BytesIO(to_parquet_bytes(data)),
+        mimetype=PARQUET_MIMETYPE,
+        as_attachment=True,
+        download_name=f'{table}_{symbol.lower()}_{start_time or 0}_{end_time or 0}.parquet'
+    )
+    response.headers['X-Row-Count'] = str(data.num_rows)
+    return response
+
 # ==================== 多币种聚合 ====================
+MULTI_SYMBOLS = ['ethusdt', 'btcusdt', 'bnbusdt', 'solusdt']
+
+# 聚合接口的响应缓存，采集进程写入新数据后按交易对失效（见 response_cache）
+cache = ResponseCache(feed=get_hub)
+
 @app.route('/api/multi/prices', methods=['GET'])
+@cache.cached(ttl=1, symbols=MULTI_SYMBOLS)
 def get_multi_prices():
     """获取所有币种的最新价格"""
-    symbols = ['ethusdt', 'btcusdt', 'bnbusdt', 'solusdt']
-    
     db = get_db()
     cursor = db.cursor()
     
     prices = {}
-    for symbol in symbols:
+    for symbol in MULTI_SYMBOLS:
         cursor.execute('''
             SELECT price, timestamp 
             FROM trades 
@@ -354,16 +612,15 @@ def get_multi_prices():
     })
 
 @app.route('/api/multi/summary', methods=['GET'])
+@cache.cached(ttl=2, symbols=MULTI_SYMBOLS)
 def get_multi_summary():
     """获取所有币种的综合数据摘要"""
-    symbols = ['ethusdt', 'btcusdt', 'bnbusdt', 'solusdt']
-    
     db = get_db()
     cursor = db.cursor()
     
     summary = {}
     
-    for symbol in symbols:
+    for symbol in MULTI_SYMBOLS:
         # 最新价格
         cursor.execute('''
             SELECT price, timestamp 
@@ -407,6 +664,11 @@ def get_multi_summary():
         'data': summary
     })
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """响应缓存命中统计（每个 worker 进程各自统计）"""
+    return jsonify({'status': 'success', 'pid': os.getpid(), 'data': cache.stats()})
+
 if __name__ == '__main__':
     # 生产环境使用 gunicorn 或 uwsgi
     # 开发环境可以直接运行
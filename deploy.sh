@@ -140,7 +140,7 @@ user=CURRENT_USER
 environment=PYTHONUNBUFFERED=1
 
 [program:api_server]
-command=gunicorn -w 4 -b 0.0.0.0:5001 cloud_api_server:app
+command=gunicorn -w 4 -k gthread --threads 32 -b 0.0.0.0:5001 cloud_api_server:app
 directory=/home/CURRENT_USER/crypto_collector
 autostart=true
 autorestart=true
@@ -3,11 +3,23 @@
 用于从云端服务器获取数据
 """
 import requests
+import csv
 import json
 import gzip
 import shutil
 from datetime import datetime
 import os
+import sqlite3
+import sys
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'storage'))
+from replication import advance, apply, load_state, prepare_local, start_position
 
 class CloudDataClient:
     def __init__(self, server_url='http://your-server-ip:5001'):
@@ -56,6 +68,23 @@ class CloudDataClient:
         response = self.session.get(f'{self.server_url}/api/klines/{symbol}/{interval}', params=params)
         return response.json()
     
+    def get_trade_flow(self, symbol='ethusdt', windows=None):
+        """获取主动买卖量汇总（windows 如 ['5m', '1h']，默认全部窗口）"""
+        params = {'windows': ','.join(windows)} if windows else {}
+        response = self.session.get(f'{self.server_url}/api/flow/{symbol}', params=params)
+        return response.json()
+    
+    def get_indicators(self, symbol='ethusdt', interval='1h', limit=100, start_time=None, end_time=None):
+        """获取技术指标历史"""
+        params = {'limit': limit}
+        if start_time:
+            params['start_time'] = start_time
+        if end_time:
+            params['end_time'] = end_time
+        
+        response = self.session.get(f'{self.server_url}/api/indicators/{symbol}/{interval}', params=params)
+        return response.json()
+    
     def get_open_interest(self, symbol='ethusdt', limit=100):
         """获取持仓量"""
         response = self.session.get(f'{self.server_url}/api/futures/open_interest/{symbol}', params={'limit': limit})
@@ -81,36 +110,146 @@ class CloudDataClient:
         response = self.session.get(f'{self.server_url}/api/multi/summary')
         return response.json()
     
-    def download_database(self, save_path='downloaded_data.db'):
-        """下载完整数据库"""
+    def download_database(self, save_path='downloaded_data.db', compression='gzip', max_retries=5, max_wait=3600):
+        """
+        下载数据库快照，传输中断后自动续传
+        服务器没有现成的快照时在后台生成并返回 202，这里按 Retry-After 轮询，最多等待 max_wait 秒；
+        未完成的数据保存在 <save_path>.gz.part，旁边的 .json 记录快照名和 ETag；
+        重试或下次调用时带 Range/If-Range 从断点继续，服务器上的快照已经过期则从头下载最新快照
+        compression: gzip 或 zstd（zstd 需要 zstandard 库）
+        """
         print("开始下载数据库...")
-        response = self.session.get(f'{self.server_url}/api/download/database', stream=True)
+        part_path = save_path + ('.zst' if compression == 'zstd' else '.gz') + '.part'
+        meta_path = part_path + '.json'
+        url = f'{self.server_url}/api/download/database'
         
-        if response.status_code == 200:
-            # 保存压缩文件
-            gz_path = save_path + '.gz'
-            with open(gz_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            print(f"下载完成，正在解压...")
+        attempt = 0
+        waited = 0
+        pending = None      # 服务器正在生成的快照名
+        while True:
+            meta = None
+            if os.path.exists(part_path) and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            params = {'compression': compression}
+            headers = {}
+            offset = 0
+            if meta:
+                offset = os.path.getsize(part_path)
+                params['snapshot'] = meta['snapshot']
+                headers = {'Range': f'bytes={offset}-', 'If-Range': meta['etag']}
+                print(f"从 {offset / 1024 / 1024:.1f} MB 处续传...")
+            elif pending:
+                params['snapshot'] = pending
             
-            # 解压
-            with gzip.open(gz_path, 'rb') as f_in:
-                with open(save_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-            
-            # 删除压缩文件
-            os.remove(gz_path)
-            
-            print(f"数据库已保存到: {save_path}")
-            return True
-        else:
-            print(f"下载失败: {response.status_code}")
-            return False
+            try:
+                with self.session.get(url, params=params, headers=headers, stream=True, timeout=60) as response:
+                    if response.status_code == 202:
+                        # 快照在服务器后台生成，轮询不计入重试次数
+                        pending = response.json().get('snapshot')
+                        delay = int(response.headers.get('Retry-After', 5))
+                        if waited >= max_wait:
+                            print(f"等待服务器生成快照超时（{max_wait}s）")
+                            return False
+                        print(f"服务器正在生成快照 {pending}，{delay} 秒后重试...")
+                        waited += delay
+                        time.sleep(delay)
+                        continue
+                    if response.status_code == 416 and meta:
+                        break           # 上次已经下载完整
+                    if response.status_code == 404 and (meta or pending):
+                        print("服务器上的快照已过期，重新下载最新快照")
+                        for path in (part_path, meta_path):
+                            if os.path.exists(path):
+                                os.remove(path)
+                        pending = None
+                        continue
+                    if response.status_code not in (200, 206):
+                        print(f"下载失败: {response.status_code} {response.text[:200]}")
+                        return False
+                    
+                    if response.status_code == 200:
+                        # 全新下载（或快照已变化，服务器忽略了 Range）
+                        offset = 0
+                        meta = {'snapshot': response.headers.get('X-Snapshot'), 'etag': response.headers.get('ETag')}
+                        with open(meta_path, 'w') as f:
+                            json.dump(meta, f)
+                        total = int(response.headers.get('Content-Length', 0))
+                    else:
+                        total = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+                    
+                    with open(part_path, 'ab' if response.status_code == 206 else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=1024 * 1024):
+                            f.write(chunk)
+                if not total or os.path.getsize(part_path) >= total:
+                    break
+                print("连接提前结束，准备续传...")
+            except requests.RequestException as e:
+                print(f"下载中断 ({attempt + 1}/{max_retries + 1}): {e}")
+            attempt += 1
+            if attempt > max_retries:
+                print("下载未完成，再次调用会从断点继续")
+                return False
+            time.sleep(min(2 ** (attempt - 1), 30))
+        
+        print(f"下载完成，正在解压...")
+        with open(save_path, 'wb') as f_out:
+            if compression == 'zstd':
+                if zstandard is None:
+                    raise RuntimeError("解压 zstd 快照需要 zstandard: pip install zstandard")
+                with open(part_path, 'rb') as raw, zstandard.ZstdDecompressor().stream_reader(raw) as f_in:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            else:
+                with gzip.open(part_path, 'rb') as f_in:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        
+        os.remove(part_path)
+        os.remove(meta_path)
+        print(f"数据库已保存到: {save_path}")
+        return True
+    
+    def sync_database(self, local_path='local_crypto_data.db', tables=None, batch_size=50000):
+        """
+        增量同步到本地 SQLite：每张表只拉取上次同步之后的新行（见 replication），每批一个事务写入
+        第一次同步会拉取全部数据；中途中断后再次调用从最后写入的一批继续。返回 {表: 行数}
+        K线等原地更新的表按变更序号同步，更新过的行和事后补采的旧K线都会再次拉取
+        """
+        info = self.session.get(f'{self.server_url}/api/changes', timeout=30).json()['tables']
+        if tables:
+            info = [item for item in info if item['table'] in tables]
+        
+        db = sqlite3.connect(local_path)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        prepare_local(db, info)
+        state = load_state(db)
+        
+        synced = {}
+        start = time.time()
+        for item in info:
+            table = item['table']
+            after = start_position(table, state)
+            synced[table] = 0
+            while True:
+                params = {'limit': batch_size}
+                if after is not None:
+                    params['after'] = json.dumps(after)
+                response = self.session.get(f'{self.server_url}/api/changes/{table}', params=params, timeout=120)
+                response.raise_for_status()
+                batch = response.json()
+                synced[table] += apply(db, batch)
+                advance(db, state, table, batch)
+                if batch['next'] is None:
+                    break
+                after = batch['next']
+            print(f"  ✅ {table:20s} +{synced[table]}")
+        
+        db.close()
+        print(f"同步完成: {sum(synced.values())} 行, 用时 {time.time() - start:.1f}s")
+        return synced
     
     def export_table(self, table, symbol=None, limit=10000):
-        """导出指定表"""
+        """导出指定表（最近 limit 行；更大的范围用 iter_export 流式翻页）"""
         params = {'limit': limit}
         if symbol:
             params['symbol'] = symbol
@@ -118,6 +257,66 @@ class CloudDataClient:
         response = self.session.get(f'{self.server_url}/api/export/{table}', params=params)
         return response.json()
 
+    def iter_export(self, table, symbol, start_time=None, end_time=None, interval=None, fmt='ndjson',
+                    page_size=100000):
+        """
+        逐行迭代任意大的时间范围（流式导出接口，按续传令牌自动翻页），每行是一个 dict
+        CSV 格式下所有值都是字符串
+        """
+        params = {'symbol': symbol, 'format': fmt, 'limit': page_size}
+        for name, value in (('start_time', start_time), ('end_time', end_time), ('interval', interval)):
+            if value is not None:
+                params[name] = value
+        
+        while True:
+            with self.session.get(f'{self.server_url}/api/export/{table}/stream', params=params,
+                                  stream=True) as response:
+                response.raise_for_status()
+                lines = response.iter_lines(decode_unicode=True)
+                if fmt == 'csv':
+                    yield from csv.DictReader(lines)
+                else:
+                    for line in lines:
+                        if line:
+                            yield json.loads(line)
+                token = response.headers.get('X-Next-Token')
+            if not token:
+                break
+            params['after'] = token
+    
+    def list_archive(self, table, symbol=None):
+        """列出服务器上已导出的 Parquet 文件"""
+        params = {'symbol': symbol} if symbol else {}
+        response = self.session.get(f'{self.server_url}/api/archive/{table}', params=params)
+        return response.json()
+    
+    def download_archive(self, table, symbol, date=None, save_path=None, start_time=None, end_time=None,
+                         columns=None):
+        """
+        下载列式归档（Parquet）
+        date: 下载一整天的文件；不传时按 start_time / end_time / columns 取服务器端过滤后的切片
+        返回保存的路径，读取: pyarrow.parquet.read_table(path)
+        """
+        if date:
+            url = f'{self.server_url}/api/archive/{table}/{symbol}/{date}'
+            params = {}
+            save_path = save_path or f'{table}_{symbol}_{date}.parquet'
+        else:
+            url = f'{self.server_url}/api/archive/{table}/{symbol}'
+            params = {'start_time': start_time, 'end_time': end_time}
+            if columns:
+                params['columns'] = ','.join(columns)
+            save_path = save_path or f'{table}_{symbol}_{start_time or 0}_{end_time or 0}.parquet'
+        
+        response = self.session.get(url, params=params, stream=True)
+        if response.status_code != 200:
+            print(f"下载失败: {response.status_code}")
+            return None
+        with open(save_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        return save_path
+
 # ==================== 使用示例 ====================
 if __name__ == '__main__':
     # 1. 初始化客户端（替换为您的服务器IP）
@@ -156,3 +355,7 @@ if __name__ == '__main__':
     # 8. 下载数据库（可选）
     # print("\n=== 下载完整数据库 ===")
     # client.download_database('local_crypto_data.db')
+    
+    # 9. 增量同步（可选，只拉取上次同步之后的新数据）
+    # print("\n=== 增量同步 ===")
+    # client.sync_database('local_crypto_data.db')
@@ -104,6 +104,8 @@ def run_full_system():
             time.sleep(analysis_interval)
     except KeyboardInterrupt:
         print("\n\n⛔ 用户中断，正在关闭系统...")
+        binance.flush_bars(force=True)
+        binance.writer.flush(timeout=10)
         print("👋 感谢使用！")
 
 def run_binance_only():
@@ -172,11 +174,11 @@ def show_statistics():
     clear_screen()
     print("📊 数据统计\n")
     
-    import sqlite3
     from datetime import timedelta
+    from database import connect_reader
     
     try:
-        db = sqlite3.connect('crypto_data.db')
+        db = connect_reader()
         cursor = db.cursor()
         
         # 总体统计
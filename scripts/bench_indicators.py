@@ -0,0 +1,67 @@
+"""
+技术指标性能对比 - 逐根循环参考实现 vs NumPy 向量化实现
+用法: python scripts/bench_indicators.py [K线数量 ...]   （默认 200 10000 1000000）
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src', 'indicators'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'tests'))    # 参考实现只在测试目录
+from indicators import TechnicalIndicators
+from reference_indicators import ReferenceIndicators
+
+
+def make_candles(n, seed=42):
+    rng = np.random.default_rng(seed)
+    close = 2500 + np.cumsum(rng.normal(0, 5, n))
+    high = close + rng.uniform(0, 4, n)
+    low = close - rng.uniform(0, 4, n)
+    return high.tolist(), low.tolist(), close.tolist()
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(n):
+    high, low, close = make_candles(n)
+    klines = [(i, c, h, l, c, 1.0) for i, (h, l, c) in enumerate(zip(high, low, close))]
+    # 向量化版本直接使用数组（实际使用时K线从数据库读出后只转换一次）
+    h, l, c = np.array(high), np.array(low), np.array(close)
+    data = np.array(klines)
+    repeat = 20 if n <= 10000 else 3
+
+    cases = [
+        ('EMA(12)', lambda: ReferenceIndicators.calculate_ema(close, 12),
+                    lambda: TechnicalIndicators.ema_series(c, 12)),
+        ('MACD', lambda: ReferenceIndicators.calculate_macd(close),
+                 lambda: TechnicalIndicators.macd_series(c)),
+        ('RSI(14)', lambda: ReferenceIndicators.calculate_rsi(close),
+                    lambda: TechnicalIndicators.rsi_series(c)),
+        ('ATR(14)', lambda: ReferenceIndicators.calculate_atr(high, low, close),
+                    lambda: TechnicalIndicators.atr_series(h, l, c)),
+        ('all', lambda: ReferenceIndicators.calculate_all_indicators(klines),
+                lambda: TechnicalIndicators.calculate_all_indicators(data)),
+    ]
+
+    print(f"\n📊 {n:,} candles")
+    print(f"  {'indicator':<10} {'loop (ms)':>12} {'numpy (ms)':>12} {'speedup':>9}")
+    for name, loop_func, vec_func in cases:
+        loop_ms = best_of(loop_func, repeat) * 1000
+        vec_ms = best_of(vec_func, repeat) * 1000
+        print(f"  {name:<10} {loop_ms:>12.3f} {vec_ms:>12.3f} {loop_ms / vec_ms:>8.1f}x")
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] or [200, 10_000, 1_000_000]
+    for n in sizes:
+        bench(n)
@@ -20,6 +20,8 @@ echo import sys > ..\temp_collector.py
 echo import os >> ..\temp_collector.py
 echo os.chdir(r'C:\Users\jierr\Desktop\jk') >> ..\temp_collector.py
 echo sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\collectors') >> ..\temp_collector.py
+echo sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\storage') >> ..\temp_collector.py
+echo sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\indicators') >> ..\temp_collector.py
 echo from binance_collector import BinanceDataCollector >> ..\temp_collector.py
 echo. >> ..\temp_collector.py
 echo if len(sys.argv) ^> 1: >> ..\temp_collector.py
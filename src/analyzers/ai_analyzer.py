@@ -1,10 +1,46 @@
 import requests
 import json
-import sqlite3
 from datetime import datetime, timedelta
+from database import connect_reader
 from indicators import TechnicalIndicators
+from streaming import registry as indicator_registry
+from trade_flow import WINDOWS as FLOW_WINDOWS, registry as flow_registry
+from trade_rollup import flow_totals
 from nofx_collector import NOFXCollector
 
+# 需要额外读取K线计算的扩展指标（配置 indicators 中的名字，见 TechnicalIndicators.calculate_extended_indicators）
+EXTENDED_INDICATORS = {'vwap', 'stoch', 'adx', 'obv', 'keltner', 'donchian', 'supertrend', 'zscore'}
+
+# get_recent_data 读取的查询（查询计划测试直接使用这些常量，保证都走索引）
+KLINES_SQL = '''
+    SELECT open_time, open, high, low, close, volume, taker_buy_volume
+    FROM klines
+    WHERE symbol = ? AND interval = '1m'
+    ORDER BY open_time DESC LIMIT ?
+'''
+RECENT_KLINES_SQL = '''
+    SELECT close, volume FROM klines
+    WHERE symbol = ? AND interval = '1m' AND open_time > ?
+    ORDER BY open_time DESC LIMIT 10
+'''
+ORDERBOOK_SQL = '''
+    SELECT bid_total, ask_total FROM orderbook
+    WHERE symbol = ? AND timestamp > ?
+    ORDER BY timestamp DESC LIMIT 1
+'''
+# 各表按交易对取最新一行：表 -> 列
+LATEST_COLUMNS = {
+    'ticker_24h': 'price_change_percent, volume, quote_volume',
+    'open_interest': 'open_interest, open_interest_value',
+    'funding_rate': 'funding_rate',
+    'long_short_ratio': 'long_short_ratio, long_account, short_account',
+    'top_trader_position': 'long_position_ratio, short_position_ratio',
+}
+LATEST_SQL = {
+    table: f'SELECT {columns} FROM {table} WHERE symbol = ? ORDER BY timestamp DESC LIMIT 1'
+    for table, columns in LATEST_COLUMNS.items()
+}
+
 class AIAnalyzer:
     def __init__(self, symbol='ethusdt', lm_studio_url='http://localhost:1234/v1', nofx_api_key=None):
         """
@@ -15,7 +51,7 @@ class AIAnalyzer:
         self.symbol = symbol.lower()
         self.symbol_name = symbol.replace('usdt', '').upper()
         self.lm_studio_url = lm_studio_url
-        self.db = sqlite3.connect('crypto_data.db')
+        self.db = connect_reader()
         self.nofx_collector = NOFXCollector(api_key=nofx_api_key)
         
     def test_lm_studio_connection(self):
@@ -36,68 +72,65 @@ class AIAnalyzer:
             print("ℹ️  Please make sure LM Studio is running and local server is started on port 1234")
             return False
     
-    def get_recent_data(self, hours=1):
-        """获取最近的数据"""
+    def _load_klines(self, limit=200):
+        """最近 limit 根1分钟K线（从旧到新）；旧数据的 taker_buy_volume 可能为空，保持 None"""
+        rows = self.db.execute(KLINES_SQL, (self.symbol, limit)).fetchall()
+        return list(reversed(rows))
+    
+    def add_extended(self, indicators, selected):
+        """
+        selected（配置中的指标名）选了扩展指标、而 indicators 中还没有时，读取K线计算并合并进去
+        已有的增量/批量计算结果保持不变，只补 'extended' 一项
+        """
+        if not indicators or not indicators.get('available') or 'extended' in indicators:
+            return indicators
+        if not EXTENDED_INDICATORS & set(selected or ()):
+            return indicators
+        return dict(indicators, extended=TechnicalIndicators.calculate_extended_indicators(self._load_klines()))
+    
+    def get_recent_data(self, hours=1, indicators=None, extended=None):
+        """
+        获取最近的数据
+        indicators: 已经算好的技术指标（如多币种批量计算的结果），不传时自行计算
+        extended: 配置中选中的指标名，包含扩展指标（见 EXTENDED_INDICATORS）时才计算扩展指标
+        """
         cursor = self.db.cursor()
         timestamp_ms = int((datetime.now() - timedelta(hours=hours)).timestamp() * 1000)
         timestamp_s = timestamp_ms // 1000
         
-        # 获取交易数据
-        trades = cursor.execute('''
-            SELECT 
-                AVG(price) as avg_price, 
-                SUM(quantity) as total_volume,
-                SUM(CASE WHEN is_buyer_maker=0 THEN quantity ELSE 0 END) as buy_volume,
-                SUM(CASE WHEN is_buyer_maker=1 THEN quantity ELSE 0 END) as sell_volume,
-                COUNT(*) as trade_count
-            FROM trades WHERE symbol = ? AND timestamp > ?
-        ''', (self.symbol, timestamp_ms)).fetchone()
-        
-        # 获取K线数据（用于技术指标计算）
-        # 获取足够多的K线数据（最近200根，用于EMA等计算）
-        klines_for_indicators = cursor.execute('''
-            SELECT open_time, open, high, low, close, volume 
-            FROM klines 
-            WHERE symbol = ? AND interval = '1m'
-            ORDER BY open_time DESC LIMIT 200
-        ''', (self.symbol,)).fetchall()
-        
-        # 反转顺序（从旧到新）
-        klines_for_indicators = list(reversed(klines_for_indicators))
+        # 成交买卖量：优先用同进程采集器维护的滚动统计（O(1)），否则读每分钟汇总表
+        window_seconds = int(hours * 3600)
+        window = next((name for name, span in FLOW_WINDOWS.items() if span == window_seconds), None)
+        flow = flow_registry.snapshot(self.symbol, window) if window else None
+        if not flow or not flow['complete']:
+            flow = flow_totals(self.db, self.symbol, window_seconds * 1000)
+        
+        # 技术指标：优先用调用方传入的结果，其次是同进程采集器维护的增量指标（每根收盘K线已更新）
+        if indicators is None:
+            indicators = indicator_registry.latest(self.symbol, '1m')
+            stale_before = int((datetime.now() - timedelta(minutes=5)).timestamp() * 1000)
+            if indicators and indicators['available'] and indicators['open_time'] < stale_before:
+                indicators = None
+        if not indicators or not indicators['available']:
+            # 否则读取最近200根K线计算（选了扩展指标时一并计算）
+            indicators = TechnicalIndicators.calculate_all_indicators(
+                self._load_klines(), extended=bool(EXTENDED_INDICATORS & set(extended or ())))
+        else:
+            indicators = self.add_extended(indicators, extended)
         
         # 获取最近10根K线用于显示
-        recent_klines = cursor.execute('''
-            SELECT close, volume FROM klines 
-            WHERE symbol = ? AND interval = '1m' AND open_time > ? 
-            ORDER BY open_time DESC LIMIT 10
-        ''', (self.symbol, timestamp_ms)).fetchall()
+        recent_klines = cursor.execute(RECENT_KLINES_SQL, (self.symbol, timestamp_ms)).fetchall()
         
         # 获取订单簿数据
-        recent_orderbook = cursor.execute('''
-            SELECT bids, asks FROM orderbook 
-            WHERE symbol = ? AND timestamp > ? 
-            ORDER BY timestamp DESC LIMIT 1
-        ''', (self.symbol, timestamp_ms)).fetchone()
+        recent_orderbook = cursor.execute(ORDERBOOK_SQL, (self.symbol, timestamp_ms)).fetchone()
         
-        # 计算订单簿压力
+        # 计算订单簿压力（买卖总量在写入时已算好）
         orderbook_ratio = 1.0
-        if recent_orderbook:
-            try:
-                bids = json.loads(recent_orderbook[0])
-                asks = json.loads(recent_orderbook[1])
-                total_bid_vol = sum([float(b[1]) for b in bids])
-                total_ask_vol = sum([float(a[1]) for a in asks])
-                orderbook_ratio = total_bid_vol / total_ask_vol if total_ask_vol > 0 else 1.0
-            except:
-                pass
+        if recent_orderbook and recent_orderbook[1]:
+            orderbook_ratio = (recent_orderbook[0] or 0) / recent_orderbook[1]
         
         # 获取24小时统计
-        ticker_24h = cursor.execute('''
-            SELECT price_change_percent, volume, quote_volume 
-            FROM ticker_24h 
-            WHERE symbol = ?
-            ORDER BY timestamp DESC LIMIT 1
-        ''', (self.symbol,)).fetchone()
+        ticker_24h = cursor.execute(LATEST_SQL['ticker_24h'], (self.symbol,)).fetchone()
         
         # 获取链上数据（如果表存在）
         try:
@@ -132,51 +165,28 @@ class AIAnalyzer:
         # 获取合约数据
         try:
             # 持仓量
-            open_interest = cursor.execute('''
-                SELECT open_interest, open_interest_value
-                FROM open_interest
-                WHERE symbol = ?
-                ORDER BY timestamp DESC LIMIT 1
-            ''', (self.symbol,)).fetchone()
+            open_interest = cursor.execute(LATEST_SQL['open_interest'], (self.symbol,)).fetchone()
         except:
             open_interest = (0, 0)
         
         try:
             # 资金费率
-            funding_rate = cursor.execute('''
-                SELECT funding_rate
-                FROM funding_rate
-                WHERE symbol = ?
-                ORDER BY timestamp DESC LIMIT 1
-            ''', (self.symbol,)).fetchone()
+            funding_rate = cursor.execute(LATEST_SQL['funding_rate'], (self.symbol,)).fetchone()
         except:
             funding_rate = (0,)
         
         try:
             # 多空比
-            long_short_ratio = cursor.execute('''
-                SELECT long_short_ratio, long_account, short_account
-                FROM long_short_ratio
-                WHERE symbol = ?
-                ORDER BY timestamp DESC LIMIT 1
-            ''', (self.symbol,)).fetchone()
+            long_short_ratio = cursor.execute(LATEST_SQL['long_short_ratio'], (self.symbol,)).fetchone()
         except:
             long_short_ratio = (1, 0, 0)
         
         try:
             # 大户持仓
-            top_trader = cursor.execute('''
-                SELECT long_position_ratio, short_position_ratio
-                FROM top_trader_position
-                WHERE symbol = ?
-                ORDER BY timestamp DESC LIMIT 1
-            ''', (self.symbol,)).fetchone()
+            top_trader = cursor.execute(LATEST_SQL['top_trader_position'], (self.symbol,)).fetchone()
         except:
             top_trader = (0, 0)
         
-        # 计算技术指标
-        indicators = TechnicalIndicators.calculate_all_indicators(klines_for_indicators)
-        
         # 计算价格趋势
         price_trend = "stable"
         if recent_klines and len(recent_klines) >= 2:
@@ -188,12 +198,12 @@ class AIAnalyzer:
                 price_trend = "falling"
         
         return {
-            'avg_price': trades[0] if trades[0] else 0,
-            'total_volume': trades[1] if trades[1] else 0,
-            'buy_volume': trades[2] if trades[2] else 0,
-            'sell_volume': trades[3] if trades[3] else 0,
-            'trade_count': trades[4] if trades[4] else 0,
-            'buy_sell_ratio': (trades[2] / trades[3]) if (trades[3] and trades[3] > 0) else 0,
+            'avg_price': flow['vwap'],      # 成交量加权均价
+            'total_volume': flow['volume'],
+            'buy_volume': flow['buy_volume'],
+            'sell_volume': flow['sell_volume'],
+            'trade_count': flow['trades'],
+            'buy_sell_ratio': flow['buy_sell_ratio'],
             'orderbook_ratio': orderbook_ratio,
             'price_trend': price_trend,
             'price_change_24h': ticker_24h[0] if ticker_24h else 0,
@@ -218,6 +228,39 @@ class AIAnalyzer:
             'top_trader_short': top_trader[1] if top_trader else 0
         }
     
+    @staticmethod
+    def format_extended_indicators(extended, selected_indicators):
+        """扩展指标的提示词行（只输出用户勾选且数据足够的指标）"""
+        lines = []
+        if 'vwap' in selected_indicators and 'vwap' in extended:
+            vwap = extended['vwap']
+            lines.append(f"• VWAP: 当日 ${vwap['session']:.2f} | 锚定低点 ${vwap['anchored']:.2f} (价格{'在VWAP上方' if vwap['position'] == 'above' else '在VWAP下方'})")
+        if 'stoch' in selected_indicators and 'stochastic' in extended:
+            stoch = extended['stochastic']
+            lines.append(f"• Stochastic(14,3): %K {stoch['k']:.2f} | %D {stoch['d']:.2f} ({stoch['signal']})")
+        if 'adx' in selected_indicators and 'adx' in extended:
+            adx = extended['adx']
+            lines.append(f"• ADX(14): {adx['adx']:.2f} | +DI {adx['plus_di']:.2f} | -DI {adx['minus_di']:.2f} ({adx['trend']})")
+        if 'obv' in selected_indicators and 'obv' in extended:
+            obv = extended['obv']
+            lines.append(f"• OBV: {obv['obv']:.2f} (近10根变化 {obv['change']:+.2f})")
+        if 'keltner' in selected_indicators and 'keltner' in extended:
+            kc = extended['keltner']
+            lines.append(f"• Keltner: Upper ${kc['upper']:.2f} | Mid ${kc['middle']:.2f} | Lower ${kc['lower']:.2f} ({kc['position']})")
+        if 'donchian' in selected_indicators and 'donchian' in extended:
+            dc = extended['donchian']
+            lines.append(f"• Donchian(20): Upper ${dc['upper']:.2f} | Mid ${dc['middle']:.2f} | Lower ${dc['lower']:.2f}")
+        if 'supertrend' in selected_indicators and 'supertrend' in extended:
+            st = extended['supertrend']
+            lines.append(f"• SuperTrend(10,3): ${st['value']:.2f} ({'🟢多头' if st['direction'] == 'up' else '🔴空头'})")
+        if 'zscore' in selected_indicators and 'zscore' in extended:
+            z = extended['zscore']
+            text = f"• 成交量 z-score(20): {z['volume']:.2f}"
+            if z.get('taker_buy_ratio') is not None:
+                text += f" | 主动买入占比 z-score: {z['taker_buy_ratio']:.2f}"
+            lines.append(text)
+        return lines
+    
     def analyze_with_lm_studio(self, data, config=None):
         """
         使用LM Studio分析数据
@@ -228,6 +271,7 @@ class AIAnalyzer:
             'nofx': ['netflow', 'heatmap'],
             'customPrompt': '用户自定义提示词'
         }
+        indicators 还可选扩展指标: 'vwap', 'stoch', 'adx', 'obv', 'keltner', 'donchian', 'supertrend', 'zscore'
         """
         # 默认配置
         if config is None:
@@ -272,10 +316,10 @@ class AIAnalyzer:
         elif data['net_flow'] < -100:
             sentiment_signals.append("交易所大量流入（看跌）")
         
-        # 构建技术指标信息（根据用户配置）
-        indicators = data.get('indicators', {})
-        indicators_text = ""
+        # 构建技术指标信息（根据用户配置）；选了扩展指标而数据中没有时在这里补算
         selected_indicators = config.get('indicators', [])
+        indicators = self.add_extended(data.get('indicators'), selected_indicators) or {}
+        indicators_text = ""
         
         if indicators.get('available') and len(selected_indicators) > 0:
             lines = ["\n📉 **技术指标**"]
@@ -300,6 +344,8 @@ class AIAnalyzer:
                 lines.append(f"• BOLL: Upper ${boll.get('upper', 0):.2f} | Mid ${boll.get('middle', 0):.2f} | Lower ${boll.get('lower', 0):.2f}")
                 lines.append(f"• BOLL位置: {boll.get('position', 'neutral')} {'🔥超买区)' if boll.get('position') == 'above_upper' else '(👻超卖区)' if boll.get('position') == 'below_lower' else ''}")
             
+            lines += self.format_extended_indicators(indicators.get('extended', {}), selected_indicators)
+            
             indicators_text = "\n".join(lines) + "\n"
         
         # 构建合约数据信息（根据用户配置）
@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
-import sqlite3, sys, io
-from datetime import datetime, timedelta
-from indicators import TechnicalIndicators
+import sys, io
+from database import connect_reader
+from batch_indicators import compute_batch, load_windows
+from trade_rollup import flow_totals
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-db = sqlite3.connect('crypto_data.db')
+db = connect_reader()
 c = db.cursor()
 
 symbols = ['btcusdt','ethusdt','solusdt','bnbusdt']
+timeframes = [('1h','1H'), ('4h','4H'), ('1d','1D')]
+
+# 全部交易对/周期的K线一次查询取回，指标一次向量化计算
+windows = load_windows(db, symbols, [tf for tf, _ in timeframes])
+all_indicators = compute_batch(windows)
 
 for sym in symbols:
     print(f'\n{"="*60}')
@@ -23,11 +29,9 @@ for sym in symbols:
     if row24:
         print(f'24h_chg: {row24[0]}%  last: {row24[1]}  vol: {row24[2]:.2f}  quote_vol: {row24[3]:.2f}')
     
-    for tf, label in [('1h','1H'), ('4h','4H'), ('1d','1D')]:
-        klines = c.execute(f'SELECT open_time, open, high, low, close, volume FROM klines WHERE symbol=? AND interval="{tf}" ORDER BY open_time DESC LIMIT 200', (sym,)).fetchall()
-        klines = list(reversed(klines))
-        if len(klines) >= 30:
-            ind = TechnicalIndicators.calculate_all_indicators(klines)
+    for tf, label in timeframes:
+        if len(windows[(sym, tf)]) >= 30:
+            ind = all_indicators[(sym, tf)]
             print(f'\n--- {label} ---')
             print(f'EMA12: {ind["ema_12"]}  EMA26: {ind["ema_26"]}')
             m = ind["macd"]
@@ -36,19 +40,10 @@ for sym in symbols:
             b = ind["bollinger"]
             print(f'BOLL: U={b["upper"]} M={b["middle"]} L={b["lower"]} Pos={b["position"]}')
     
-    ts_1h = int((datetime.now() - timedelta(hours=1)).timestamp() * 1000)
-    ts = c.execute('''
-        SELECT COUNT(*),
-            SUM(CASE WHEN is_buyer_maker=0 THEN quantity ELSE 0 END),
-            SUM(CASE WHEN is_buyer_maker=1 THEN quantity ELSE 0 END)
-        FROM trades WHERE symbol=? AND timestamp > ?
-    ''', (sym, ts_1h)).fetchone()
-    if ts and ts[0] > 0:
-        bv = ts[1] or 0
-        sv = ts[2] or 0
-        r = bv/sv if sv > 0 else 0
+    flow = flow_totals(db, sym)
+    if flow['trades'] > 0:
         print(f'\n--- Trade Flow 1H ---')
-        print(f'Trades: {ts[0]}  Buy: {bv:.4f}  Sell: {sv:.4f}  B/S_ratio: {r:.3f}')
+        print(f'Trades: {flow["trades"]}  Buy: {flow["buy_volume"]:.4f}  Sell: {flow["sell_volume"]:.4f}  B/S_ratio: {flow["buy_sell_ratio"]:.3f}  VWAP: {flow["vwap"]:.2f}')
     
     print(f'\n--- Futures ---')
     try:
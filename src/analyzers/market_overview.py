@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
-import sqlite3, sys, io
+import sys, io
+from database import connect_reader
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-db = sqlite3.connect('crypto_data.db')
+db = connect_reader()
 c = db.cursor()
 
 tables = c.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
@@ -6,6 +6,7 @@ import json
 import sqlite3
 from datetime import datetime, timedelta
 from ai_analyzer import AIAnalyzer
+from batch_indicators import compute_batch, load_windows
 
 class MultiAnalyzer:
     def __init__(self, symbols=['ethusdt', 'btcusdt', 'bnbusdt', 'solusdt'], lm_studio_url='http://localhost:1234/v1'):
@@ -40,13 +41,21 @@ class MultiAnalyzer:
         print(f"⏰ 分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("="*70)
         
+        # 所有交易对的1分钟K线一次查询取回，指标一次向量化计算
+        try:
+            db = self.analyzers[self.symbols[0]].db
+            batch = compute_batch(load_windows(db, self.symbols, ['1m']))
+        except Exception as e:
+            print(f"⚠️  批量指标计算失败，改为逐个计算: {e}")
+            batch = {}
+        
         for symbol in self.symbols:
             try:
                 print(f"\n📊 正在分析 {symbol.replace('usdt', '').upper()}...")
                 analyzer = self.analyzers[symbol]
                 
                 # 获取数据
-                data = analyzer.get_recent_data(hours=1)
+                data = analyzer.get_recent_data(hours=1, indicators=batch.get((symbol, '1m')))
                 
                 # 检查是否有数据
                 if data['trade_count'] == 0:
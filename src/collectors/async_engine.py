@@ -0,0 +1,186 @@
+"""
+异步采集引擎 - 一个事件循环承载全部WebSocket数据流、REST轮询和写库调度
+线程数固定：事件循环线程 + REST线程池（阻塞的 requests 调用）+ 写库检查线程 + 写库线程，
+与交易对数量无关，几十个交易对也只需要一个进程。
+
+用法: python async_engine.py [symbol ...] [--no-futures]
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+from combined_stream import BASE_URL, MAX_STREAMS_PER_CONNECTION, CombinedStream
+from database import DB_PATH
+from db_writer import get_writer
+from stream_stats import STATUS_INTERVAL
+
+TICKER_INTERVAL = 60        # 24h统计：每分钟
+FUTURES_INTERVAL = 300      # 合约数据：每5分钟
+FLUSH_INTERVAL = 5          # 写库检查
+BAR_FLUSH_INTERVAL = 1      # 结束没有新成交的时间K线（见 BinanceDataCollector.flush_bars）
+REST_WORKERS = 4            # REST线程池大小，同时也限制了并发请求数
+RECONNECT_DELAY = 5
+
+
+class AsyncCollectorEngine:
+    """单事件循环采集引擎"""
+
+    def __init__(self, collectors, futures_collectors=(), writer=None,
+                 ticker_interval=TICKER_INTERVAL, futures_interval=FUTURES_INTERVAL,
+                 flush_interval=FLUSH_INTERVAL, rest_workers=REST_WORKERS,
+                 streams_per_connection=MAX_STREAMS_PER_CONNECTION, stats=None,
+                 status_interval=STATUS_INTERVAL):
+        """
+        collectors: BinanceDataCollector 列表（提供 stream_handlers() 和 fetch_ticker_24h()）
+        futures_collectors: FuturesDataCollector 列表
+        writer: 共享写入器，默认取 crypto_data.db 的写入器
+        *_interval: 各类任务的调度间隔（秒）
+        rest_workers: REST线程池大小
+        stats: 采集器共用的 StreamStats，每 status_interval 秒输出一次汇总
+        """
+        self.collectors = list(collectors)
+        self.futures_collectors = list(futures_collectors)
+        self.writer = writer or get_writer(DB_PATH)
+        self.ticker_interval = ticker_interval
+        self.futures_interval = futures_interval
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.status_interval = status_interval
+        self.stream = CombinedStream(self.collectors, streams_per_connection)
+        self.bar_collectors = [c for c in self.collectors if getattr(c, 'bar_aggregators', None)]
+        self.executor = ThreadPoolExecutor(max_workers=rest_workers, thread_name_prefix="REST")
+        # 写库检查单独一个线程，不排在慢速REST请求后面
+        self.flush_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DB-Flush")
+        self.runs = {}      # 任务名 -> 已执行次数
+
+    def schedule(self):
+        """生成全部REST周期任务: [(任务名, 函数, 间隔, 首次延迟)]"""
+        jobs = []
+        for collector in self.collectors:
+            jobs.append((f"{collector.symbol.upper()}-24h", collector.fetch_ticker_24h, self.ticker_interval, 0))
+
+        # 同一交易对的四个合约接口错开1秒，避免同时请求
+        for futures in self.futures_collectors:
+            for offset, func in enumerate([
+                futures.fetch_open_interest,
+                futures.fetch_funding_rate,
+                futures.fetch_long_short_ratio,
+                futures.fetch_top_trader_position,
+            ]):
+                jobs.append((f"{futures.symbol}-{func.__name__[6:]}", func, self.futures_interval, offset))
+        return jobs
+
+    def _flush(self):
+        # 写线程长时间没有消化完队列时提示（通常是磁盘或锁竞争问题）
+        if not self.writer.flush(timeout=self.flush_interval * 2):
+            print(f"⚠️ DB Writer flush timed out, queue: {self.writer.queue.qsize()}")
+
+    def _flush_bars(self, force=False):
+        for collector in self.bar_collectors:
+            collector.flush_bars(force)
+
+    async def periodic(self, name, func, interval, delay=0, executor=None):
+        """按固定间隔在线程池中执行阻塞函数，间隔从本次开始时刻算起"""
+        loop = asyncio.get_running_loop()
+        executor = executor or self.executor
+        if delay:
+            await asyncio.sleep(delay)
+        while True:
+            started = time.monotonic()
+            try:
+                await loop.run_in_executor(executor, func)
+            except Exception as e:
+                print(f"❌ {name} error: {e}")
+            self.runs[name] = self.runs.get(name, 0) + 1
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def run_stream(self, streams):
+        """维持一个组合流连接，消息直接在事件循环中分发，断线后自动重连"""
+        url = BASE_URL + '/'.join(streams)
+        while True:
+            try:
+                async with websockets.connect(url, ping_interval=20, max_queue=None) as ws:
+                    async for message in ws:
+                        self.stream.dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Combined WebSocket Error: {e}")
+            print(f"Combined WebSocket closed ({len(streams)} streams), reconnecting...")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def run(self, duration=None):
+        """
+        运行引擎
+        duration: 运行秒数，None 表示一直运行
+        """
+        if self.stream.groups and websockets is None:
+            raise RuntimeError("异步引擎需要 websockets 库: pip install websockets")
+
+        tasks = [asyncio.create_task(self.run_stream(streams)) for streams in self.stream.groups]
+        tasks += [asyncio.create_task(self.periodic(*job)) for job in self.schedule()]
+        tasks.append(asyncio.create_task(self.periodic(
+            "DB-Flush", self._flush, self.flush_interval, self.flush_interval, self.flush_executor
+        )))
+        if self.bar_collectors:
+            tasks.append(asyncio.create_task(self.periodic(
+                "Bar-Flush", self._flush_bars, BAR_FLUSH_INTERVAL, BAR_FLUSH_INTERVAL, self.flush_executor
+            )))
+        if self.stats and self.status_interval:
+            tasks.append(asyncio.create_task(self.periodic(
+                "Status", self.stats.report, self.status_interval, self.status_interval, self.flush_executor
+            )))
+        print(f"📊 Async engine running: {len(self.stream.groups)} stream connections, {len(tasks)} tasks")
+
+        try:
+            if duration is None:
+                await asyncio.gather(*tasks)
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 停止时未完成的K线也写入
+            await asyncio.get_running_loop().run_in_executor(self.flush_executor, self._flush_bars, True)
+            await asyncio.get_running_loop().run_in_executor(self.flush_executor, self.writer.flush, 10)
+
+    def start(self):
+        """阻塞运行直到 Ctrl+C"""
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            print("\n⛔ Stopping async engine...")
+            self.writer.flush(timeout=10)
+        finally:
+            self.executor.shutdown(wait=False)
+            self.flush_executor.shutdown(wait=False)
+            self.writer.print_stats()
+
+
+def build_engine(symbols, futures=True, **kwargs):
+    """按交易对创建现货/合约采集器并组装引擎"""
+    from binance_collector import BinanceDataCollector
+    from futures_collector import FuturesDataCollector
+    from stream_stats import StreamStats
+
+    stats = StreamStats()
+    collectors = [BinanceDataCollector(symbol.lower(), stats=stats) for symbol in symbols]
+    futures_collectors = [FuturesDataCollector(symbol.upper()) for symbol in symbols] if futures else []
+    return AsyncCollectorEngine(collectors, futures_collectors, stats=stats, **kwargs)
+
+
+if __name__ == '__main__':
+    import sys
+
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    symbols = args or ['ethusdt', 'btcusdt', 'bnbusdt', 'solusdt']
+
+    print(f"🚀 Async engine: {', '.join(s.upper() for s in symbols)}")
+    engine = build_engine(symbols, futures='--no-futures' not in sys.argv)
+    engine.start()
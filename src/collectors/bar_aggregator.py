@@ -0,0 +1,318 @@
+"""
+成交聚合K线 - 从逐笔成交（aggTrade）生成秒级时间K线、成交量K线、成交额K线和笔数K线
+BarAggregator 在采集线程里逐笔累加，K线完成时立即返回；
+aggregate() 对成交数组做向量化聚合，用于从 trades 表回放历史:
+    python bar_aggregator.py [数据库路径] --symbol ethusdt --type volume:100 [--start 毫秒] [--end 毫秒]
+
+K线类型写作 "种类:阈值"：
+    time:1          每 1 秒一根（阈值单位为秒）
+    volume:100      每成交 100 个币一根
+    dollar:1000000  每成交 100 万 USDT 一根
+    tick:500        每 500 笔成交一根
+时间K线按固定时间格切分，有成交落到下一个时间格（或调用 flush）时上一根完成；
+其余种类从上一根结束处重新累计，累计量达到阈值的那笔成交完整计入当前K线。
+"""
+import sys
+
+import numpy as np
+
+BAR_KINDS = ('time', 'volume', 'dollar', 'tick')
+
+# K线字段（也是 trade_bars 表中的列，顺序即写入顺序）
+BAR_FIELDS = [
+    'open_time', 'close_time',
+    'open', 'high', 'low', 'close',
+    'volume', 'quote_volume', 'vwap',
+    'buy_volume', 'sell_volume', 'trades_count',
+    'first_trade_id', 'last_trade_id',
+]
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS trade_bars (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT,
+        bar_type TEXT,
+        open_time INTEGER,
+        close_time INTEGER,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        quote_volume REAL,
+        vwap REAL,
+        buy_volume REAL,
+        sell_volume REAL,
+        trades_count INTEGER,
+        first_trade_id INTEGER,
+        last_trade_id INTEGER
+    )
+'''
+
+# 依赖唯一索引 (symbol, bar_type, open_time, first_trade_id)（见 migrations.UNIQUE_INDEXES）；
+# 非时间K线的起始时间可能与上一根的结束时间相同，所以带上首笔成交ID
+BAR_UPSERT_SQL = f'''
+    INSERT INTO trade_bars (symbol, bar_type, {', '.join(BAR_FIELDS)})
+    VALUES (?, ?, {', '.join('?' * len(BAR_FIELDS))})
+    ON CONFLICT(symbol, bar_type, open_time, first_trade_id) DO UPDATE SET
+        {', '.join(f'{field} = excluded.{field}' for field in BAR_FIELDS[1:] if field != 'first_trade_id')}
+'''
+
+# 按 (timestamp, id) 键集分页读取成交，走 idx_trades_symbol_time
+TRADES_PAGE_SQL = '''
+    SELECT timestamp, id, price, quantity, is_buyer_maker, trade_id FROM trades
+    WHERE symbol = ? AND (timestamp, id) > (?, ?) AND timestamp < ?
+    ORDER BY timestamp, id LIMIT ?
+'''
+
+
+def parse_bar_type(bar_type):
+    """"volume:100" -> ('volume', 100.0)"""
+    kind, _, threshold = bar_type.partition(':')
+    if kind not in BAR_KINDS or not threshold:
+        raise ValueError(f"Unknown bar type: {bar_type} (expected one of {', '.join(k + ':N' for k in BAR_KINDS)})")
+    threshold = float(threshold)
+    if threshold <= 0:
+        raise ValueError(f"Bar threshold must be positive: {bar_type}")
+    return kind, threshold
+
+
+def make_row(symbol, bar_type, bar):
+    """K线 dict -> 写入参数"""
+    return (symbol, bar_type) + tuple(bar[field] for field in BAR_FIELDS)
+
+
+class BarAggregator:
+    """逐笔成交 -> K线（单个交易对、单一K线类型；只在一个线程里调用）"""
+
+    def __init__(self, bar_type):
+        self.bar_type = bar_type
+        self.kind, self.threshold = parse_bar_type(bar_type)
+        self._interval_ms = int(self.threshold * 1000)
+        self._bar = None
+        self._bucket = None
+        self._progress = 0.0    # 非时间K线：当前K线的累计量
+
+    def add(self, timestamp, price, quantity, is_buyer_maker, trade_id=0):
+        """
+        加入一笔成交，返回本次完成的K线列表（通常为空或一根）
+        is_buyer_maker: 买方是否 maker（为真时是主动卖出）
+        """
+        completed = []
+        if self.kind == 'time':
+            bucket = timestamp // self._interval_ms
+            if self._bar is not None and bucket != self._bucket:
+                completed.append(self._finish())
+            if self._bar is None:
+                self._bucket = bucket
+                self._start(bucket * self._interval_ms, price, trade_id)
+        elif self._bar is None:
+            self._start(timestamp, price, trade_id)
+
+        bar = self._bar
+        bar['close_time'] = timestamp
+        bar['close'] = price
+        if price > bar['high']:
+            bar['high'] = price
+        if price < bar['low']:
+            bar['low'] = price
+        quote = price * quantity
+        bar['volume'] += quantity
+        bar['quote_volume'] += quote
+        if is_buyer_maker:
+            bar['sell_volume'] += quantity
+        else:
+            bar['buy_volume'] += quantity
+        bar['trades_count'] += 1
+        bar['last_trade_id'] = trade_id
+
+        if self.kind != 'time':
+            self._progress += quantity if self.kind == 'volume' else quote if self.kind == 'dollar' else 1
+            if self._progress >= self.threshold:
+                completed.append(self._finish())
+        return completed
+
+    def flush(self, now_ms=None):
+        """
+        结束当前K线：时间K线在 now_ms 已超过其时间格时完成（无新成交时由定时任务调用），
+        不传 now_ms 时无论种类都强制结束。返回完成的K线列表
+        """
+        if self._bar is None:
+            return []
+        # now_ms 来自本机时钟，比成交时间还早（时钟偏差）时不结束
+        if now_ms is not None and (self.kind != 'time' or now_ms // self._interval_ms <= self._bucket):
+            return []
+        return [self._finish()]
+
+    def current(self):
+        """尚未完成的K线（副本），没有时返回 None"""
+        if self._bar is None:
+            return None
+        bar = dict(self._bar)
+        bar['vwap'] = bar['quote_volume'] / bar['volume'] if bar['volume'] else bar['close']
+        return bar
+
+    def _start(self, open_time, price, trade_id):
+        self._bar = {
+            'open_time': open_time, 'close_time': open_time,
+            'open': price, 'high': price, 'low': price, 'close': price,
+            'volume': 0.0, 'quote_volume': 0.0, 'vwap': price,
+            'buy_volume': 0.0, 'sell_volume': 0.0, 'trades_count': 0,
+            'first_trade_id': trade_id, 'last_trade_id': trade_id,
+        }
+        self._progress = 0.0
+
+    def _finish(self):
+        bar = self.current()
+        self._bar = None
+        self._progress = 0.0
+        return bar
+
+
+def _bar_starts(kind, threshold, timestamps, quantities, prices):
+    """
+    每根K线第一笔成交的下标，以及最后一根是否已完成
+    时间K线按时间格变化切分；其余种类用累计量上的 searchsorted 逐根找到达阈值的成交，
+    循环次数等于K线数（不是成交笔数）
+    """
+    n = len(timestamps)
+    if kind == 'time':
+        bucket = timestamps // int(threshold * 1000)
+        starts = np.concatenate([[0], np.flatnonzero(bucket[1:] != bucket[:-1]) + 1])
+        return starts, False
+
+    if kind == 'tick':
+        step = int(np.ceil(threshold))
+        starts = np.arange(0, n, step)
+        return starts, n % step == 0
+
+    measure = quantities if kind == 'volume' else prices * quantities
+    cumulative = np.cumsum(measure)
+    starts = []
+    start, base = 0, 0.0
+    while start < n:
+        starts.append(start)
+        end = int(np.searchsorted(cumulative, base + threshold, side='left'))
+        if end >= n:
+            return np.asarray(starts), False
+        start, base = end + 1, cumulative[end]
+    return np.asarray(starts), True
+
+
+def aggregate(bar_type, timestamps, prices, quantities, is_buyer_maker, trade_ids=None):
+    """
+    向量化聚合一段成交（按时间排序）
+    返回 (已完成的K线列表, 未完成部分的起始下标)；未完成部分应与后续成交拼接后再聚合
+    结果与逐笔调用 BarAggregator.add 相同
+    """
+    kind, threshold = parse_bar_type(bar_type)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    prices = np.asarray(prices, dtype=float)
+    quantities = np.asarray(quantities, dtype=float)
+    sells = np.asarray(is_buyer_maker, dtype=bool)
+    trade_ids = np.zeros(len(timestamps), dtype=np.int64) if trade_ids is None else np.asarray(trade_ids, dtype=np.int64)
+    if not len(timestamps):
+        return [], 0
+
+    starts, last_complete = _bar_starts(kind, threshold, timestamps, quantities, prices)
+    ends = np.concatenate([starts[1:], [len(timestamps)]]) - 1
+    quote = prices * quantities
+
+    # reduceat 一次算出每段的聚合值
+    volume = np.add.reduceat(quantities, starts)
+    quote_volume = np.add.reduceat(quote, starts)
+    sell_volume = np.add.reduceat(np.where(sells, quantities, 0.0), starts)
+    columns = {
+        'open_time': timestamps[starts] // int(threshold * 1000) * int(threshold * 1000) if kind == 'time' else timestamps[starts],
+        'close_time': timestamps[ends],
+        'open': prices[starts],
+        'high': np.maximum.reduceat(prices, starts),
+        'low': np.minimum.reduceat(prices, starts),
+        'close': prices[ends],
+        'volume': volume,
+        'quote_volume': quote_volume,
+        'vwap': np.divide(quote_volume, volume, out=prices[ends].copy(), where=volume > 0),
+        'buy_volume': volume - sell_volume,
+        'sell_volume': sell_volume,
+        'trades_count': ends - starts + 1,
+        'first_trade_id': trade_ids[starts],
+        'last_trade_id': trade_ids[ends],
+    }
+
+    count = len(starts) if last_complete else len(starts) - 1
+    values = {field: columns[field][:count].tolist() for field in BAR_FIELDS}
+    bars = [{field: values[field][i] for field in BAR_FIELDS} for i in range(count)]
+    remainder = len(timestamps) if last_complete else int(starts[-1])
+    return bars, remainder
+
+
+def replay(db, symbol, bar_type, start_time=0, end_time=None, page_size=500_000, include_partial=False):
+    """
+    从 trades 表回放历史成交生成K线（生成器，逐根产出）
+    按页读取，每页向量化聚合，未完成的尾部拼到下一页；include_partial 为真时最后产出未完成的K线
+    """
+    end_time = end_time if end_time is not None else 2 ** 62
+    last_key = (start_time - 1, 2 ** 62)
+    pending = None     # 上一页未完成部分: 各列数组
+
+    while True:
+        rows = db.execute(TRADES_PAGE_SQL, (symbol, last_key[0], last_key[1], end_time, page_size)).fetchall()
+        if not rows:
+            break
+        last_key = (rows[-1][0], rows[-1][1])
+        page = np.nan_to_num(np.array(rows, dtype=float))     # 旧数据的 trade_id 可能为空
+        page = [page[:, 0].astype(np.int64), page[:, 2], page[:, 3], page[:, 4], page[:, 5].astype(np.int64)]
+        if pending is not None:
+            page = [np.concatenate([old, new]) for old, new in zip(pending, page)]
+
+        bars, remainder = aggregate(bar_type, *page)
+        yield from bars
+        pending = [column[remainder:] for column in page]
+
+    if include_partial and pending is not None and len(pending[0]):
+        aggregator = BarAggregator(bar_type)
+        for timestamp, price, quantity, sell, trade_id in zip(*(column.tolist() for column in pending)):
+            aggregator.add(timestamp, price, quantity, sell, trade_id)
+        yield from aggregator.flush()
+
+
+if __name__ == '__main__':
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'storage'))
+    from database import DB_PATH, connect
+    from migrations import migrate
+
+    args = sys.argv[1:]
+    options = {'--symbol': 'ethusdt', '--type': 'time:1', '--start': '0', '--end': None}
+    for name in list(options):
+        if name in args:
+            idx = args.index(name)
+            options[name] = args[idx + 1]
+            del args[idx:idx + 2]
+    path = args[0] if args else DB_PATH
+    symbol = options['--symbol'].lower()
+    bar_type = options['--type']
+    parse_bar_type(bar_type)
+
+    db = connect(path)
+    db.execute(CREATE_TABLE_SQL)
+    db.commit()
+    migrate(db)
+
+    print(f"🔁 Replaying {symbol.upper()} trades into {bar_type} bars ...")
+    end = int(options['--end']) if options['--end'] else None
+    batch = []
+    total = 0
+    for bar in replay(db, symbol, bar_type, int(options['--start']), end):
+        batch.append(make_row(symbol, bar_type, bar))
+        if len(batch) >= 5000:
+            with db:
+                db.executemany(BAR_UPSERT_SQL, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        with db:
+            db.executemany(BAR_UPSERT_SQL, batch)
+        total += len(batch)
+    db.close()
+    print(f"✅ {total} bars written")
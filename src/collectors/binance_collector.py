@@ -1,19 +1,124 @@
 import websocket
 import json
-import sqlite3
+import logging
 from datetime import datetime
 import threading
 import time
 import urllib3
+from bar_aggregator import BAR_UPSERT_SQL, BarAggregator, CREATE_TABLE_SQL as TRADE_BARS_TABLE_SQL, make_row as make_bar_row
+from database import DB_PATH, connect
+from db_writer import get_writer
+from indicator_store import CREATE_TABLE_SQL as INDICATORS_TABLE_SQL, INDICATOR_UPSERT_SQL, make_row, missing_rows
+from live_feed import get_publisher
+from migrations import create_tables, migrate
+from order_book import LocalOrderBook
+from orderbook_codec import encode
+from stream_stats import StreamStats
+from streaming import registry as indicator_registry
+from trade_flow import WINDOWS as FLOW_WINDOWS, registry as flow_registry
+from trade_rollup import (CREATE_TABLE_SQL as TRADES_1M_TABLE_SQL, MINUTE_MS, MINUTE_UPSERT_SQL, RAW_SECONDS_SQL,
+                          load_minutes)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# 逐条消息的明细只在 DEBUG 级别输出（--verbose），平时由 StreamStats 定时输出汇总行
+logger = logging.getLogger(__name__)
+
+TRADE_INSERT_SQL = '''
+    INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker, trade_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# 档位打包为 float64 BLOB，买卖总量和失衡度写入时算好（见 orderbook_codec）
+ORDERBOOK_INSERT_SQL = '''
+    INSERT INTO orderbook (symbol, timestamp, bids_blob, asks_blob, bid_total, ask_total, imbalance)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# 同一根K线重复写入时覆盖旧值（依赖 (symbol, interval, open_time) 唯一索引）
+KLINE_UPSERT_SQL = '''
+    INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume,
+                        close_time, quote_volume, trades_count, taker_buy_volume, taker_buy_quote_volume)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol, interval, open_time) DO UPDATE SET
+        open = excluded.open,
+        high = excluded.high,
+        low = excluded.low,
+        close = excluded.close,
+        volume = excluded.volume,
+        close_time = excluded.close_time,
+        quote_volume = excluded.quote_volume,
+        trades_count = excluded.trades_count,
+        taker_buy_volume = excluded.taker_buy_volume,
+        taker_buy_quote_volume = excluded.taker_buy_quote_volume
+'''
+
+TICKER_INSERT_SQL = '''
+    INSERT INTO ticker_24h VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+KLINE_INTERVALS = ['1m', '5m', '15m', '30m', '1h', '4h', '1d']
+
+INTERVAL_MS = {
+    '1m': 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '4h': 4 * 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000
+}
+
+# 冷启动（库中没有该周期数据）时默认回补的K线根数
+DEFAULT_LOOKBACK = {
+    '1m': 500,   # 最近500分钟
+    '5m': 500,   # 最近2500分钟
+    '15m': 500,  # 最近7500分钟
+    '30m': 500,  # 最近15000分钟
+    '1h': 500,   # 最近500小时
+    '4h': 500,   # 最近2000小时
+    '1d': 365    # 最近365天
+}
+
+MAX_KLINES_PER_REQUEST = 1000
+
+INDICATOR_SEED_CANDLES = 200       # 启动时用最近多少根K线预热增量指标
+
+ORDERBOOK_DEPTH = 20                # 保存/统计的档位数
+ORDERBOOK_SNAPSHOT_INTERVAL = 1.0   # 订单簿快照保存间隔（秒）
+TRADE_BAR_TYPES = ('time:1',)       # 由逐笔成交实时聚合的K线类型（见 bar_aggregator）
+BAR_FLUSH_INTERVAL = 1.0            # 没有新成交时结束时间K线的检查间隔（秒）
+BAR_FLUSH_DELAY_MS = 1000           # 本机时间超过时间格这么久才结束该K线，容忍时钟偏差和晚到的成交
+
 class BinanceDataCollector:
-    def __init__(self, symbol='ethusdt'):
+    def __init__(self, symbol='ethusdt', backfill_days=None,
+                 orderbook_snapshot_interval=ORDERBOOK_SNAPSHOT_INTERVAL, stats=None,
+                 bar_types=TRADE_BAR_TYPES, live=True):
+        """
+        symbol: 交易对
+        backfill_days: 深度回补天数（None 表示只增量回补）
+        orderbook_snapshot_interval: 订单簿快照保存间隔（秒）
+        stats: 数据流统计，多个采集器可共用一个（None 时自建）
+        bar_types: 由成交流聚合并写入 trade_bars 表的K线类型，如 ('time:1', 'volume:100')
+        live: 是否把最新价格、买卖比和收盘K线推送给 Web 界面，并通知 Web 进程有新数据写入（见 live_feed）
+        """
         self.symbol = symbol.lower()
-        self.db = sqlite3.connect('crypto_data.db', check_same_thread=False)
-        self.lock = threading.Lock()
+        self.stats = stats or StreamStats()
+        self.bar_aggregators = [BarAggregator(bar_type) for bar_type in bar_types]
+        self._bar_lock = threading.Lock()   # 采集线程逐笔累加，定时任务结束时间K线
+        # 本地订单簿由 100ms 增量流维护，按设定间隔落库
+        self.order_book = LocalOrderBook(self.symbol)
+        self.orderbook_snapshot_interval = orderbook_snapshot_interval
+        self._last_orderbook_save = 0.0
+        self.db = connect(DB_PATH, check_same_thread=False)
         self.init_database()
-        self.fetch_historical_klines()  # 获取历史K线
+        # 所有实时写入都交给共享的单写线程批量提交
+        self.writer = get_writer(DB_PATH)
+        self.live = get_publisher() if live else None
+        if self.live is not None:
+            self.writer.add_commit_listener(self.live.committed)
+        self.fetch_historical_klines(backfill_days)  # 增量回补历史K线
+        self.seed_indicators()
+        self.seed_trade_flow()
         
     def init_database(self):
         """初始化数据库表"""
@@ -44,8 +149,13 @@ class BinanceDataCollector:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 symbol TEXT,
                 timestamp INTEGER,
-                bids TEXT,
-                asks TEXT
+                bids TEXT,          -- 旧版JSON格式，新数据不再写入
+                asks TEXT,
+                bids_blob BLOB,
+                asks_blob BLOB,
+                bid_total REAL,
+                ask_total REAL,
+                imbalance REAL
             )
         ''')
         
@@ -103,102 +213,262 @@ class BinanceDataCollector:
             cursor.execute('ALTER TABLE ticker_24h ADD COLUMN symbol TEXT')
         except:
             pass
-        
+
         self.db.commit()
+
+        # 按唯一键 upsert 的表：技术指标快照（每根收盘K线一行）、成交聚合K线（秒级/成交量/成交额/笔数K线）、
+        # 每分钟买卖量汇总，与唯一索引一起建立
+        create_tables(self.db, {
+            'indicators': INDICATORS_TABLE_SQL,
+            'trade_bars': TRADE_BARS_TABLE_SQL,
+            'trades_1m': TRADES_1M_TABLE_SQL,
+        })
+        migrate(self.db)
         print("✅ Database initialized")
     
-    def fetch_historical_klines(self):
-        """获取历史K线数据"""
-        import requests
-        
-        intervals = ['1m', '5m', '15m', '30m', '1h', '4h', '1d']
-        limits = {
-            '1m': 500,   # 最近500分钟
-            '5m': 500,   # 最近2500分钟
-            '15m': 500,  # 最近7500分钟
-            '30m': 500,  # 最近15000分钟
-            '1h': 500,   # 最近500小时
-            '4h': 500,   # 最近2000小时
-            '1d': 365    # 最近365天
-        }
-        
+    def fetch_historical_klines(self, backfill_days=None):
+        """
+        增量回补历史K线
+        每个周期从库中最后一根已收盘K线之后开始，按页(1000根)向前拉取到当前时间；
+        库里已完整的页直接跳过，中断后重新运行即可从断点继续
+        backfill_days: 深度回补天数；不指定时冷启动只取默认根数，热启动只补缺口
+        """
         print(f"\n📋 正在获取 {self.symbol.upper()} 的历史K线数据...")
         
-        for interval in intervals:
+        for interval in KLINE_INTERVALS:
             try:
-                url = "https://api.binance.com/api/v3/klines"
-                params = {
-                    'symbol': self.symbol.upper(),
-                    'interval': interval,
-                    'limit': limits[interval]
-                }
-                
-                response = requests.get(url, params=params, timeout=10, verify=False)
-                
-                if response.status_code == 200:
-                    klines = response.json()
-                    
-                    with self.lock:
-                        cursor = self.db.cursor()
-                        count = 0
-                        
-                        for k in klines:
-                            # k = [open_time, open, high, low, close, volume, close_time, quote_volume, trades, taker_buy_volume, taker_buy_quote_volume, ignore]
-                            cursor.execute('''
-                                INSERT INTO klines VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            ''', (
-                                self.symbol,
-                                interval,
-                                int(k[0]),      # open_time
-                                float(k[1]),    # open
-                                float(k[2]),    # high
-                                float(k[3]),    # low
-                                float(k[4]),    # close
-                                float(k[5]),    # volume
-                                int(k[6]),      # close_time
-                                float(k[7]),    # quote_volume
-                                int(k[8]),      # trades_count
-                                float(k[9]),    # taker_buy_volume
-                                float(k[10])    # taker_buy_quote_volume
-                            ))
-                            count += 1
-                        
-                        self.db.commit()
-                    
+                count = self.backfill_interval(interval, backfill_days)
+                if count:
                     print(f"  ✅ {interval:3s}: 获取 {count} 条K线")
-                    time.sleep(0.5)  # 避免请求限制
-                    
                 else:
-                    print(f"  ❌ {interval}: API错误 {response.status_code}")
-                    
+                    print(f"  ✅ {interval:3s}: 已是最新")
             except Exception as e:
                 print(f"  ❌ {interval}: 获取失败 - {e}")
         
+        self.writer.flush()
         print(f"✅ 历史K线数据获取完成!\n")
     
-    def collect_trades(self):
-        """采集实时成交数据"""
-        def on_message(ws, message):
+    def seed_indicators(self):
+        """
+        用库中最近的已收盘K线预热增量指标，之后每根收盘K线 O(1) 更新；
+        同时为回补进来的K线补齐指标表
+        """
+        for interval in KLINE_INTERVALS:
+            rows = self.db.execute('''
+                SELECT open_time, open, high, low, close FROM klines
+                WHERE symbol = ? AND interval = ?
+                ORDER BY open_time DESC LIMIT ?
+            ''', (self.symbol, interval, INDICATOR_SEED_CANDLES)).fetchall()
+            indicator_registry.seed(self.symbol, interval, reversed(rows))
+            self.writer.submit_many(INDICATOR_UPSERT_SQL, missing_rows(self.db, self.symbol, interval))
+        self.writer.flush()
+    
+    def seed_trade_flow(self):
+        """
+        用 trades_1m 预热滚动成交统计，汇总表之后的原始成交按秒聚合补上；
+        补出的完整分钟写回 trades_1m（采集器停机前最后几分钟的汇总）
+        """
+        now_ms = int(time.time() * 1000)
+        start = (now_ms - max(FLOW_WINDOWS.values()) * 1000) // MINUTE_MS * MINUTE_MS
+        minutes = load_minutes(self.db, self.symbol, start)
+        raw_from = minutes[-1][0] + MINUTE_MS if minutes else start
+        seconds = self.db.execute(RAW_SECONDS_SQL, (self.symbol, raw_from)).fetchall()
+        completed = flow_registry.seed(self.symbol, minutes, seconds, since_ms=start)
+        self.writer.submit_many(MINUTE_UPSERT_SQL, [(self.symbol,) + row for row in completed])
+    
+    def backfill_interval(self, interval, backfill_days=None):
+        """回补单个周期的K线，返回写入的K线数量"""
+        import requests
+        
+        step = INTERVAL_MS[interval]
+        now_ms = int(time.time() * 1000)
+        current_open = now_ms // step * step  # 当前未收盘K线的开盘时间
+        
+        if backfill_days:
+            start = current_open - backfill_days * 86400000
+        else:
+            last = self.db.execute(
+                'SELECT MAX(open_time) FROM klines WHERE symbol = ? AND interval = ?',
+                (self.symbol, interval)
+            ).fetchone()[0]
+            if last is not None:
+                start = last + step
+            else:
+                start = current_open - DEFAULT_LOOKBACK[interval] * step
+        
+        count = 0
+        while start < current_open:
+            page_end = min(start + (MAX_KLINES_PER_REQUEST - 1) * step, current_open - step)
+            
+            # 整页数据已在库中（例如深度回补中断后重跑），跳过请求
+            have = self.db.execute(
+                'SELECT COUNT(*) FROM klines WHERE symbol = ? AND interval = ? AND open_time BETWEEN ? AND ?',
+                (self.symbol, interval, start, page_end)
+            ).fetchone()[0]
+            if have >= (page_end - start) // step + 1:
+                start = page_end + step
+                continue
+            
+            params = {
+                'symbol': self.symbol.upper(),
+                'interval': interval,
+                'startTime': start,
+                'endTime': page_end,
+                'limit': MAX_KLINES_PER_REQUEST
+            }
+            response = requests.get("https://api.binance.com/api/v3/klines", params=params, timeout=10, verify=False)
+            if response.status_code != 200:
+                raise Exception(f"API错误 {response.status_code}")
+            
+            klines = response.json()
+            
+            # k = [open_time, open, high, low, close, volume, close_time, quote_volume, trades, taker_buy_volume, taker_buy_quote_volume, ignore]
+            # 只保存已收盘的K线，未收盘的由实时流在收盘时写入
+            rows = [(
+                self.symbol,
+                interval,
+                int(k[0]),      # open_time
+                float(k[1]),    # open
+                float(k[2]),    # high
+                float(k[3]),    # low
+                float(k[4]),    # close
+                float(k[5]),    # volume
+                int(k[6]),      # close_time
+                float(k[7]),    # quote_volume
+                int(k[8]),      # trades_count
+                float(k[9]),    # taker_buy_volume
+                float(k[10])    # taker_buy_quote_volume
+            ) for k in klines if int(k[6]) < now_ms]
+            self.writer.submit_many(KLINE_UPSERT_SQL, rows)
+            count += len(rows)
+            
+            start = page_end + step
+            if start < current_open:
+                time.sleep(0.2)  # 多页回补时避免请求限制
+        
+        return count
+    
+    def handle_trade(self, data):
+        """处理一条聚合成交消息"""
+        try:
+            # 聚合成交数据格式: a=聚合ID, p=价格, q=数量, T=时间, m=买方是否maker
+            self.writer.submit(TRADE_INSERT_SQL, (
+                self.symbol,
+                data['T'],
+                float(data['p']),
+                float(data['q']),
+                1 if data['m'] else 0,
+                data.get('a', data.get('t', 0))  # 使用聚合ID或交易ID
+            ))
+            for row in flow_registry.add(self.symbol, data['T'], float(data['p']), float(data['q']), data['m']):
+                self.writer.submit(MINUTE_UPSERT_SQL, (self.symbol,) + row)
+            with self._bar_lock:
+                for aggregator in self.bar_aggregators:
+                    for bar in aggregator.add(data['T'], float(data['p']), float(data['q']), data['m'],
+                                              data.get('a', data.get('t', 0))):
+                        self.writer.submit(BAR_UPSERT_SQL, make_bar_row(self.symbol, aggregator.bar_type, bar))
+            if self.live is not None:
+                self.live.trade(self.symbol, data['T'], float(data['p']), float(data['q']), data['m'])
+            self.stats.record(self.symbol, 'trade')
+            self.stats.set_latest(self.symbol, 'price', data['p'])
+            logger.debug("[Trade] Price: $%s, Qty: %s, Buyer: %s", data['p'], data['q'], 'No' if data['m'] else 'Yes')
+        except Exception as e:
+            print(f"Trade error: {e}")
+    
+    def flush_bars(self, force=False):
+        """
+        结束已过了时间格的时间K线并写入（成交稀少时等不到下一笔成交来结束），返回写入的K线数
+        force: 停止采集时强制结束所有未完成的K线
+        """
+        now_ms = None if force else int(time.time() * 1000) - BAR_FLUSH_DELAY_MS
+        count = 0
+        with self._bar_lock:
+            for aggregator in self.bar_aggregators:
+                for bar in aggregator.flush(now_ms):
+                    self.writer.submit(BAR_UPSERT_SQL, make_bar_row(self.symbol, aggregator.bar_type, bar))
+                    count += 1
+        return count
+    
+    def collect_bar_flush(self):
+        """定时结束时间K线（每 BAR_FLUSH_INTERVAL 秒一次）"""
+        while True:
+            time.sleep(BAR_FLUSH_INTERVAL)
             try:
-                data = json.loads(message)
-                # 聚合成交数据格式: a=聚合ID, p=价格, q=数量, T=时间, m=买方是否maker
-                with self.lock:
-                    cursor = self.db.cursor()
-                    cursor.execute('''
-                        INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker, trade_id)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
-                        self.symbol,
-                        data['T'],
-                        float(data['p']),
-                        float(data['q']),
-                        1 if data['m'] else 0,
-                        data.get('a', data.get('t', 0))  # 使用聚合ID或交易ID
-                    ))
-                    self.db.commit()
-                print(f"[Trade] Price: ${data['p']}, Qty: {data['q']}, Buyer: {'Yes' if not data['m'] else 'No'}")
+                self.flush_bars()
             except Exception as e:
-                print(f"Trade error: {e}")
+                print(f"Bar flush error: {e}")
+    
+    def handle_depth(self, data):
+        """处理一条深度增量消息：更新本地订单簿，按设定间隔保存前20档快照"""
+        try:
+            # 增量数据格式: U/u=首/末更新ID, b=买盘变化, a=卖盘变化（数量为0表示删除该价位）
+            self.stats.record(self.symbol, 'depth')
+            if not self.order_book.process(data):
+                return
+            
+            now = time.monotonic()
+            if now - self._last_orderbook_save < self.orderbook_snapshot_interval:
+                return
+            
+            top = self.order_book.top(ORDERBOOK_DEPTH)
+            if not top['bids'] or not top['asks']:
+                return
+            self._last_orderbook_save = now
+                
+            encoded = encode(top['bids'], top['asks'])
+            self.writer.submit(ORDERBOOK_INSERT_SQL, (
+                self.symbol,
+                int(datetime.now().timestamp() * 1000),
+            ) + encoded)
+            
+            # 计算买卖压力
+            total_bids, total_asks = encoded[2], encoded[3]
+            ratio = total_bids / total_asks if total_asks > 0 else 0
+            self.stats.set_latest(self.symbol, 'bid/ask', f"{ratio:.2f}")
+            logger.debug("[OrderBook] Bid/Ask Ratio: %.2f (Bids: %.2f, Asks: %.2f)", ratio, total_bids, total_asks)
+        except Exception as e:
+            print(f"OrderBook error: {e}")
+    
+    def handle_kline(self, data):
+        """处理一条K线消息（只保存已收盘的K线）"""
+        try:
+            k = data['k']
+            interval = k['i']
+            self.stats.record(self.symbol, 'kline')
+            if k['x']:  # K线已完成
+                self.writer.submit(KLINE_UPSERT_SQL, (
+                    self.symbol,
+                    interval,
+                    k['t'], float(k['o']), float(k['h']), float(k['l']),
+                    float(k['c']), float(k['v']), k['T'], float(k['q']),
+                    k['n'], float(k['V']), float(k['Q'])
+                ))
+                if indicator_registry.update(self.symbol, interval, k['t'], float(k['h']), float(k['l']), float(k['c'])):
+                    # 收盘时写一次指标快照，之后的读取不再重算
+                    values = indicator_registry.values(self.symbol, interval)
+                    if values is not None:
+                        self.writer.submit(INDICATOR_UPSERT_SQL, make_row(self.symbol, interval, k['t'], values))
+                if self.live is not None:
+                    self.live.kline(self.symbol, interval, k['t'], float(k['o']), float(k['h']), float(k['l']),
+                                    float(k['c']), float(k['v']), k['T'])
+                logger.debug("[Kline-%s] Close: $%s, Volume: %s, Trades: %s", interval, k['c'], k['v'], k['n'])
+        except Exception as e:
+            print(f"Kline error: {e}")
+    
+    def stream_handlers(self):
+        """本交易对订阅的全部数据流 -> 处理函数（组合流按stream名称分发）"""
+        handlers = {
+            f"{self.symbol}@aggTrade": self.handle_trade,
+            f"{self.symbol}@depth@100ms": self.handle_depth,
+        }
+        for interval in KLINE_INTERVALS:
+            handlers[f"{self.symbol}@kline_{interval}"] = self.handle_kline
+        return handlers
+    
+    def collect_trades(self):
+        """采集实时成交数据（独立连接）"""
+        def on_message(ws, message):
+            self.handle_trade(json.loads(message))
         
         def on_error(ws, error):
             print(f"Trade WebSocket Error: {error}")
@@ -218,37 +488,9 @@ class BinanceDataCollector:
         ws.run_forever()
     
     def collect_orderbook(self):
-        """采集订单簿数据（每秒一次）"""
+        """采集订单簿数据（每秒一次，独立连接）"""
         def on_message(ws, message):
-            try:
-                data = json.loads(message)
-                # 深度数据格式: bids=买盘, asks=卖盘
-                bids = data.get('bids', [])
-                asks = data.get('asks', [])
-                
-                if not bids or not asks:
-                    return
-                    
-                with self.lock:
-                    cursor = self.db.cursor()
-                    cursor.execute('''
-                        INSERT INTO orderbook (symbol, timestamp, bids, asks)
-                        VALUES (?, ?, ?, ?)
-                    ''', (
-                        self.symbol,
-                        int(datetime.now().timestamp() * 1000),
-                        json.dumps(bids[:20]),
-                        json.dumps(asks[:20])
-                    ))
-                    self.db.commit()
-                
-                # 计算买卖压力
-                total_bids = sum([float(b[1]) for b in bids[:20]])
-                total_asks = sum([float(a[1]) for a in asks[:20]])
-                ratio = total_bids / total_asks if total_asks > 0 else 0
-                print(f"[OrderBook] Bid/Ask Ratio: {ratio:.2f} (Bids: {total_bids:.2f}, Asks: {total_asks:.2f})")
-            except Exception as e:
-                print(f"OrderBook error: {e}")
+            self.handle_depth(json.loads(message))
         
         def on_error(ws, error):
             print(f"OrderBook WebSocket Error: {error}")
@@ -258,7 +500,7 @@ class BinanceDataCollector:
             time.sleep(5)
             self.collect_orderbook()
         
-        ws_url = f"wss://stream.binance.com:9443/ws/{self.symbol}@depth@1000ms"
+        ws_url = f"wss://stream.binance.com:9443/ws/{self.symbol}@depth@100ms"
         ws = websocket.WebSocketApp(
             ws_url, 
             on_message=on_message, 
@@ -268,27 +510,9 @@ class BinanceDataCollector:
         ws.run_forever()
     
     def collect_klines(self, interval='1m'):
-        """采集K线数据"""
+        """采集K线数据（独立连接）"""
         def on_message(ws, message):
-            try:
-                data = json.loads(message)
-                k = data['k']
-                if k['x']:  # K线已完成
-                    with self.lock:
-                        cursor = self.db.cursor()
-                        cursor.execute('''
-                            INSERT INTO klines VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            self.symbol,
-                            interval,
-                            k['t'], float(k['o']), float(k['h']), float(k['l']),
-                            float(k['c']), float(k['v']), k['T'], float(k['q']),
-                            k['n'], float(k['V']), float(k['Q'])
-                        ))
-                        self.db.commit()
-                    print(f"[Kline-{interval}] Close: ${k['c']}, Volume: {k['v']}, Trades: {k['n']}")
-            except Exception as e:
-                print(f"Kline error: {e}")
+            self.handle_kline(json.loads(message))
         
         def on_error(ws, error):
             print(f"Kline WebSocket Error: {error}")
@@ -307,70 +531,76 @@ class BinanceDataCollector:
         )
         ws.run_forever()
     
-    def collect_ticker_24h(self):
-        """采集24小时统计数据（每分钟一次）"""
+    def fetch_ticker_24h(self):
+        """获取一次24小时统计数据"""
         import requests
         
-        while True:
-            try:
-                url = f"https://api.binance.com/api/v3/ticker/24hr"
-                params = {'symbol': self.symbol.upper()}
-                response = requests.get(url, params=params, timeout=10, verify=False)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    with self.lock:
-                        cursor = self.db.cursor()
-                        cursor.execute('''
-                            INSERT INTO ticker_24h VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            self.symbol,
-                            int(datetime.now().timestamp() * 1000),
-                            float(data['priceChange']),
-                            float(data['priceChangePercent']),
-                            float(data['weightedAvgPrice']),
-                            float(data['lastPrice']),
-                            float(data['volume']),
-                            float(data['quoteVolume'])
-                        ))
-                        self.db.commit()
-                    print(f"[24h Stats] Price: ${data['lastPrice']}, Change: {data['priceChangePercent']}%, Volume: {data['volume']}")
-                else:
-                    print(f"24h Stats API error: {response.status_code}")
-                
-            except Exception as e:
-                print(f"24h Stats error: {e}")
+        try:
+            url = f"https://api.binance.com/api/v3/ticker/24hr"
+            params = {'symbol': self.symbol.upper()}
+            response = requests.get(url, params=params, timeout=10, verify=False)
+            
+            if response.status_code == 200:
+                data = response.json()
+                self.writer.submit(TICKER_INSERT_SQL, (
+                    self.symbol,
+                    int(datetime.now().timestamp() * 1000),
+                    float(data['priceChange']),
+                    float(data['priceChangePercent']),
+                    float(data['weightedAvgPrice']),
+                    float(data['lastPrice']),
+                    float(data['volume']),
+                    float(data['quoteVolume'])
+                ))
+                print(f"[24h Stats] Price: ${data['lastPrice']}, Change: {data['priceChangePercent']}%, Volume: {data['volume']}")
+            else:
+                print(f"24h Stats API error: {response.status_code}")
             
+        except Exception as e:
+            print(f"24h Stats error: {e}")
+    
+    def collect_ticker_24h(self):
+        """采集24小时统计数据（每分钟一次）"""
+        while True:
+            self.fetch_ticker_24h()
             time.sleep(60)  # 每分钟更新一次
     
-    def start_collection(self):
-        """启动多线程采集"""
+    def start_collection(self, combined=True):
+        """
+        启动多线程采集
+        combined: True 时所有数据流共用一个组合流连接；False 时每个数据流一个连接/线程
+        """
         print(f"🚀 Starting data collection for {self.symbol.upper()}...")
         
-        # 多时间周期K线采集
-        kline_intervals = ['1m', '5m', '15m', '30m', '1h', '4h', '1d']
-        
         threads = [
-            threading.Thread(target=self.collect_trades, daemon=True, name="Trades"),
-            threading.Thread(target=self.collect_orderbook, daemon=True, name="OrderBook"),
             threading.Thread(target=self.collect_ticker_24h, daemon=True, name="24h Stats"),
         ]
+        if self.bar_aggregators:
+            threads.append(threading.Thread(target=self.collect_bar_flush, daemon=True, name="Bar Flush"))
         
-        # 为每个时间周期创建独立的K线采集线程
-        for interval in kline_intervals:
-            t = threading.Thread(
-                target=self.collect_klines, 
-                args=(interval,),
-                daemon=True, 
-                name=f"Kline-{interval}"
-            )
-            threads.append(t)
+        if combined:
+            from combined_stream import CombinedStream
+            threads.extend(CombinedStream([self]).threads())
+        else:
+            threads.append(threading.Thread(target=self.collect_trades, daemon=True, name="Trades"))
+            threads.append(threading.Thread(target=self.collect_orderbook, daemon=True, name="OrderBook"))
+            
+            # 为每个时间周期创建独立的K线采集线程
+            for interval in KLINE_INTERVALS:
+                t = threading.Thread(
+                    target=self.collect_klines, 
+                    args=(interval,),
+                    daemon=True, 
+                    name=f"Kline-{interval}"
+                )
+                threads.append(t)
         
         for t in threads:
             t.start()
             print(f"✅ {t.name} thread started")
         
-        print("📊 Data collection running...\n")
+        self.stats.start()
+        print(f"📊 Data collection running... (status every {self.stats.interval}s, --verbose for per-message logs)\n")
         
         # 保持主线程运行
         try:
@@ -378,7 +608,24 @@ class BinanceDataCollector:
                 t.join()
         except KeyboardInterrupt:
             print("\n⛔ Stopping data collection...")
+            self.flush_bars(force=True)
+            self.writer.flush(timeout=10)
+            self.writer.print_stats()
 
 if __name__ == '__main__':
-    collector = BinanceDataCollector('ethusdt')
+    import sys
+    
+    # 用法: python binance_collector.py [symbol] [--backfill-days N] [--verbose]
+    args = sys.argv[1:]
+    if '--verbose' in args:
+        args.remove('--verbose')
+        logging.basicConfig(level=logging.DEBUG, format='%(message)s')
+    backfill_days = None
+    if '--backfill-days' in args:
+        idx = args.index('--backfill-days')
+        backfill_days = int(args[idx + 1])
+        del args[idx:idx + 2]
+    
+    symbol = args[0] if args else 'ethusdt'
+    collector = BinanceDataCollector(symbol, backfill_days=backfill_days)
     collector.start_collection()
@@ -0,0 +1,73 @@
+"""
+组合流采集 - 一个WebSocket连接订阅多个交易对的全部数据流
+消息格式为 {"stream": "<名称>", "data": {...}}，按 stream 名称分发给对应采集器的处理函数
+"""
+import json
+import threading
+import time
+
+import websocket
+
+BASE_URL = "wss://stream.binance.com:9443/stream?streams="
+
+# 币安单连接最多1024个stream，这里留足余量并控制URL长度
+MAX_STREAMS_PER_CONNECTION = 200
+
+
+class CombinedStream:
+    """组合流：多个采集器共用少量连接"""
+
+    def __init__(self, collectors, streams_per_connection=MAX_STREAMS_PER_CONNECTION):
+        """
+        collectors: 提供 stream_handlers() 的采集器列表（如 BinanceDataCollector）
+        streams_per_connection: 每个连接订阅的最大stream数
+        """
+        self.handlers = {}
+        for collector in collectors:
+            self.handlers.update(collector.stream_handlers())
+
+        names = list(self.handlers)
+        self.groups = [
+            names[i:i + streams_per_connection]
+            for i in range(0, len(names), streams_per_connection)
+        ]
+
+    def dispatch(self, message):
+        """把一条组合流消息交给对应的处理函数"""
+        try:
+            payload = json.loads(message)
+        except ValueError as e:
+            print(f"Combined stream decode error: {e}")
+            return
+
+        handler = self.handlers.get(payload.get('stream'))
+        if handler:
+            handler(payload['data'])
+
+    def run_connection(self, streams):
+        """维持一个组合流连接，断线后自动重连"""
+        url = BASE_URL + '/'.join(streams)
+
+        def on_message(ws, message):
+            self.dispatch(message)
+
+        def on_error(ws, error):
+            print(f"Combined WebSocket Error: {error}")
+
+        while True:
+            ws = websocket.WebSocketApp(url, on_message=on_message, on_error=on_error)
+            ws.run_forever()
+            print(f"Combined WebSocket closed ({len(streams)} streams), reconnecting...")
+            time.sleep(5)
+
+    def threads(self):
+        """每个连接一个线程（未启动）"""
+        return [
+            threading.Thread(
+                target=self.run_connection,
+                args=(streams,),
+                daemon=True,
+                name=f"Combined-{i + 1}"
+            )
+            for i, streams in enumerate(self.groups)
+        ]
@@ -2,21 +2,49 @@
 合约数据采集器 - 获取持仓量、资金费率、多空比等
 """
 import requests
-import sqlite3
 import time
 from datetime import datetime
 import urllib3
+from database import DB_PATH, connect
+from db_writer import get_writer
+from live_feed import get_publisher
+from migrations import migrate
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+OPEN_INTEREST_INSERT_SQL = '''
+    INSERT INTO open_interest (symbol, timestamp, open_interest, open_interest_value)
+    VALUES (?, ?, ?, ?)
+'''
+
+FUNDING_RATE_INSERT_SQL = '''
+    INSERT INTO funding_rate (symbol, timestamp, funding_rate, next_funding_time)
+    VALUES (?, ?, ?, ?)
+'''
+
+LONG_SHORT_RATIO_INSERT_SQL = '''
+    INSERT INTO long_short_ratio (symbol, timestamp, long_short_ratio, long_account, short_account)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+TOP_TRADER_POSITION_INSERT_SQL = '''
+    INSERT INTO top_trader_position 
+    (symbol, timestamp, long_position_ratio, short_position_ratio, long_account_ratio, short_account_ratio)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
 class FuturesDataCollector:
-    def __init__(self, symbol='ETHUSDT'):
+    def __init__(self, symbol='ETHUSDT', live=True):
         """
         初始化合约数据采集器
         symbol: 交易对（大写），如 'ETHUSDT', 'BTCUSDT'
+        live: 是否在每批写入提交后通知 Web 进程（响应缓存据此失效，见 live_feed）
         """
         self.symbol = symbol.upper()
-        self.db = sqlite3.connect('crypto_data.db', check_same_thread=False)
+        self.db = connect(DB_PATH, check_same_thread=False)
         self.init_database()
+        self.writer = get_writer(DB_PATH)
+        if live:
+            self.writer.add_commit_listener(get_publisher().committed)
     
     def init_database(self):
         """初始化数据库表"""
@@ -70,6 +98,7 @@ class FuturesDataCollector:
         ''')
         
         self.db.commit()
+        migrate(self.db)
         print("✅ Futures database initialized")
     
     def fetch_open_interest(self):
@@ -83,17 +112,12 @@ class FuturesDataCollector:
             if response.status_code == 200:
                 data = response.json()
                 
-                cursor = self.db.cursor()
-                cursor.execute('''
-                    INSERT INTO open_interest (symbol, timestamp, open_interest, open_interest_value)
-                    VALUES (?, ?, ?, ?)
-                ''', (
+                self.writer.submit(OPEN_INTEREST_INSERT_SQL, (
                     self.symbol.lower(),
                     int(datetime.now().timestamp() * 1000),
                     float(data.get('openInterest', 0)),
                     float(data.get('openInterest', 0)) * self._get_current_price()
                 ))
-                self.db.commit()
                 
                 print(f"[OI] {self.symbol}: {float(data.get('openInterest', 0)):.2f}")
                 return True
@@ -116,17 +140,12 @@ class FuturesDataCollector:
             if response.status_code == 200:
                 data = response.json()
                 
-                cursor = self.db.cursor()
-                cursor.execute('''
-                    INSERT INTO funding_rate (symbol, timestamp, funding_rate, next_funding_time)
-                    VALUES (?, ?, ?, ?)
-                ''', (
+                self.writer.submit(FUNDING_RATE_INSERT_SQL, (
                     self.symbol.lower(),
                     int(datetime.now().timestamp() * 1000),
                     float(data.get('lastFundingRate', 0)),
                     int(data.get('nextFundingTime', 0))
                 ))
-                self.db.commit()
                 
                 funding_rate_percent = float(data.get('lastFundingRate', 0)) * 100
                 print(f"[FR] {self.symbol}: {funding_rate_percent:.4f}%")
@@ -156,18 +175,13 @@ class FuturesDataCollector:
                 if data and len(data) > 0:
                     latest = data[0]
                     
-                    cursor = self.db.cursor()
-                    cursor.execute('''
-                        INSERT INTO long_short_ratio (symbol, timestamp, long_short_ratio, long_account, short_account)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (
+                    self.writer.submit(LONG_SHORT_RATIO_INSERT_SQL, (
                         self.symbol.lower(),
                         int(latest.get('timestamp', datetime.now().timestamp() * 1000)),
                         float(latest.get('longShortRatio', 1)),
                         float(latest.get('longAccount', 0)),
                         float(latest.get('shortAccount', 0))
                     ))
-                    self.db.commit()
                     
                     print(f"[LSR] {self.symbol}: {float(latest.get('longShortRatio', 1)):.2f}")
                     return True
@@ -196,12 +210,7 @@ class FuturesDataCollector:
                 if data and len(data) > 0:
                     latest = data[0]
                     
-                    cursor = self.db.cursor()
-                    cursor.execute('''
-                        INSERT INTO top_trader_position 
-                        (symbol, timestamp, long_position_ratio, short_position_ratio, long_account_ratio, short_account_ratio)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
+                    self.writer.submit(TOP_TRADER_POSITION_INSERT_SQL, (
                         self.symbol.lower(),
                         int(latest.get('timestamp', datetime.now().timestamp() * 1000)),
                         float(latest.get('longPosition', 0)),
@@ -209,7 +218,6 @@ class FuturesDataCollector:
                         float(latest.get('longAccount', 0)),
                         float(latest.get('shortAccount', 0))
                     ))
-                    self.db.commit()
                     
                     print(f"[TTP] {self.symbol}: Long {float(latest.get('longPosition', 0)):.2f}% | Short {float(latest.get('shortPosition', 0)):.2f}%")
                     return True
@@ -255,6 +263,7 @@ class FuturesDataCollector:
                 
             except KeyboardInterrupt:
                 print("\n⛔ Stopping futures data collection...")
+                self.writer.flush(timeout=10)
                 break
             except Exception as e:
                 print(f"❌ Collection error: {e}")
@@ -0,0 +1,386 @@
+"""
+实时推送 - 采集进程广播最新价格、滚动买卖比和新收盘K线，Web 进程订阅一次后用 SSE 推给所有浏览器
+采集器和 Web 服务是不同的进程（gunicorn 还有多个 worker），消息走本机 UDP 组播（TTL 0，不会离开本机）：
+每个采集进程是一个发布者，每个 Web 进程一个 LiveHub 线程接收，内核把同一条消息复制给所有订阅的进程，
+发布端不需要知道有多少订阅者。价格按 PUSH_INTERVAL 合并后发送，成交再密集也不会放大成同样多的消息；
+浏览器连接只读 LiveHub 的内存，不查询数据库。
+写入器每次提交后还会发一条 commit 事件（本次写入涉及的交易对），Web 进程据此让响应缓存失效（见 response_cache），
+commit 事件不推送给浏览器。
+采集器和 Web 服务在不同容器里时（docker-compose），设置 LIVE_FEED_DIR 为共享卷中的目录，改用 Unix 数据报套接字：
+每个 Web 进程在目录里绑定 hub-<pid>.sock，发布者把每条消息发给目录里的所有套接字，不依赖容器之间的网络。
+消息格式（一个数据报一条 JSON）: {"event": "price" | "kline" | "commit", "symbol": ..., "data": {...}}
+"""
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+from trade_flow import registry as flow_registry
+
+LIVE_GROUP = os.environ.get('LIVE_FEED_GROUP', '239.255.77.1')
+LIVE_PORT = int(os.environ.get('LIVE_FEED_PORT', '5099'))
+LIVE_DIR = os.environ.get('LIVE_FEED_DIR') or None     # 设置时不走组播，改用该目录下的 Unix 套接字
+HUB_REFRESH = 5             # 发布者重新列出目录中 Web 进程套接字的间隔（秒）
+
+PUSH_INTERVAL = 0.5         # 价格事件的合并间隔（秒）
+MAX_TRADES = 20             # 每条价格事件附带的最近成交笔数
+FLOW_WINDOWS = ('1m', '1h') # 随价格推送的买卖比窗口（见 trade_flow）
+
+HEARTBEAT = 15              # SSE 心跳间隔（秒），防止代理断开空闲连接
+MAX_STREAM_SECONDS = 120    # 单个 SSE 连接的最长时间，到期后浏览器自动重连，不长期占用 worker 线程
+# 每个 Web 进程同时保持的 SSE 连接上限：gthread worker 每个连接占一个线程，上限应小于 --threads，
+# 留出的线程给普通 API 请求；超出时返回 503，页面退回轮询，稍后再连
+MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', '16'))
+QUEUE_SIZE = 256            # 每个浏览器连接待发送的事件上限，跟不上的连接丢弃最旧的事件
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+class LivePublisher:
+    """采集进程内的发布者：采集线程只更新内存，后台线程按间隔合并发送"""
+
+    def __init__(self, group=LIVE_GROUP, port=LIVE_PORT, interval=PUSH_INTERVAL, flows=flow_registry,
+                 directory=LIVE_DIR):
+        """
+        flows: 滚动成交统计（默认为本进程共享的注册表）
+        directory: Web 进程套接字所在目录（None 时发到组播地址）
+        """
+        self.address = (group, port)
+        self.directory = directory
+        self.interval = interval
+        self.flows = flows
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._prices = {}       # 交易对 -> (时间, 价格)
+        self._trades = {}       # 交易对 -> 上次发送之后的最近成交
+        self._dirty = set()
+        self._failed = False
+        self._running = False
+        self._thread = None
+        self._hubs = []
+        self._hubs_listed = 0.0
+        if directory is None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 0)
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton('127.0.0.1'))
+        else:
+            # 非阻塞：某个 Web 进程接收缓冲区满时丢弃这条消息，不阻塞采集
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+
+    def trade(self, symbol, timestamp, price, quantity, is_buyer_maker):
+        """记录一笔成交（采集线程调用，只更新内存）"""
+        with self._lock:
+            self._prices[symbol] = (timestamp, price)
+            trades = self._trades.get(symbol)
+            if trades is None:
+                trades = self._trades[symbol] = deque(maxlen=MAX_TRADES)
+            trades.append([timestamp, price, quantity, 'SELL' if is_buyer_maker else 'BUY'])
+            self._dirty.add(symbol)
+
+    def kline(self, symbol, interval, open_time, open_price, high, low, close, volume, close_time):
+        """一根K线收盘（立即发送）"""
+        self.send('kline', symbol, {
+            'interval': interval, 'open_time': open_time, 'open': open_price, 'high': high, 'low': low,
+            'close': close, 'volume': volume, 'close_time': close_time,
+        })
+
+    def committed(self, pending):
+        """
+        BatchWriter 的提交回调（见 db_writer.add_commit_listener），在写线程中调用
+        采集器的写入语句第一个参数都是交易对，据此通知 Web 进程哪些交易对有了新数据
+        """
+        symbols = {row[0] for rows in pending.values() for row in rows if row and isinstance(row[0], str)}
+        if symbols:
+            self.send('commit', None, {'symbols': sorted(symbols)})
+
+    def publish(self):
+        """发送上次之后有成交的交易对的价格事件，返回发送条数"""
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = set()
+            pending = [(symbol, self._prices[symbol], list(self._trades.pop(symbol, ()))) for symbol in dirty]
+        for symbol, (timestamp, price), trades in pending:
+            flow = {}
+            for window in FLOW_WINDOWS:
+                snapshot = self.flows.snapshot(symbol, window, timestamp)
+                flow[window] = round(snapshot['buy_sell_ratio'], 2) if snapshot else None
+            self.send('price', symbol, {
+                'price': price,
+                'timestamp': timestamp,
+                'buy_sell_ratio': flow.get('1h'),
+                'flow': flow,
+                'trades': trades,
+            })
+        return len(pending)
+
+    def _targets(self):
+        if self.directory is None:
+            return [self.address]
+        now = time.monotonic()
+        if now - self._hubs_listed >= HUB_REFRESH:
+            self._hubs_listed = now
+            try:
+                self._hubs = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                              if name.startswith('hub-') and name.endswith('.sock')]
+            except OSError:
+                self._hubs = []
+        return list(self._hubs)
+
+    def send(self, event, symbol, data):
+        payload = json.dumps({'event': event, 'symbol': symbol, 'data': data}, separators=(',', ':')).encode()
+        for target in self._targets():
+            try:
+                self._sock.sendto(payload, target)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Web 进程已退出（套接字文件残留）：不再发送，下次列目录时也不会再出现
+                self._hubs = [hub for hub in self._hubs if hub != target]
+                try:
+                    os.remove(target)
+                except OSError:
+                    pass
+                continue
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                # 没有组播路由等情况下只提示一次，推送失败不影响采集
+                if not self._failed:
+                    self._failed = True
+                    print(f"⚠️ 实时推送发送失败（已忽略）: {e}")
+                continue
+            self.sent += 1
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True, name='LivePublisher')
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2 + 1)
+            self._thread = None
+        self.publish()
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"⚠️ 实时推送错误: {e}")
+
+
+class LiveHub:
+    """Web 进程内的订阅端：一个线程接收组播，保存每个交易对的最新状态，并分发给所有浏览器连接"""
+
+    def __init__(self, group=LIVE_GROUP, port=LIVE_PORT, directory=LIVE_DIR, max_streams=MAX_STREAMS):
+        """
+        directory: 在该目录绑定 Unix 套接字接收（None 时加入组播组）
+        max_streams: 同时保持的 SSE 连接上限（见 stream）
+        """
+        self.address = (group, port)
+        self.directory = directory
+        self.max_streams = max_streams
+        self.path = None
+        self.pid = os.getpid()
+        self.received = 0
+        self._lock = threading.Lock()
+        self._clients = {}      # 队列 -> 关注的交易对集合（None 表示全部）
+        self._listeners = []    # commit 事件的回调
+        self._latest = {}       # (事件, 交易对[, 周期]) -> 最新消息，新连接先收到这些
+        self._running = False
+        self._thread = None
+        self._sock = None
+
+    def start(self):
+        """加入组播组（或绑定目录中的 Unix 套接字）并启动接收线程（端口被占用等情况抛 OSError）"""
+        if self._thread is not None:
+            return self
+        if self.directory is None:
+            group, port = self.address
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(('', port))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                            socket.inet_aton(group) + socket.inet_aton('127.0.0.1'))
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(self.directory, f'hub-{os.getpid()}.sock')
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.path)
+        sock.settimeout(1.0)
+        self._sock = sock
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='LiveHub')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def _run(self):
+        while self._running:
+            try:
+                data = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self.dispatch(json.loads(data))
+            except (ValueError, KeyError):
+                continue
+
+    def add_listener(self, listener):
+        """注册 commit 事件的回调 listener(交易对列表)，在接收线程中调用（同一个回调只注册一次）"""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def dispatch(self, message):
+        """保存最新状态并放入所有关注该交易对的连接队列；commit 事件只交给回调"""
+        event, symbol = message['event'], message['symbol']
+        if event == 'commit':
+            with self._lock:
+                self.received += 1
+                listeners = list(self._listeners)
+            for listener in listeners:
+                try:
+                    listener(message['data']['symbols'])
+                except Exception as e:
+                    print(f"⚠️ LiveHub listener error: {e}")
+            return
+        key = (event, symbol, message['data'].get('interval')) if event == 'kline' else (event, symbol)
+        with self._lock:
+            self.received += 1
+            self._latest[key] = message
+            clients = [q for q, symbols in self._clients.items() if symbols is None or symbol in symbols]
+        for q in clients:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # 慢连接丢弃最旧的事件，不阻塞接收线程
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def subscribe(self, symbols=None, limit=None):
+        """新建一个连接队列；已有 limit 个连接时返回 None"""
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            if limit is not None and len(self._clients) >= limit:
+                return None
+            self._clients[q] = set(symbols) if symbols else None
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._clients.pop(q, None)
+
+    def latest(self, symbols=None):
+        """当前保存的最新状态（新连接的初始数据）"""
+        with self._lock:
+            return [m for m in self._latest.values() if not symbols or m['symbol'] in symbols]
+
+    def clients(self):
+        with self._lock:
+            return len(self._clients)
+
+    def stream(self, symbols=None, heartbeat=HEARTBEAT, max_seconds=MAX_STREAM_SECONDS):
+        """
+        一个浏览器连接的 SSE 文本流（可迭代，响应结束时 close 退订）
+        连接数已达 max_streams 时返回 None，调用方返回 503
+        """
+        q = self.subscribe(symbols, self.max_streams)
+        if q is None:
+            return None
+        return LiveStream(self, q, self._events(q, symbols, heartbeat, max_seconds))
+
+    def _events(self, q, symbols, heartbeat, max_seconds):
+        """先发最新状态，再逐条转发；空闲时发心跳注释"""
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield 'retry: 3000\n\n'
+            for message in self.latest(symbols):
+                yield format_sse(message)
+            while time.monotonic() < deadline:
+                try:
+                    message = q.get(timeout=min(heartbeat, max(deadline - time.monotonic(), 0.01)))
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                yield format_sse(message)
+        finally:
+            self.unsubscribe(q)
+
+
+class LiveStream:
+    """
+    stream() 返回的 SSE 文本流；连接在开始读取之前就断开时生成器的 finally 不会执行，
+    所以由 close（WSGI 在响应结束时调用）负责退订
+    """
+
+    def __init__(self, hub, q, events):
+        self._hub = hub
+        self._q = q
+        self._events = events
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def close(self):
+        self._events.close()
+        self._hub.unsubscribe(self._q)
+
+
+def format_sse(message):
+    data = dict(message['data'], symbol=message['symbol'])
+    return f"event: {message['event']}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+_publisher = None
+_hub = None
+_lock = threading.Lock()
+
+
+def get_publisher():
+    """本进程共享的发布者（首次调用时启动）"""
+    global _publisher
+    with _lock:
+        if _publisher is None:
+            _publisher = LivePublisher().start()
+        return _publisher
+
+
+def get_hub():
+    """本进程共享的订阅端（首次调用时启动；gunicorn fork 出的 worker 各自建一个）"""
+    global _hub
+    with _lock:
+        if _hub is None or _hub.pid != os.getpid():
+            _hub = LiveHub().start()
+        return _hub
@@ -4,15 +4,25 @@
 import threading
 import time
 from binance_collector import BinanceDataCollector
+from combined_stream import CombinedStream
+from rollup_job import TradeRollupJob
+from stream_stats import StreamStats
 
 class MultiCollector:
-    def __init__(self, symbols=['ethusdt', 'btcusdt', 'bnbusdt', 'solusdt', 'berausdt']):
+    def __init__(self, symbols=['ethusdt', 'btcusdt', 'bnbusdt', 'solusdt', 'berausdt'], combined=True,
+                 rollup=True):
         """
         初始化多币种采集器
         symbols: 交易对列表
+        combined: True 时所有交易对的WebSocket数据流共用组合流连接，否则每个交易对独立采集
+        rollup: 是否在本进程运行成交汇总/归档后台任务（见 rollup_job）
         """
         self.symbols = symbols
+        self.combined = combined
+        self.rollup = rollup
         self.collectors = {}
+        # 所有交易对共用一个统计器，定时输出每个交易对一行汇总
+        self.stats = StreamStats()
         
     def start_collection(self):
         """启动所有交易对的数据采集"""
@@ -24,24 +34,54 @@ class MultiCollector:
         for symbol in self.symbols:
             print(f"\n📊 初始化 {symbol.upper()} 数据采集...")
             try:
-                collector = BinanceDataCollector(symbol)
+                collector = BinanceDataCollector(symbol, stats=self.stats)
                 self.collectors[symbol] = collector
                 
-                # 为每个交易对创建独立线程
-                thread = threading.Thread(
-                    target=collector.start_collection, 
-                    daemon=True,
-                    name=f"{symbol.upper()}-Collector"
-                )
+                if self.combined:
+                    # WebSocket数据流统一走组合流，这里只启动REST轮询线程
+                    thread = threading.Thread(
+                        target=collector.collect_ticker_24h,
+                        daemon=True,
+                        name=f"{symbol.upper()}-24h Stats"
+                    )
+                else:
+                    # 为每个交易对创建独立线程
+                    thread = threading.Thread(
+                        target=collector.start_collection, 
+                        daemon=True,
+                        name=f"{symbol.upper()}-Collector"
+                    )
                 thread.start()
                 threads.append(thread)
+                if self.combined and collector.bar_aggregators:
+                    # 单独连接时由 collector.start_collection 自己启动
+                    thread = threading.Thread(
+                        target=collector.collect_bar_flush,
+                        daemon=True,
+                        name=f"{symbol.upper()}-Bar Flush"
+                    )
+                    thread.start()
+                    threads.append(thread)
                 
                 print(f"✅ {symbol.upper()} 采集线程已启动")
-                time.sleep(1)  # 避免同时启动太多连接
+                if not self.combined:
+                    time.sleep(1)  # 避免同时启动太多连接
                 
             except Exception as e:
                 print(f"❌ {symbol.upper()} 启动失败: {e}")
         
+        if self.combined and self.collectors:
+            stream = CombinedStream(self.collectors.values())
+            for thread in stream.threads():
+                thread.start()
+                threads.append(thread)
+            print(f"\n✅ 组合流已启动: {len(stream.handlers)} 个数据流, {len(stream.groups)} 个连接")
+            self.stats.start()
+        
+        if self.rollup and self.collectors:
+            TradeRollupJob().start()
+            print("✅ 成交汇总任务已启动")
+        
         print("\n" + "=" * 60)
         print(f"✅ 已启动 {len(self.collectors)} 个交易对的数据采集")
         print("💡 数据持续采集中... 按 Ctrl+C 停止")
@@ -53,6 +93,10 @@ class MultiCollector:
                 t.join()
         except KeyboardInterrupt:
             print("\n\n⛔ 停止多币种数据采集...")
+            for collector in self.collectors.values():
+                collector.flush_bars(force=True)
+            if self.collectors:
+                next(iter(self.collectors.values())).writer.flush(timeout=10)
             print(f"📊 已采集 {len(self.collectors)} 个交易对的数据")
 
 if __name__ == '__main__':
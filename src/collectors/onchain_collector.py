@@ -1,8 +1,8 @@
 from web3 import Web3
-import sqlite3
 import time
 import requests
 from datetime import datetime
+from database import DB_PATH, connect
 
 class OnchainCollector:
     def __init__(self):
@@ -30,7 +30,7 @@ class OnchainCollector:
         # Etherscan API (免费，需要注册获取key)
         self.etherscan_key = 'YourFreeEtherscanAPIKey'  # 替换为您的key
         
-        self.db = sqlite3.connect('crypto_data.db', check_same_thread=False)
+        self.db = connect(DB_PATH, check_same_thread=False)
         self.init_database()
         
         # 主要交易所冷钱包地址
@@ -0,0 +1,229 @@
+"""
+本地订单簿 - 由 @depth@100ms 增量流 + REST 快照维护完整的买卖盘
+同步流程（币安官方说明）:
+1. 订阅增量流，先缓存收到的事件
+2. 拉取 /api/v3/depth 快照，丢弃 u <= lastUpdateId 的缓存事件
+3. 第一条有效事件需满足 U <= lastUpdateId + 1 <= u，之后每条事件的 U 都应等于上一条的 u + 1
+4. 出现缺口（U > 上一条 u + 1）说明丢了消息，重新拉快照
+价位用 SortedDict 存储，单个价位更新 O(log n)，取前N档不需要排序整本订单簿。
+"""
+import threading
+import time
+from itertools import islice
+
+import requests
+import urllib3
+from sortedcontainers import SortedDict
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+SNAPSHOT_URL = "https://api.binance.com/api/v3/depth"
+SNAPSHOT_LIMIT = 1000
+MAX_BUFFERED_EVENTS = 10000     # 未同步时最多缓存的增量事件
+MAX_SYNC_ATTEMPTS = 5
+
+
+class LocalOrderBook:
+    """单个交易对的本地订单簿"""
+
+    def __init__(self, symbol, fetch_snapshot=None):
+        """
+        symbol: 交易对，如 'ethusdt'
+        fetch_snapshot: 获取快照的函数，默认请求币安REST接口（测试时可替换）
+        """
+        self.symbol = symbol
+        self.fetch_snapshot = fetch_snapshot or self._fetch_snapshot
+
+        # 买盘按价格从高到低（排序键取负数），卖盘按价格从低到高
+        self.bids = SortedDict(lambda price: -price)
+        self.asks = SortedDict()
+        self.last_update_id = None
+        self.synced = False
+        self.resyncs = 0
+
+        self.lock = threading.Lock()
+        self._buffer = []
+        self._syncing = False
+
+    def _fetch_snapshot(self):
+        params = {'symbol': self.symbol.upper(), 'limit': SNAPSHOT_LIMIT}
+        response = requests.get(SNAPSHOT_URL, params=params, timeout=10, verify=False)
+        response.raise_for_status()
+        return response.json()
+
+    # ---------- 同步 ----------
+
+    def process(self, event):
+        """
+        处理一条增量事件（{'U': 首个更新ID, 'u': 最后更新ID, 'b': 买盘, 'a': 卖盘}）
+        返回是否已应用到订单簿；未同步或出现缺口时自动在后台重新同步
+        """
+        with self.lock:
+            if self.synced:
+                if event['u'] <= self.last_update_id:
+                    return False    # 旧事件
+                if event['U'] <= self.last_update_id + 1:
+                    self._apply(event)
+                    return True
+
+                print(f"⚠️ {self.symbol.upper()} depth gap: expected {self.last_update_id + 1}, got {event['U']}, resyncing...")
+                self.synced = False
+                self.resyncs += 1
+                self._buffer = []
+
+            self._buffer.append(event)
+            if len(self._buffer) > MAX_BUFFERED_EVENTS:
+                del self._buffer[0]
+
+        self.request_sync()
+        return False
+
+    def request_sync(self):
+        """在后台线程拉取快照（同一时间只有一个同步线程）"""
+        with self.lock:
+            if self._syncing:
+                return
+            self._syncing = True
+        threading.Thread(target=self.sync, daemon=True, name=f"{self.symbol.upper()}-DepthSync").start()
+
+    def sync(self):
+        """拉取快照并回放缓存的事件，成功返回 True"""
+        try:
+            for attempt in range(MAX_SYNC_ATTEMPTS):
+                try:
+                    snapshot = self.fetch_snapshot()
+                except Exception as e:
+                    print(f"Depth snapshot error ({self.symbol.upper()}): {e}")
+                    snapshot = None
+
+                if snapshot is not None:
+                    with self.lock:
+                        if self.load_snapshot(snapshot):
+                            return True
+                # 快照比缓存的事件还旧，稍后重新拉取
+                time.sleep(0.5 * (attempt + 1))
+
+            print(f"❌ {self.symbol.upper()} depth sync failed after {MAX_SYNC_ATTEMPTS} attempts")
+            return False
+        finally:
+            with self.lock:
+                self._syncing = False
+
+    def load_snapshot(self, snapshot):
+        """
+        用快照重建订单簿并回放缓存事件（调用方需持有 self.lock）
+        快照比第一条缓存事件还旧时返回 False，需要重新拉快照
+        """
+        last_id = snapshot['lastUpdateId']
+        if self._buffer and last_id + 1 < self._buffer[0]['U']:
+            return False
+
+        self.bids.clear()
+        self.asks.clear()
+        self._set_levels(self.bids, snapshot['bids'])
+        self._set_levels(self.asks, snapshot['asks'])
+        self.last_update_id = last_id
+
+        for event in self._buffer:
+            if event['u'] <= self.last_update_id:
+                continue
+            if event['U'] > self.last_update_id + 1:
+                # 缓存中间就有缺口，只能等更新的快照
+                self._buffer = [e for e in self._buffer if e['u'] > self.last_update_id]
+                return False
+            self._apply(event)
+
+        self._buffer = []
+        self.synced = True
+        return True
+
+    def _apply(self, event):
+        self._set_levels(self.bids, event['b'])
+        self._set_levels(self.asks, event['a'])
+        self.last_update_id = event['u']
+
+    @staticmethod
+    def _set_levels(side, levels):
+        for price, qty in levels:
+            price = float(price)
+            qty = float(qty)
+            if qty == 0:
+                side.pop(price, None)
+            else:
+                side[price] = qty
+
+    # ---------- 查询（都会持锁，可以在其他线程调用） ----------
+
+    def best_bid(self):
+        """最优买价 (价格, 数量)，空盘返回 None"""
+        with self.lock:
+            return self.bids.peekitem(0) if self.bids else None
+
+    def best_ask(self):
+        """最优卖价 (价格, 数量)，空盘返回 None"""
+        with self.lock:
+            return self.asks.peekitem(0) if self.asks else None
+
+    def mid_price(self):
+        with self.lock:
+            return self._mid_price()
+
+    def spread(self):
+        with self.lock:
+            if not self.bids or not self.asks:
+                return None
+            return self.asks.peekitem(0)[0] - self.bids.peekitem(0)[0]
+
+    def _mid_price(self):
+        # 调用方需持有 self.lock
+        if not self.bids or not self.asks:
+            return None
+        return (self.bids.peekitem(0)[0] + self.asks.peekitem(0)[0]) / 2
+
+    def top(self, n=20):
+        """前N档: {'bids': [[价格, 数量], ...], 'asks': [...]}"""
+        with self.lock:
+            return {
+                'bids': [[p, q] for p, q in islice(self.bids.items(), n)],
+                'asks': [[p, q] for p, q in islice(self.asks.items(), n)],
+            }
+
+    def cumulative_depth(self, n=20):
+        """前N档累计挂单量: {'bids': [[价格, 累计数量], ...], 'asks': [...]}"""
+        result = {}
+        with self.lock:
+            for name, side in (('bids', self.bids), ('asks', self.asks)):
+                total = 0.0
+                levels = []
+                for price, qty in islice(side.items(), n):
+                    total += qty
+                    levels.append([price, total])
+                result[name] = levels
+        return result
+
+    def depth_within(self, pct):
+        """中间价上下 pct（如 0.01 表示1%）范围内的买卖挂单量 (买量, 卖量)"""
+        with self.lock:
+            mid = self._mid_price()
+            if mid is None:
+                return 0.0, 0.0
+            # 买盘按 -价格 排序，价格 >= 下限 等价于 排序键 <= -下限
+            bid_prices = self.bids.irange_key(max_key=-mid * (1 - pct))
+            ask_prices = self.asks.irange(maximum=mid * (1 + pct))
+            return (
+                sum(self.bids[p] for p in bid_prices),
+                sum(self.asks[p] for p in ask_prices),
+            )
+
+    def volumes(self, n=20):
+        """前N档买卖总量 (买量, 卖量)"""
+        with self.lock:
+            bid_total = sum(islice(self.bids.values(), n))
+            ask_total = sum(islice(self.asks.values(), n))
+        return bid_total, ask_total
+
+    def imbalance(self, n=20):
+        """前N档买卖失衡度 (买-卖)/(买+卖)，范围 -1 ~ 1"""
+        bid_total, ask_total = self.volumes(n)
+        total = bid_total + ask_total
+        return (bid_total - ask_total) / total if total > 0 else 0.0
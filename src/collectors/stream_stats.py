@@ -0,0 +1,86 @@
+"""
+数据流统计 - 采集线程只做计数，每隔N秒输出一行汇总（各数据流消息速率 + 最新值）
+替代逐条消息 print：stdout 接管道或 Docker 日志时，逐条格式化和写出会拖慢甚至阻塞采集线程
+"""
+import threading
+import time
+
+STATUS_INTERVAL = 10    # 汇总输出间隔（秒）
+
+
+class StreamStats:
+    """线程安全的消息计数器，可多个采集器共用一个"""
+
+    def __init__(self, interval=STATUS_INTERVAL):
+        """interval: 后台线程输出汇总的间隔（秒）"""
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._counts = {}       # 交易对 -> {数据流: 本周期消息数}
+        self._totals = {}       # 交易对 -> {数据流: 累计消息数}
+        self._latest = {}       # 交易对 -> {名称: 最新值}
+        self._window_start = time.monotonic()
+        self._thread = None
+
+    def record(self, symbol, stream, n=1):
+        """记录 n 条消息"""
+        with self._lock:
+            counts = self._counts.setdefault(symbol, {})
+            counts[stream] = counts.get(stream, 0) + n
+
+    def set_latest(self, symbol, name, value):
+        """记录最新值（如最新价格），在汇总行末尾显示"""
+        with self._lock:
+            self._latest.setdefault(symbol, {})[name] = value
+
+    def rates(self):
+        """返回本周期各数据流的消息速率 {交易对: {数据流: 条/秒}}，并开始新周期"""
+        now = time.monotonic()
+        with self._lock:
+            elapsed = max(now - self._window_start, 1e-9)
+            counts = self._counts
+            self._counts = {}
+            self._window_start = now
+            for symbol, streams in counts.items():
+                totals = self._totals.setdefault(symbol, {})
+                for stream, n in streams.items():
+                    totals[stream] = totals.get(stream, 0) + n
+        return {
+            symbol: {stream: n / elapsed for stream, n in streams.items()}
+            for symbol, streams in counts.items()
+        }
+
+    def totals(self):
+        """累计消息数（不含当前周期）"""
+        with self._lock:
+            return {symbol: dict(streams) for symbol, streams in self._totals.items()}
+
+    def status_lines(self):
+        """每个交易对一行: [Status] ETHUSDT trade 35.2/s | depth 10.0/s | price 2500.1"""
+        rates = self.rates()
+        with self._lock:
+            latest = {symbol: dict(values) for symbol, values in self._latest.items()}
+
+        lines = []
+        for symbol in sorted(set(rates) | set(latest)):
+            parts = [f"{stream} {rate:.1f}/s" for stream, rate in sorted(rates.get(symbol, {}).items())]
+            parts += [f"{name} {value}" for name, value in latest.get(symbol, {}).items()]
+            lines.append(f"[Status] {symbol.upper()} " + (" | ".join(parts) if parts else "no messages"))
+        return lines
+
+    def report(self):
+        """输出一次汇总"""
+        for line in self.status_lines():
+            print(line, flush=True)
+
+    def start(self):
+        """启动后台汇总线程（interval 为 0 时不输出）"""
+        if not self.interval or (self._thread and self._thread.is_alive()):
+            return self
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Stream-Stats")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.report()
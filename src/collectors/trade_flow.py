@@ -0,0 +1,208 @@
+"""
+滚动成交流统计 - 按秒分桶的环形缓冲，O(1) 维护 1m/5m/15m/1h/4h 窗口的主动买入/卖出量、笔数和VWAP
+采集线程逐笔调用 add()，每秒的桶移出窗口时从该窗口的累计值中减去，查询不需要扫描任何成交。
+每分钟结束时返回该分钟的汇总行，由采集器写入 trades_1m（见 trade_rollup），供其他进程和冷启动使用。
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from trade_rollup import MINUTE_MS, summarize
+
+# 窗口名 -> 秒数
+WINDOWS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '4h': 14400}
+
+# 每个桶/窗口累计的量: 买入量, 卖出量, 买入笔数, 卖出笔数, 成交额
+_FIELDS = 5
+
+
+class TradeFlow:
+    """
+    单个交易对的滚动统计（不加锁，由 TradeFlowRegistry 保护）
+    窗口 w 覆盖 (当前秒 - w, 当前秒]；累计值每隔 RESYNC_EVERY 秒从桶重新求和，消除浮点误差
+    """
+
+    RESYNC_EVERY = 3600
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = dict(windows)
+        self.size = max(self.windows.values())
+        self._seconds = [None] * self.size                  # 槽位对应的秒
+        self._buckets = [[0.0] * _FIELDS for _ in range(self.size)]
+        self._totals = {name: [0.0] * _FIELDS for name in self.windows}
+        self._second = None         # 最新的秒
+        self.since = None           # 统计覆盖的最早一秒
+        self._advanced = 0
+        # 当前分钟的汇总（用于写 trades_1m）
+        self._minute = None
+        self._minute_values = [0.0] * _FIELDS
+
+    def add(self, timestamp, price, quantity, is_buyer_maker) -> List[tuple]:
+        """加入一笔成交，返回本次完成的分钟汇总行 [(open_time, 买入量, 卖出量, 买入笔数, 卖出笔数, 成交额), ...]"""
+        if is_buyer_maker:
+            values = (0.0, quantity, 0, 1, price * quantity)
+        else:
+            values = (quantity, 0.0, 1, 0, price * quantity)
+        return self.add_second(timestamp // 1000, values)
+
+    def add_second(self, second, values, minute=True) -> List[tuple]:
+        """
+        把一秒的汇总值加入统计（启动时从库中预热也用这个方法）
+        minute: 是否计入分钟汇总；从 trades_1m 预热的行本身就是分钟汇总，不再重复计入
+        """
+        completed = []
+        if minute:
+            completed = self._add_minute(second, values)
+
+        if self._second is None:
+            self._second = second
+            self.since = second
+        elif second > self._second:
+            self._advance(second)
+        elif second <= self._second - self.size:
+            return completed    # 早于所有窗口
+        if second < self.since:
+            self.since = second
+
+        slot = second % self.size
+        if self._seconds[slot] != second:
+            self._seconds[slot] = second
+            self._buckets[slot] = [0.0] * _FIELDS
+        bucket = self._buckets[slot]
+        for i in range(_FIELDS):
+            bucket[i] += values[i]
+        for name, span in self.windows.items():
+            if second > self._second - span:
+                totals = self._totals[name]
+                for i in range(_FIELDS):
+                    totals[i] += values[i]
+        return completed
+
+    def _add_minute(self, second, values):
+        minute = second * 1000 // MINUTE_MS * MINUTE_MS
+        completed = []
+        if self._minute is None or minute > self._minute:
+            if self._minute is not None:
+                completed.append(self.minute_row())
+            self._minute = minute
+            self._minute_values = [0.0] * _FIELDS
+        if minute == self._minute:      # 更早分钟的迟到成交不再改写已完成的汇总
+            for i in range(_FIELDS):
+                self._minute_values[i] += values[i]
+        return completed
+
+    def minute_row(self) -> Optional[tuple]:
+        """当前（未完成）分钟的汇总行"""
+        if self._minute is None:
+            return None
+        buy, sell, buy_count, sell_count, quote = self._minute_values
+        return (self._minute, buy, sell, int(buy_count), int(sell_count), quote)
+
+    def _advance(self, second):
+        """推进到 second：每经过一秒，把离开各窗口的那一秒从累计值中减去"""
+        if second - self._second >= self.size:
+            # 空档超过最长窗口，全部清空
+            self._seconds = [None] * self.size
+            self._totals = {name: [0.0] * _FIELDS for name in self.windows}
+            self._second = second
+            return
+
+        for current in range(self._second + 1, second + 1):
+            for name, span in self.windows.items():
+                leaving = current - span
+                slot = leaving % self.size
+                if self._seconds[slot] == leaving:
+                    bucket = self._buckets[slot]
+                    totals = self._totals[name]
+                    for i in range(_FIELDS):
+                        totals[i] -= bucket[i]
+            self._advanced += 1
+            if self._advanced % self.RESYNC_EVERY == 0:
+                self._resync(current)
+        self._second = second
+
+    def _resync(self, second):
+        for name, span in self.windows.items():
+            totals = [0.0] * _FIELDS
+            for s in range(second - span + 1, second + 1):
+                slot = s % self.size
+                if self._seconds[slot] == s:
+                    for i in range(_FIELDS):
+                        totals[i] += self._buckets[slot][i]
+            self._totals[name] = totals
+
+    def snapshot(self, window, now_ms=None) -> Dict:
+        """
+        窗口汇总: {'buy_volume', 'sell_volume', 'volume', 'trades', 'vwap', 'buy_sell_ratio', 'complete'}
+        先推进到当前时间（没有新成交时旧数据同样会移出窗口）；complete 表示统计已覆盖整个窗口
+        """
+        now = (now_ms if now_ms is not None else int(time.time() * 1000)) // 1000
+        if self._second is not None and now > self._second:
+            self._advance(now)
+        buy, sell, buy_count, sell_count, quote = self._totals[window]
+        result = summarize(max(buy, 0.0), max(sell, 0.0), round(buy_count + sell_count), quote)
+        result['complete'] = self.since is not None and self.since <= now - self.windows[window] + 1
+        return result
+
+
+class TradeFlowRegistry:
+    """按交易对保存滚动统计，采集线程写、分析器/API读"""
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = dict(windows)
+        self._flows = {}
+        self._lock = threading.Lock()
+
+    def _flow(self, symbol):
+        flow = self._flows.get(symbol)
+        if flow is None:
+            flow = self._flows[symbol] = TradeFlow(self.windows)
+        return flow
+
+    def add(self, symbol, timestamp, price, quantity, is_buyer_maker) -> List[tuple]:
+        """加入一笔成交，返回完成的分钟汇总行"""
+        with self._lock:
+            return self._flow(symbol.lower()).add(timestamp, price, quantity, is_buyer_maker)
+
+    def seed(self, symbol, minutes=(), seconds=(), since_ms=None) -> List[tuple]:
+        """
+        启动预热（都按时间从旧到新）
+        minutes: trades_1m 中的分钟汇总行（MINUTE_FIELDS 顺序），计入该分钟的第一秒
+        seconds: 汇总表之后的原始成交按秒聚合 [(秒, 买入量, 卖出量, 买入笔数, 卖出笔数, 成交额), ...]
+        since_ms: 预热数据覆盖的起点（这之后没有成交的时段也算已覆盖）
+        返回由 seconds 补齐出的完整分钟汇总行（应写回 trades_1m）
+        """
+        completed = []
+        with self._lock:
+            flow = self._flow(symbol.lower())
+            if since_ms is not None:
+                flow.add_second(since_ms // 1000, (0.0,) * _FIELDS, minute=False)
+            for row in minutes:
+                flow.add_second(row[0] // 1000, row[1:], minute=False)
+            for row in seconds:
+                completed += flow.add_second(row[0], row[1:])
+        return completed
+
+    def snapshot(self, symbol, window='1h', now_ms=None) -> Optional[Dict]:
+        """单个窗口的汇总，没有该交易对的数据时返回 None"""
+        with self._lock:
+            flow = self._flows.get(symbol.lower())
+            if flow is None:
+                return None
+            return flow.snapshot(window, now_ms)
+
+    def windows_snapshot(self, symbol, now_ms=None) -> Optional[Dict]:
+        """全部窗口的汇总 {窗口名: 汇总}"""
+        with self._lock:
+            flow = self._flows.get(symbol.lower())
+            if flow is None:
+                return None
+            return {name: flow.snapshot(name, now_ms) for name in self.windows}
+
+    def symbols(self):
+        with self._lock:
+            return list(self._flows)
+
+
+# 进程内共享的注册表：同一进程里的采集器负责更新，分析器直接读取
+registry = TradeFlowRegistry()
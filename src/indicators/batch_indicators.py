@@ -0,0 +1,170 @@
+"""
+批量技术指标 - 多个交易对/周期一次计算
+load_windows 用一条SQL取回全部 (交易对, 周期) 的最近K线，
+compute_batch 把等长窗口堆成二维数组（行=交易对/周期，列=时间），所有指标按行一次向量化计算。
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from indicators import TechnicalIndicators
+
+WINDOW = 200        # 与单个计算时读取的K线数一致
+MIN_CANDLES = 26    # 与 calculate_all_indicators 一致
+
+# 单个 (交易对, 周期) 的查询分支；SQLite 复合查询的分支里不能直接 ORDER BY/LIMIT，所以包一层子查询
+WINDOW_BRANCH_SQL = '''
+    SELECT * FROM (
+        SELECT symbol, interval, open_time, open, high, low, close, volume
+        FROM klines WHERE symbol = ? AND interval = ?
+        ORDER BY open_time DESC LIMIT ?
+    )
+'''
+
+
+def load_windows(db, symbols: Iterable[str], intervals: Iterable[str],
+                 window: int = WINDOW) -> Dict[Tuple[str, str], List[tuple]]:
+    """
+    一条查询取回每个 (交易对, 周期) 最近 window 根K线
+    每个分支都是 (symbol, interval, open_time) 唯一索引上的倒序范围扫描，读取量只与 window 有关
+    返回 {(交易对, 周期): [(open_time, open, high, low, close, volume), ...]}（从旧到新）
+    """
+    keys = [(symbol.lower(), interval) for symbol in symbols for interval in intervals]
+    if not keys:
+        return {}
+
+    sql = ' UNION ALL '.join([WINDOW_BRANCH_SQL] * len(keys))
+    params = [value for symbol, interval in keys for value in (symbol, interval, window)]
+
+    windows = {key: [] for key in keys}
+    for row in db.execute(sql, params):
+        windows[(row[0], row[1])].append(tuple(row[2:]))
+    for rows in windows.values():
+        rows.reverse()
+    return windows
+
+
+def compute_arrays(high, low, close) -> Dict[str, np.ndarray]:
+    """
+    对二维数组（行=序列，列=时间，各行等长）计算每行最新的指标值
+    返回 {指标名: 一维数组}，数据不足的指标为 NaN
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    rows, n = close.shape
+
+    def last(series):
+        return series[:, -1] if series.shape[-1] else np.full(rows, np.nan)
+
+    ema_12 = TechnicalIndicators.ema_series(close, 12)
+    ema_26 = TechnicalIndicators.ema_series(close, 26)
+    macd = TechnicalIndicators.macd_series(close, ema_fast=ema_12, ema_slow=ema_26)
+    # 布林带只需要最后一个窗口
+    bands = TechnicalIndicators.bollinger_series(close[:, -20:], 20)
+
+    return {
+        'ema_12': last(ema_12),
+        'ema_26': last(ema_26),
+        'macd': last(macd['macd']),
+        'signal': last(macd['signal']),
+        'histogram': last(macd['histogram']),
+        'rsi': last(TechnicalIndicators.rsi_series(close)),
+        'atr': last(TechnicalIndicators.atr_series(high, low, close)),
+        'upper': last(bands['upper']),
+        'middle': last(bands['middle']),
+        'lower': last(bands['lower']),
+        'width': last(bands['width']),
+        'close': close[:, -1] if n else np.full(rows, np.nan),
+        'candles': np.full(rows, n),
+    }
+
+
+def _format_row(values: Dict[str, np.ndarray], i: int) -> Dict:
+    """把第 i 行的数组结果整理成 calculate_all_indicators 的返回格式"""
+    n = int(values['candles'][i])
+    if n < MIN_CANDLES:
+        return {
+            'ema_12': 0,
+            'ema_26': 0,
+            'macd': {},
+            'rsi': 50,
+            'atr': 0,
+            'bollinger': {},
+            'available': False
+        }
+
+    if n < 26 + 9:
+        macd = {'macd': 0, 'signal': 0, 'histogram': 0, 'trend': 'neutral'}
+    else:
+        macd_value = float(values['macd'][i])
+        signal_value = float(values['signal'][i])
+        histogram = macd_value - signal_value
+        if histogram > 0 and macd_value > 0:
+            trend = 'bullish'
+        elif histogram < 0 and macd_value < 0:
+            trend = 'bearish'
+        else:
+            trend = 'neutral'
+        macd = {
+            'macd': round(macd_value, 4),
+            'signal': round(signal_value, 4),
+            'histogram': round(histogram, 4),
+            'trend': trend
+        }
+
+    close = float(values['close'][i])
+    upper = float(values['upper'][i])
+    middle = float(values['middle'][i])
+    lower = float(values['lower'][i])
+    if close > upper:
+        position = 'above_upper'
+    elif close < lower:
+        position = 'below_lower'
+    elif close > middle:
+        position = 'above_middle'
+    else:
+        position = 'below_middle'
+
+    return {
+        'ema_12': round(float(values['ema_12'][i]), 2),
+        'ema_26': round(float(values['ema_26'][i]), 2),
+        'macd': macd,
+        'rsi': round(float(values['rsi'][i]), 2),
+        'atr': round(float(values['atr'][i]), 4),
+        'bollinger': {
+            'upper': round(upper, 2),
+            'middle': round(middle, 2),
+            'lower': round(lower, 2),
+            'width': round(float(values['width'][i]), 2),
+            'position': position,
+            'current_price': round(close, 2)
+        },
+        'available': True
+    }
+
+
+def compute_batch(windows: Dict) -> Dict:
+    """
+    批量计算全部窗口的指标
+    windows: {键: [(open_time, open, high, low, close, ...), ...]}（如 load_windows 的返回值）
+    返回 {键: 指标}，格式同 calculate_all_indicators
+    长度相同的窗口堆成一个二维数组一起计算（正常情况下所有窗口都是满的，只有一组）
+    """
+    groups = {}
+    for key, rows in windows.items():
+        groups.setdefault(len(rows), []).append(key)
+
+    results = {}
+    for n, keys in groups.items():
+        if n < MIN_CANDLES:
+            for key in keys:
+                results[key] = _format_row({'candles': [n]}, 0)
+            continue
+
+        # (行数, n, 6) -> 取 high/low/close 三列
+        data = np.array([windows[key] for key in keys], dtype=float)
+        values = compute_arrays(data[:, :, 2], data[:, :, 3], data[:, :, 4])
+        for i, key in enumerate(keys):
+            results[key] = _format_row(values, i)
+    return results
@@ -1,40 +1,376 @@
 """
 技术指标计算模块
 支持: EMA, MACD, RSI, ATR, BOLL
+扩展: VWAP（时段/锚定）, 随机指标, ADX/DMI, OBV, 肯特纳通道, 唐奇安通道, SuperTrend, 成交量/主动买入占比 z-score
+*_series 方法基于 NumPy 数组计算并返回完整序列，calculate_* 方法返回最新值（格式与以往相同）。
+逐根循环的参考实现见 tests/reference_indicators.py。
 """
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from typing import List, Tuple, Dict
 
+# 递推展开后要除以 (1-alpha)^k，按块计算保证 (1-alpha)^-k 不超过 e^EWM_CHUNK_LOG，避免溢出和精度损失
+EWM_CHUNK_LOG = 200.0
+
+
+def _ewm(values: np.ndarray, alpha: float, init) -> np.ndarray:
+    """
+    指数加权递推 y[t] = (1 - alpha) * y[t-1] + alpha * x[t]，y[-1] = init
+    沿最后一个轴计算（支持多个序列组成的二维数组），块内用累加和的闭式解代替逐元素循环
+    """
+    values = np.asarray(values, dtype=float)
+    beta = 1.0 - alpha
+    if beta <= 0.0:
+        return values.copy()
+
+    out = np.empty_like(values)
+    prev = np.asarray(init, dtype=float)
+    n = values.shape[-1]
+    chunk = max(1, min(n, int(EWM_CHUNK_LOG / -np.log(beta))))
+    powers = beta ** np.arange(1, chunk + 1)
+    inverse = 1.0 / powers
+
+    for start in range(0, n, chunk):
+        seg = values[..., start:start + chunk]
+        m = seg.shape[-1]
+        block = powers[:m] * (prev[..., None] + alpha * np.cumsum(seg * inverse[:m], axis=-1))
+        out[..., start:start + chunk] = block
+        prev = block[..., -1]
+    return out
+
+
+def _rolling_max(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    滚动最大值（van Herk/Gil-Werman）：按 period 分块求块内前缀/后缀最大值，
+    每个窗口最多跨两个块，结果为 max(后缀[i], 前缀[i+period-1])，每个元素常数次比较
+    沿最后一个轴计算，返回长度 n - period + 1
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.shape[-1]
+    blocks = -(-n // period)
+    padded = np.full(values.shape[:-1] + (blocks * period,), -np.inf)
+    padded[..., :n] = values
+    shaped = padded.reshape(values.shape[:-1] + (blocks, period))
+
+    prefix = np.maximum.accumulate(shaped, axis=-1).reshape(padded.shape)
+    suffix = np.maximum.accumulate(shaped[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+    return np.maximum(suffix[..., :n - period + 1], prefix[..., period - 1:n])
+
+
+def _rolling_min(values: np.ndarray, period: int) -> np.ndarray:
+    """滚动最小值，返回长度 n - period + 1"""
+    return -_rolling_max(-np.asarray(values, dtype=float), period)
+
+
+def _rolling_sum(values: np.ndarray, period: int) -> np.ndarray:
+    """滚动求和（累加和相减），返回长度 n - period + 1"""
+    values = np.asarray(values, dtype=float)
+    csum = np.cumsum(values, axis=-1)
+    head = csum[..., period - 1:period]
+    return np.concatenate([head, csum[..., period:] - csum[..., :-period]], axis=-1)
+
+
+def _tail_align(*series):
+    """按最后一根K线对齐若干序列（截成相同长度）"""
+    m = min(s.shape[-1] for s in series)
+    return [s[..., s.shape[-1] - m:] for s in series]
+
+
 class TechnicalIndicators:
     """技术指标计算器"""
     
+    # ---------- 完整序列（NumPy） ----------
+    
     @staticmethod
-    def calculate_ema(prices: List[float], period: int) -> List[float]:
+    def ema_series(prices, period: int) -> np.ndarray:
         """
-        计算指数移动平均线 (EMA)
+        EMA 序列，第一个值是前 period 根的 SMA
+        返回长度 len(prices) - period + 1，数据不足时返回空数组
         """
-        if len(prices) < period:
-            return []
+        prices = np.asarray(prices, dtype=float)
+        if prices.shape[-1] < period:
+            return np.empty(prices.shape[:-1] + (0,))
+        
+        sma = prices[..., :period].mean(axis=-1)
+        rest = _ewm(prices[..., period:], 2 / (period + 1), sma)
+        return np.concatenate([sma[..., None], rest], axis=-1)
+    
+    @staticmethod
+    def macd_series(prices, fast_period: int = 12, slow_period: int = 26,
+                    signal_period: int = 9, ema_fast=None, ema_slow=None) -> Dict[str, np.ndarray]:
+        """
+        MACD 序列: {'macd': MACD线, 'signal': 信号线, 'histogram': 柱状图}
+        macd 从第 slow_period 根K线开始；signal/histogram 再晚 signal_period-1 根
+        已经算好的快慢线EMA可以通过 ema_fast/ema_slow 传入，避免重复计算
+        """
+        if ema_fast is None:
+            ema_fast = TechnicalIndicators.ema_series(prices, fast_period)
+        if ema_slow is None:
+            ema_slow = TechnicalIndicators.ema_series(prices, slow_period)
+        
+        # 两条EMA按K线对齐后相减
+        macd_line = ema_fast[..., slow_period - fast_period:] - ema_slow
+        signal_line = TechnicalIndicators.ema_series(macd_line, signal_period)
+        histogram = macd_line[..., signal_period - 1:] - signal_line
+        return {'macd': macd_line, 'signal': signal_line, 'histogram': histogram}
+    
+    @staticmethod
+    def rsi_series(prices, period: int = 14) -> np.ndarray:
+        """
+        RSI 序列（Wilder 平滑），从第 period+1 根K线开始
+        返回长度 len(prices) - period，数据不足时返回空数组
+        """
+        prices = np.asarray(prices, dtype=float)
+        if prices.shape[-1] < period + 1:
+            return np.empty(prices.shape[:-1] + (0,))
         
-        ema = []
-        multiplier = 2 / (period + 1)
+        deltas = np.diff(prices, axis=-1)
+        gains = np.where(deltas > 0, deltas, 0.0)
+        losses = np.where(deltas < 0, -deltas, 0.0)
         
-        # 初始EMA使用SMA
-        sma = sum(prices[:period]) / period
-        ema.append(sma)
+        avg_gain = TechnicalIndicators._wilder(gains, period)
+        avg_loss = TechnicalIndicators._wilder(losses, period)
         
-        # 后续使用EMA公式
-        for price in prices[period:]:
-            ema_value = (price - ema[-1]) * multiplier + ema[-1]
-            ema.append(ema_value)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+        return np.where(avg_loss == 0, 100.0, rsi)
+    
+    @staticmethod
+    def atr_series(high_prices, low_prices, close_prices, period: int = 14) -> np.ndarray:
+        """
+        ATR 序列（Wilder 平滑），从第 period+1 根K线开始
+        返回长度 len(close_prices) - period，数据不足时返回空数组
+        """
+        high = np.asarray(high_prices, dtype=float)
+        low = np.asarray(low_prices, dtype=float)
+        close = np.asarray(close_prices, dtype=float)
+        if close.shape[-1] < period + 1:
+            return np.empty(close.shape[:-1] + (0,))
         
-        return ema
+        prev_close = close[..., :-1]
+        true_ranges = np.maximum.reduce([
+            high[..., 1:] - low[..., 1:],
+            np.abs(high[..., 1:] - prev_close),
+            np.abs(low[..., 1:] - prev_close),
+        ])
+        return TechnicalIndicators._wilder(true_ranges, period)
+    
+    @staticmethod
+    def bollinger_series(prices, period: int = 20, std_dev: float = 2.0) -> Dict[str, np.ndarray]:
+        """
+        布林带序列: {'upper', 'middle', 'lower', 'width'}，从第 period 根K线开始
+        标准差为总体标准差，与 calculate_bollinger_bands 一致
+        """
+        prices = np.asarray(prices, dtype=float)
+        if prices.shape[-1] < period:
+            empty = np.empty(prices.shape[:-1] + (0,))
+            return {'upper': empty, 'middle': empty, 'lower': empty, 'width': empty}
+        
+        windows = sliding_window_view(prices, period, axis=-1)
+        middle = windows.mean(axis=-1)
+        std = np.sqrt(((windows - middle[..., None]) ** 2).mean(axis=-1))
+        upper = middle + std_dev * std
+        lower = middle - std_dev * std
+        with np.errstate(divide='ignore', invalid='ignore'):
+            width = np.where(middle > 0, (upper - lower) / middle * 100, 0.0)
+        return {'upper': upper, 'middle': middle, 'lower': lower, 'width': width}
+    
+    @staticmethod
+    def _wilder(values: np.ndarray, period: int) -> np.ndarray:
+        """Wilder 平滑：首值为前 period 个的简单平均，之后 avg = (avg*(period-1) + x) / period"""
+        first = values[..., :period].mean(axis=-1)
+        rest = _ewm(values[..., period:], 1 / period, first)
+        return np.concatenate([first[..., None], rest], axis=-1)
+
+    # ---------- 扩展指标（完整序列） ----------
+
+    @staticmethod
+    def vwap_series(high_prices, low_prices, close_prices, volumes,
+                    open_times=None, session_ms: int = 86_400_000) -> np.ndarray:
+        """
+        交易时段 VWAP 序列（典型价 (H+L+C)/3 按成交量加权），返回长度与输入相同
+        传入 open_times 时按 session_ms（默认UTC自然日）分段，每段重新累计；不传时整段累计
+        """
+        high = np.asarray(high_prices, dtype=float)
+        low = np.asarray(low_prices, dtype=float)
+        close = np.asarray(close_prices, dtype=float)
+        volume = np.asarray(volumes, dtype=float)
+        typical = (high + low + close) / 3
+
+        cum_pv = np.cumsum(typical * volume)
+        cum_vol = np.cumsum(volume)
+        if open_times is not None and len(close):
+            # 每根K线所属时段的起始下标，减去时段开始前的累计值
+            session = np.asarray(open_times, dtype=np.int64) // session_ms
+            starts = np.concatenate([[True], session[1:] != session[:-1]])
+            first = np.maximum.accumulate(np.where(starts, np.arange(len(close)), 0))
+            cum_pv = cum_pv - np.concatenate([[0.0], cum_pv[:-1]])[first]
+            cum_vol = cum_vol - np.concatenate([[0.0], cum_vol[:-1]])[first]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(cum_vol > 0, cum_pv / cum_vol, typical)
+
+    @staticmethod
+    def anchored_vwap_series(high_prices, low_prices, close_prices, volumes, anchor: int = 0) -> np.ndarray:
+        """从第 anchor 根K线开始累计的 VWAP，返回长度 len - anchor"""
+        return TechnicalIndicators.vwap_series(
+            np.asarray(high_prices, dtype=float)[anchor:],
+            np.asarray(low_prices, dtype=float)[anchor:],
+            np.asarray(close_prices, dtype=float)[anchor:],
+            np.asarray(volumes, dtype=float)[anchor:],
+        )
+
+    @staticmethod
+    def stochastic_series(high_prices, low_prices, close_prices,
+                          k_period: int = 14, d_period: int = 3) -> Dict[str, np.ndarray]:
+        """
+        随机指标: {'k': %K, 'd': %K 的 d_period 简单平均}
+        k 从第 k_period 根K线开始，d 再晚 d_period-1 根；区间无波动时 %K 取 50
+        """
+        high = np.asarray(high_prices, dtype=float)
+        low = np.asarray(low_prices, dtype=float)
+        close = np.asarray(close_prices, dtype=float)
+        if close.shape[-1] < k_period:
+            empty = np.empty(close.shape[:-1] + (0,))
+            return {'k': empty, 'd': empty}
+
+        highest = _rolling_max(high, k_period)
+        lowest = _rolling_min(low, k_period)
+        span = highest - lowest
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = np.where(span > 0, (close[..., k_period - 1:] - lowest) / span * 100, 50.0)
+        if k.shape[-1] < d_period:
+            return {'k': k, 'd': np.empty(k.shape[:-1] + (0,))}
+        return {'k': k, 'd': _rolling_sum(k, d_period) / d_period}
+
+    @staticmethod
+    def dmi_series(high_prices, low_prices, close_prices, period: int = 14) -> Dict[str, np.ndarray]:
+        """
+        DMI/ADX: {'plus_di', 'minus_di', 'adx'}（Wilder 平滑）
+        +DI/-DI 从第 period+1 根K线开始，ADX 再晚 period-1 根
+        """
+        high = np.asarray(high_prices, dtype=float)
+        low = np.asarray(low_prices, dtype=float)
+        close = np.asarray(close_prices, dtype=float)
+        empty = np.empty(close.shape[:-1] + (0,))
+        if close.shape[-1] < period + 1:
+            return {'plus_di': empty, 'minus_di': empty, 'adx': empty}
+
+        up = high[..., 1:] - high[..., :-1]
+        down = low[..., :-1] - low[..., 1:]
+        plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+        minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+
+        atr = TechnicalIndicators.atr_series(high, low, close, period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            plus_di = np.where(atr > 0, 100 * TechnicalIndicators._wilder(plus_dm, period) / atr, 0.0)
+            minus_di = np.where(atr > 0, 100 * TechnicalIndicators._wilder(minus_dm, period) / atr, 0.0)
+            di_sum = plus_di + minus_di
+            dx = np.where(di_sum > 0, 100 * np.abs(plus_di - minus_di) / di_sum, 0.0)
+
+        adx = TechnicalIndicators._wilder(dx, period) if dx.shape[-1] >= period else empty
+        return {'plus_di': plus_di, 'minus_di': minus_di, 'adx': adx}
+
+    @staticmethod
+    def obv_series(close_prices, volumes) -> np.ndarray:
+        """能量潮 OBV（首根为 0），返回长度与输入相同"""
+        close = np.asarray(close_prices, dtype=float)
+        volume = np.asarray(volumes, dtype=float)
+        signed = np.sign(np.diff(close, axis=-1)) * volume[..., 1:]
+        zero = np.zeros(close.shape[:-1] + (1,))
+        return np.concatenate([zero, np.cumsum(signed, axis=-1)], axis=-1)
+
+    @staticmethod
+    def keltner_series(high_prices, low_prices, close_prices, ema_period: int = 20,
+                       atr_period: int = 10, multiplier: float = 2.0) -> Dict[str, np.ndarray]:
+        """肯特纳通道: {'upper', 'middle', 'lower'}，中轨为 EMA，通道宽度为 multiplier 倍 ATR，按最后一根K线对齐"""
+        middle = TechnicalIndicators.ema_series(close_prices, ema_period)
+        atr = TechnicalIndicators.atr_series(high_prices, low_prices, close_prices, atr_period)
+        middle, atr = _tail_align(middle, atr)
+        return {'upper': middle + multiplier * atr, 'middle': middle, 'lower': middle - multiplier * atr}
+
+    @staticmethod
+    def donchian_series(high_prices, low_prices, period: int = 20) -> Dict[str, np.ndarray]:
+        """唐奇安通道: {'upper': N周期最高价, 'middle', 'lower': N周期最低价}，从第 period 根K线开始"""
+        high = np.asarray(high_prices, dtype=float)
+        low = np.asarray(low_prices, dtype=float)
+        if high.shape[-1] < period:
+            empty = np.empty(high.shape[:-1] + (0,))
+            return {'upper': empty, 'middle': empty, 'lower': empty}
+        upper = _rolling_max(high, period)
+        lower = _rolling_min(low, period)
+        return {'upper': upper, 'middle': (upper + lower) / 2, 'lower': lower}
+
+    @staticmethod
+    def supertrend_series(high_prices, low_prices, close_prices, period: int = 10,
+                          multiplier: float = 3.0) -> Dict[str, np.ndarray]:
+        """
+        SuperTrend: {'supertrend': 止损线, 'direction': 1 多头 / -1 空头}，从第 period+1 根K线开始
+        最终上下轨依赖前一根的结果，只能顺序递推（一维序列，单次遍历）
+        """
+        high = np.asarray(high_prices, dtype=float)
+        low = np.asarray(low_prices, dtype=float)
+        close = np.asarray(close_prices, dtype=float)
+        atr = TechnicalIndicators.atr_series(high, low, close, period)
+        m = len(atr)
+        if m == 0:
+            return {'supertrend': np.empty(0), 'direction': np.empty(0)}
+
+        hl2 = ((high + low) / 2)[-m:]
+        basic_lower = (hl2 - multiplier * atr).tolist()
+        basic_upper = (hl2 + multiplier * atr).tolist()
+        closes = close[-m - 1:].tolist()    # 多取一根作为“前一根收盘价”
+
+        supertrend = [0.0] * m
+        direction = [1] * m
+        lower, upper, trend = basic_lower[0], basic_upper[0], 1
+        supertrend[0] = lower
+        for i in range(1, m):
+            prev_close, current = closes[i], closes[i + 1]
+            prev_lower, prev_upper = lower, upper
+            lower = max(basic_lower[i], prev_lower) if prev_close > prev_lower else basic_lower[i]
+            upper = min(basic_upper[i], prev_upper) if prev_close < prev_upper else basic_upper[i]
+            if trend == -1 and current > prev_upper:
+                trend = 1
+            elif trend == 1 and current < prev_lower:
+                trend = -1
+            direction[i] = trend
+            supertrend[i] = lower if trend == 1 else upper
+        return {'supertrend': np.array(supertrend), 'direction': np.array(direction)}
+
+    @staticmethod
+    def zscore_series(values, period: int = 20) -> np.ndarray:
+        """
+        滚动 z-score：(x - 窗口均值) / 窗口总体标准差，从第 period 个值开始；标准差为 0 时取 0
+        先减去首个值再累加，减小平方和相减的误差
+        """
+        values = np.asarray(values, dtype=float)
+        if values.shape[-1] < period:
+            return np.empty(values.shape[:-1] + (0,))
+
+        shifted = values - values[..., :1]
+        mean = _rolling_sum(shifted, period) / period
+        var = np.maximum(_rolling_sum(shifted * shifted, period) / period - mean * mean, 0.0)
+        std = np.sqrt(var)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(std > 0, (shifted[..., period - 1:] - mean) / std, 0.0)
+
+    # ---------- 最新值 ----------
+    
+    @staticmethod
+    def calculate_ema(prices: List[float], period: int) -> List[float]:
+        """
+        计算指数移动平均线 (EMA)
+        """
+        return TechnicalIndicators.ema_series(prices, period).tolist()
     
     @staticmethod
     def calculate_macd(prices: List[float], 
                        fast_period: int = 12, 
                        slow_period: int = 26, 
-                       signal_period: int = 9) -> Dict[str, float]:
+                       signal_period: int = 9,
+                       ema_fast=None,
+                       ema_slow=None) -> Dict[str, float]:
         """
         计算MACD指标
         返回: {'macd': float, 'signal': float, 'histogram': float}
@@ -42,45 +378,28 @@ class TechnicalIndicators:
         if len(prices) < slow_period + signal_period:
             return {'macd': 0, 'signal': 0, 'histogram': 0, 'trend': 'neutral'}
         
-        # 计算快线和慢线EMA
-        ema_fast = TechnicalIndicators.calculate_ema(prices, fast_period)
-        ema_slow = TechnicalIndicators.calculate_ema(prices, slow_period)
+        series = TechnicalIndicators.macd_series(
+            prices, fast_period, slow_period, signal_period, ema_fast, ema_slow
+        )
         
-        # MACD线 = 快线 - 慢线
-        macd_line = []
-        for i in range(len(ema_slow)):
-            fast_idx = i + (fast_period - slow_period)
-            if fast_idx < len(ema_fast):
-                macd_line.append(ema_fast[fast_idx] - ema_slow[i])
+        macd_value = float(series['macd'][-1])
+        signal_value = float(series['signal'][-1])
+        histogram = macd_value - signal_value
         
-        if len(macd_line) < signal_period:
-            return {'macd': 0, 'signal': 0, 'histogram': 0, 'trend': 'neutral'}
-        
-        # 信号线 = MACD的EMA
-        signal_line = TechnicalIndicators.calculate_ema(macd_line, signal_period)
-        
-        # 柱状图 = MACD - 信号线
-        if len(signal_line) > 0:
-            macd_value = macd_line[-1]
-            signal_value = signal_line[-1]
-            histogram = macd_value - signal_value
-            
-            # 判断趋势
-            if histogram > 0 and macd_value > 0:
-                trend = 'bullish'  # 多头
-            elif histogram < 0 and macd_value < 0:
-                trend = 'bearish'  # 空头
-            else:
-                trend = 'neutral'  # 中性
-            
-            return {
-                'macd': round(macd_value, 4),
-                'signal': round(signal_value, 4),
-                'histogram': round(histogram, 4),
-                'trend': trend
-            }
+        # 判断趋势
+        if histogram > 0 and macd_value > 0:
+            trend = 'bullish'  # 多头
+        elif histogram < 0 and macd_value < 0:
+            trend = 'bearish'  # 空头
+        else:
+            trend = 'neutral'  # 中性
         
-        return {'macd': 0, 'signal': 0, 'histogram': 0, 'trend': 'neutral'}
+        return {
+            'macd': round(macd_value, 4),
+            'signal': round(signal_value, 4),
+            'histogram': round(histogram, 4),
+            'trend': trend
+        }
     
     @staticmethod
     def calculate_rsi(prices: List[float], period: int = 14) -> float:
@@ -90,28 +409,7 @@ class TechnicalIndicators:
         if len(prices) < period + 1:
             return 50.0  # 默认中性值
         
-        # 计算价格变化
-        deltas = [prices[i] - prices[i-1] for i in range(1, len(prices))]
-        
-        gains = [d if d > 0 else 0 for d in deltas]
-        losses = [-d if d < 0 else 0 for d in deltas]
-        
-        # 初始平均增益和损失
-        avg_gain = sum(gains[:period]) / period
-        avg_loss = sum(losses[:period]) / period
-        
-        # 使用指数移动平均
-        for i in range(period, len(gains)):
-            avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i]) / period
-        
-        if avg_loss == 0:
-            return 100.0
-        
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        
-        return round(rsi, 2)
+        return round(float(TechnicalIndicators.rsi_series(prices, period)[-1]), 2)
     
     @staticmethod
     def calculate_atr(high_prices: List[float], 
@@ -124,25 +422,8 @@ class TechnicalIndicators:
         if len(high_prices) < period + 1:
             return 0.0
         
-        true_ranges = []
-        for i in range(1, len(close_prices)):
-            high_low = high_prices[i] - low_prices[i]
-            high_close = abs(high_prices[i] - close_prices[i-1])
-            low_close = abs(low_prices[i] - close_prices[i-1])
-            true_range = max(high_low, high_close, low_close)
-            true_ranges.append(true_range)
-        
-        if len(true_ranges) < period:
-            return 0.0
-        
-        # 初始ATR使用简单平均
-        atr = sum(true_ranges[:period]) / period
-        
-        # 后续使用指数移动平均
-        for i in range(period, len(true_ranges)):
-            atr = (atr * (period - 1) + true_ranges[i]) / period
-        
-        return round(atr, 4)
+        atr = TechnicalIndicators.atr_series(high_prices, low_prices, close_prices, period)
+        return round(float(atr[-1]), 4)
     
     @staticmethod
     def calculate_bollinger_bands(prices: List[float], 
@@ -155,22 +436,15 @@ class TechnicalIndicators:
         if len(prices) < period:
             return {'upper': 0, 'middle': 0, 'lower': 0, 'width': 0, 'position': 'neutral'}
         
-        # 中轨 = SMA
-        middle = sum(prices[-period:]) / period
-        
-        # 标准差
-        variance = sum([(p - middle) ** 2 for p in prices[-period:]]) / period
-        std = variance ** 0.5
-        
-        # 上轨和下轨
-        upper = middle + (std_dev * std)
-        lower = middle - (std_dev * std)
-        
-        # 带宽
-        width = ((upper - lower) / middle) * 100 if middle > 0 else 0
+        # 只需要最后一个窗口
+        bands = TechnicalIndicators.bollinger_series(np.asarray(prices[-period:], dtype=float), period, std_dev)
+        upper = float(bands['upper'][-1])
+        middle = float(bands['middle'][-1])
+        lower = float(bands['lower'][-1])
+        width = float(bands['width'][-1])
         
         # 当前价格相对位置
-        current_price = prices[-1]
+        current_price = float(prices[-1])
         if current_price > upper:
             position = 'above_upper'  # 超买区
         elif current_price < lower:
@@ -190,10 +464,105 @@ class TechnicalIndicators:
         }
     
     @staticmethod
-    def calculate_all_indicators(klines_data: List[Tuple]) -> Dict:
+    def calculate_extended_indicators(klines_data: List[Tuple]) -> Dict:
+        """
+        计算扩展指标（VWAP、随机指标、ADX/DMI、OBV、肯特纳/唐奇安通道、SuperTrend、z-score）
+        klines_data: [(open_time, open, high, low, close, volume[, taker_buy_volume]), ...]，taker_buy_volume 可为 None
+        数据不足的指标不出现在结果中
+        """
+        if len(klines_data) < 2:
+            return {}
+
+        data = np.asarray(klines_data, dtype=float)
+        open_time = data[:, 0]
+        high, low, close, volume = data[:, 2], data[:, 3], data[:, 4], data[:, 5]
+        current_price = float(close[-1])
+        result = {}
+
+        # VWAP：当日时段 + 锚定在窗口内最低点
+        session_vwap = float(TechnicalIndicators.vwap_series(high, low, close, volume, open_time)[-1])
+        anchor = int(np.argmin(low))
+        anchored_vwap = float(TechnicalIndicators.anchored_vwap_series(high, low, close, volume, anchor)[-1])
+        result['vwap'] = {
+            'session': round(session_vwap, 2),
+            'anchored': round(anchored_vwap, 2),
+            'anchor_time': int(open_time[anchor]),
+            'position': 'above' if current_price > session_vwap else 'below'
+        }
+
+        stoch = TechnicalIndicators.stochastic_series(high, low, close)
+        if len(stoch['d']):
+            k, d = float(stoch['k'][-1]), float(stoch['d'][-1])
+            result['stochastic'] = {
+                'k': round(k, 2),
+                'd': round(d, 2),
+                'signal': 'overbought' if k > 80 else 'oversold' if k < 20 else 'neutral'
+            }
+
+        dmi = TechnicalIndicators.dmi_series(high, low, close)
+        if len(dmi['adx']):
+            adx = float(dmi['adx'][-1])
+            plus_di, minus_di = float(dmi['plus_di'][-1]), float(dmi['minus_di'][-1])
+            result['adx'] = {
+                'adx': round(adx, 2),
+                'plus_di': round(plus_di, 2),
+                'minus_di': round(minus_di, 2),
+                'trend': ('strong_' if adx >= 25 else 'weak_') + ('up' if plus_di >= minus_di else 'down')
+            }
+
+        obv = TechnicalIndicators.obv_series(close, volume)
+        lookback = min(10, len(obv) - 1)
+        result['obv'] = {
+            'obv': round(float(obv[-1]), 4),
+            'change': round(float(obv[-1] - obv[-1 - lookback]), 4)
+        }
+
+        keltner = TechnicalIndicators.keltner_series(high, low, close)
+        if len(keltner['middle']):
+            upper, lower = float(keltner['upper'][-1]), float(keltner['lower'][-1])
+            result['keltner'] = {
+                'upper': round(upper, 2),
+                'middle': round(float(keltner['middle'][-1]), 2),
+                'lower': round(lower, 2),
+                'position': 'above_upper' if current_price > upper else 'below_lower' if current_price < lower else 'inside'
+            }
+
+        donchian = TechnicalIndicators.donchian_series(high, low)
+        if len(donchian['upper']):
+            result['donchian'] = {
+                'upper': round(float(donchian['upper'][-1]), 2),
+                'middle': round(float(donchian['middle'][-1]), 2),
+                'lower': round(float(donchian['lower'][-1]), 2)
+            }
+
+        supertrend = TechnicalIndicators.supertrend_series(high, low, close)
+        if len(supertrend['supertrend']):
+            result['supertrend'] = {
+                'value': round(float(supertrend['supertrend'][-1]), 2),
+                'direction': 'up' if supertrend['direction'][-1] > 0 else 'down'
+            }
+
+        volume_z = TechnicalIndicators.zscore_series(volume)
+        if len(volume_z):
+            zscore = {'volume': round(float(volume_z[-1]), 2), 'taker_buy_ratio': None}
+            # 主动买入量为空（None -> nan）的旧K线不参与；最新一根没有时该项为 None
+            if data.shape[1] > 6 and not np.isnan(data[-1, 6]):
+                known = ~np.isnan(data[:, 6])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ratio = np.where(volume[known] > 0, data[known, 6] / volume[known], 0.5)
+                ratio_z = TechnicalIndicators.zscore_series(ratio)
+                if len(ratio_z):
+                    zscore['taker_buy_ratio'] = round(float(ratio_z[-1]), 2)
+            result['zscore'] = zscore
+
+        return result
+
+    @staticmethod
+    def calculate_all_indicators(klines_data: List[Tuple], extended: bool = False) -> Dict:
         """
         计算所有技术指标
-        klines_data: [(open_time, open, high, low, close, volume), ...]
+        klines_data: [(open_time, open, high, low, close, volume[, taker_buy_volume]), ...]
+        extended: 同时计算扩展指标，结果放在 'extended' 键下（见 calculate_extended_indicators）
         """
         if len(klines_data) < 26:  # 至少需要26根K线（MACD慢线周期）
             return {
@@ -206,28 +575,32 @@ class TechnicalIndicators:
                 'available': False
             }
         
-        # 提取价格数据
-        close_prices = [float(k[4]) for k in klines_data]
-        high_prices = [float(k[2]) for k in klines_data]
-        low_prices = [float(k[3]) for k in klines_data]
+        # 提取价格数据（一次性转换为数组）
+        data = np.asarray(klines_data, dtype=float)
+        high_prices = data[:, 2]
+        low_prices = data[:, 3]
+        close_prices = data[:, 4]
         
-        # 计算各项指标
-        ema_12 = TechnicalIndicators.calculate_ema(close_prices, 12)
-        ema_26 = TechnicalIndicators.calculate_ema(close_prices, 26)
-        macd = TechnicalIndicators.calculate_macd(close_prices)
+        # 计算各项指标（MACD复用EMA12/EMA26）
+        ema_12 = TechnicalIndicators.ema_series(close_prices, 12)
+        ema_26 = TechnicalIndicators.ema_series(close_prices, 26)
+        macd = TechnicalIndicators.calculate_macd(close_prices, ema_fast=ema_12, ema_slow=ema_26)
         rsi = TechnicalIndicators.calculate_rsi(close_prices)
         atr = TechnicalIndicators.calculate_atr(high_prices, low_prices, close_prices)
         bollinger = TechnicalIndicators.calculate_bollinger_bands(close_prices)
         
-        return {
-            'ema_12': round(ema_12[-1], 2) if ema_12 else 0,
-            'ema_26': round(ema_26[-1], 2) if ema_26 else 0,
+        result = {
+            'ema_12': round(float(ema_12[-1]), 2),
+            'ema_26': round(float(ema_26[-1]), 2),
             'macd': macd,
             'rsi': rsi,
             'atr': atr,
             'bollinger': bollinger,
             'available': True
         }
+        if extended:
+            result['extended'] = TechnicalIndicators.calculate_extended_indicators(data)
+        return result
 
 if __name__ == '__main__':
     # 测试代码
@@ -253,3 +626,6 @@ if __name__ == '__main__':
     
     boll = TechnicalIndicators.calculate_bollinger_bands(test_prices)
     print(f"\nBollinger Bands: {boll}")
+    
+    klines = [(i * 60000, p, h, l, p, 10.0 + i % 7) for i, (p, h, l) in enumerate(zip(test_prices, high_prices, low_prices))]
+    print(f"\nExtended: {TechnicalIndicators.calculate_extended_indicators(klines)}")
@@ -0,0 +1,329 @@
+"""
+增量技术指标 - 每根K线收盘时 O(1) 更新，不再每次重算整个窗口
+各指标的预热方式与 indicators.py 一致（EMA/Wilder 以前 period 个值的简单平均起步），
+IndicatorSet.snapshot() 的返回格式与 TechnicalIndicators.calculate_all_indicators 相同。
+"""
+import math
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+class StreamingEMA:
+    """指数移动平均"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value = None
+        self._warmup = []
+
+    def update(self, x: float) -> Optional[float]:
+        if self.value is None:
+            self._warmup.append(x)
+            if len(self._warmup) == self.period:
+                self.value = sum(self._warmup) / self.period
+                self._warmup = None
+        else:
+            self.value += (x - self.value) * self.alpha
+        return self.value
+
+
+class StreamingWilder:
+    """Wilder 平滑: 首值为前 period 个的平均，之后 avg = (avg*(period-1) + x) / period"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value = None
+        self._sum = 0.0
+        self._count = 0
+
+    def update(self, x: float) -> Optional[float]:
+        if self.value is None:
+            self._sum += x
+            self._count += 1
+            if self._count == self.period:
+                self.value = self._sum / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + x) / self.period
+        return self.value
+
+
+class StreamingMACD:
+    """MACD：快慢线EMA + MACD线的信号EMA"""
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        self.fast = StreamingEMA(fast_period)
+        self.slow = StreamingEMA(slow_period)
+        self.signal = StreamingEMA(signal_period)
+        self.macd = None
+
+    def update(self, close: float) -> Optional[Dict[str, float]]:
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        if slow is None:
+            return None
+        self.macd = fast - slow
+        signal = self.signal.update(self.macd)
+        if signal is None:
+            return None
+        return {'macd': self.macd, 'signal': signal, 'histogram': self.macd - signal}
+
+
+class StreamingRSI:
+    """RSI（Wilder 平滑）"""
+
+    def __init__(self, period: int = 14):
+        self.gain = StreamingWilder(period)
+        self.loss = StreamingWilder(period)
+        self.value = None
+        self._prev = None
+
+    def update(self, close: float) -> Optional[float]:
+        if self._prev is not None:
+            delta = close - self._prev
+            avg_gain = self.gain.update(delta if delta > 0 else 0.0)
+            avg_loss = self.loss.update(-delta if delta < 0 else 0.0)
+            if avg_loss is not None:
+                self.value = 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+        self._prev = close
+        return self.value
+
+
+class StreamingATR:
+    """ATR（真实波幅的 Wilder 平滑）"""
+
+    def __init__(self, period: int = 14):
+        self.smooth = StreamingWilder(period)
+        self.value = None
+        self._prev_close = None
+
+    def update(self, high: float, low: float, close: float) -> Optional[float]:
+        if self._prev_close is not None:
+            true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+            self.value = self.smooth.update(true_range)
+        self._prev_close = close
+        return self.value
+
+
+class StreamingBollinger:
+    """
+    滚动布林带：维护窗口内的累计和与平方和
+    以第一个价格为基准做平移，减小大数相减的误差；每隔 RESYNC_EVERY 次从窗口重新求和，消除累计误差
+    """
+
+    RESYNC_EVERY = 1000
+
+    def __init__(self, period: int = 20, std_dev: float = 2.0):
+        self.period = period
+        self.std_dev = std_dev
+        self.window = deque(maxlen=period)
+        self._shift = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._updates = 0
+        self.update_result = None   # 最近一次 update 的结果
+
+    def update(self, close: float) -> Optional[Dict[str, float]]:
+        if self._shift is None:
+            self._shift = close
+        x = close - self._shift
+
+        if len(self.window) == self.period:
+            old = self.window[0]
+            self._sum -= old
+            self._sum_sq -= old * old
+        self.window.append(x)
+        self._sum += x
+        self._sum_sq += x * x
+
+        self._updates += 1
+        if self._updates % self.RESYNC_EVERY == 0:
+            self._sum = sum(self.window)
+            self._sum_sq = sum(v * v for v in self.window)
+
+        if len(self.window) < self.period:
+            return None
+
+        mean = self._sum / self.period
+        std = math.sqrt(max(self._sum_sq / self.period - mean * mean, 0.0))
+        middle = mean + self._shift
+        upper = middle + self.std_dev * std
+        lower = middle - self.std_dev * std
+        width = ((upper - lower) / middle) * 100 if middle > 0 else 0
+        self.update_result = {'upper': upper, 'middle': middle, 'lower': lower, 'width': width}
+        return self.update_result
+
+
+class IndicatorSet:
+    """单个 (交易对, 周期) 的全部增量指标"""
+
+    MIN_CANDLES = 26    # 与 calculate_all_indicators 一致
+
+    def __init__(self):
+        self.ema_12 = StreamingEMA(12)
+        self.ema_26 = StreamingEMA(26)
+        self.macd = StreamingMACD()
+        self.rsi = StreamingRSI()
+        self.atr = StreamingATR()
+        self.bollinger = StreamingBollinger()
+        self.count = 0
+        self.last_open_time = None
+        self._snapshot = None
+
+    def update(self, open_time: int, high: float, low: float, close: float) -> bool:
+        """喂入一根已收盘的K线；重复或更早的K线会被忽略，返回是否已更新"""
+        if self.last_open_time is not None and open_time <= self.last_open_time:
+            return False
+
+        self.ema_12.update(close)
+        self.ema_26.update(close)
+        macd = self.macd.update(close)
+        self.rsi.update(close)
+        self.atr.update(high, low, close)
+        bands = self.bollinger.update(close)
+
+        self.count += 1
+        self.last_open_time = open_time
+        self._snapshot = self._build_snapshot(close, macd, bands)
+        return True
+
+    def _build_snapshot(self, close, macd, bands):
+        if self.count < self.MIN_CANDLES:
+            return {
+                'ema_12': 0,
+                'ema_26': 0,
+                'macd': {},
+                'rsi': 50,
+                'atr': 0,
+                'bollinger': {},
+                'available': False
+            }
+
+        if macd is None:
+            macd_result = {'macd': 0, 'signal': 0, 'histogram': 0, 'trend': 'neutral'}
+        else:
+            if macd['histogram'] > 0 and macd['macd'] > 0:
+                trend = 'bullish'
+            elif macd['histogram'] < 0 and macd['macd'] < 0:
+                trend = 'bearish'
+            else:
+                trend = 'neutral'
+            macd_result = {
+                'macd': round(macd['macd'], 4),
+                'signal': round(macd['signal'], 4),
+                'histogram': round(macd['histogram'], 4),
+                'trend': trend
+            }
+
+        if bands is None:
+            bollinger = {'upper': 0, 'middle': 0, 'lower': 0, 'width': 0, 'position': 'neutral'}
+        else:
+            if close > bands['upper']:
+                position = 'above_upper'
+            elif close < bands['lower']:
+                position = 'below_lower'
+            elif close > bands['middle']:
+                position = 'above_middle'
+            else:
+                position = 'below_middle'
+            bollinger = {
+                'upper': round(bands['upper'], 2),
+                'middle': round(bands['middle'], 2),
+                'lower': round(bands['lower'], 2),
+                'width': round(bands['width'], 2),
+                'position': position,
+                'current_price': round(close, 2)
+            }
+
+        return {
+            'ema_12': round(self.ema_12.value, 2),
+            'ema_26': round(self.ema_26.value, 2),
+            'macd': macd_result,
+            'rsi': round(self.rsi.value, 2) if self.rsi.value is not None else 50.0,
+            'atr': round(self.atr.value, 4) if self.atr.value is not None else 0.0,
+            'bollinger': bollinger,
+            'available': True
+        }
+
+    def snapshot(self) -> Optional[Dict]:
+        """最新指标（格式同 calculate_all_indicators），还没有K线时返回 None"""
+        return self._snapshot
+
+    def values(self) -> Optional[Dict]:
+        """最新指标的原始值（不取整，用于落库），K线不足 MIN_CANDLES 根时返回 None；尚未就绪的单项为 None"""
+        if self.count < self.MIN_CANDLES:
+            return None
+        signal = self.macd.signal.value
+        bands = self.bollinger.update_result
+        return {
+            'ema_12': self.ema_12.value,
+            'ema_26': self.ema_26.value,
+            'macd': self.macd.macd,
+            'macd_signal': signal,
+            'macd_histogram': self.macd.macd - signal if signal is not None else None,
+            'rsi': self.rsi.value,
+            'atr': self.atr.value,
+            'boll_upper': bands['upper'] if bands else None,
+            'boll_middle': bands['middle'] if bands else None,
+            'boll_lower': bands['lower'] if bands else None,
+            'boll_width': bands['width'] if bands else None,
+        }
+
+
+class IndicatorRegistry:
+    """按 (交易对, 周期) 保存增量指标，采集线程写、分析器/API读"""
+
+    def __init__(self):
+        self._sets = {}
+        self._lock = threading.Lock()
+
+    def seed(self, symbol: str, interval: str, klines) -> int:
+        """
+        用历史K线预热（klines: [(open_time, open, high, low, close, ...), ...]，从旧到新）
+        返回实际喂入的K线数
+        """
+        fed = 0
+        for k in klines:
+            if self.update(symbol, interval, k[0], k[2], k[3], k[4]):
+                fed += 1
+        return fed
+
+    def update(self, symbol: str, interval: str, open_time: int, high: float, low: float, close: float) -> bool:
+        """喂入一根已收盘的K线"""
+        key = (symbol.lower(), interval)
+        with self._lock:
+            indicator_set = self._sets.get(key)
+            if indicator_set is None:
+                indicator_set = self._sets[key] = IndicatorSet()
+            return indicator_set.update(open_time, float(high), float(low), float(close))
+
+    def latest(self, symbol: str, interval: str) -> Optional[Dict]:
+        """最新指标快照，没有数据时返回 None"""
+        with self._lock:
+            indicator_set = self._sets.get((symbol.lower(), interval))
+            if indicator_set is None:
+                return None
+            snapshot = indicator_set.snapshot()
+            if snapshot is None:
+                return None
+            return dict(snapshot, open_time=indicator_set.last_open_time, candles=indicator_set.count)
+
+    def values(self, symbol: str, interval: str) -> Optional[Dict]:
+        """最新指标原始值（见 IndicatorSet.values），附带 open_time"""
+        with self._lock:
+            indicator_set = self._sets.get((symbol.lower(), interval))
+            if indicator_set is None:
+                return None
+            values = indicator_set.values()
+            if values is None:
+                return None
+            return dict(values, open_time=indicator_set.last_open_time)
+
+    def keys(self):
+        with self._lock:
+            return list(self._sets)
+
+
+# 进程内共享的注册表：同一进程里的采集器负责更新，分析器直接读取
+registry = IndicatorRegistry()
@@ -0,0 +1,222 @@
+"""
+列式归档 - 把成交、K线和合约指标按交易对/日期导出为 Parquet，供研究端按列、按时间范围读取
+目录布局（hive 分区）: <根目录>/<表>/symbol=<交易对>/date=<YYYY-MM-DD>/part-0.parquet（UTC）
+每个文件按时间排序、分成若干 row group，读取时先按目录裁剪交易对/日期，再用 row group 的最小/最大值跳过时间范围外的数据，
+只解码需要的列。导出只处理已经结束的整天，文件已存在则跳过，可以反复执行。
+需要 pyarrow（可选依赖: pip install pyarrow）；未安装时导出和切片不可用，已有文件仍可直接下载。
+
+用法: python columnar_archive.py [数据库路径] [--root DIR] [--tables trades,klines] [--partitions DIR] [--overwrite]
+"""
+import io
+import os
+import sys
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+from database import DB_PATH, connect_reader
+from partitions import DAY_MS, PartitionStore, day_of, day_start
+from trade_rollup import SYMBOLS_SQL
+
+COLUMNAR_DIR = 'columnar'
+ROW_GROUP_SIZE = 100000     # 每个 row group 的行数（时间范围过滤的粒度）
+
+# 表 -> (时间列, 导出的列)；symbol 由目录表示，不写入文件
+TABLES = {
+    'trades': ('timestamp', ['id', 'timestamp', 'price', 'quantity', 'is_buyer_maker', 'trade_id']),
+    'klines': ('open_time', ['interval', 'open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time',
+                             'quote_volume', 'trades_count', 'taker_buy_volume', 'taker_buy_quote_volume']),
+    'open_interest': ('timestamp', ['timestamp', 'open_interest', 'open_interest_value']),
+    'funding_rate': ('timestamp', ['timestamp', 'funding_rate', 'next_funding_time']),
+    'long_short_ratio': ('timestamp', ['timestamp', 'long_short_ratio', 'long_account', 'short_account']),
+    'top_trader_position': ('timestamp', ['timestamp', 'long_position_ratio', 'short_position_ratio',
+                                          'long_account_ratio', 'short_account_ratio']),
+}
+
+INT_COLUMNS = {'id', 'timestamp', 'open_time', 'close_time', 'trades_count', 'is_buyer_maker', 'trade_id',
+               'next_funding_time'}
+STRING_COLUMNS = {'interval'}
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("列式归档需要 pyarrow: pip install pyarrow")
+
+
+def schema(table):
+    require_pyarrow()
+    fields = []
+    for name in TABLES[table][1]:
+        col_type = pa.int64() if name in INT_COLUMNS else pa.string() if name in STRING_COLUMNS else pa.float64()
+        fields.append((name, col_type))
+    return pa.schema(fields)
+
+
+def day_path(root, table, symbol, day):
+    return os.path.join(root, table, f'symbol={symbol.lower()}', f'date={day}', 'part-0.parquet')
+
+
+def _day_rows(db, table, symbol, day, partitions=None):
+    """一天的行（按时间排序的迭代器）；成交配置了分区时先读分区再接主库"""
+    time_column, fields = TABLES[table]
+    start = day_start(day)
+    if table == 'trades' and partitions is not None:
+        return partitions.query(table, symbol, start, start + DAY_MS, fields=fields, hot_db=db)
+    # K线按 (interval, open_time) 排序，正好是唯一索引的顺序
+    order = 'interval, open_time' if table == 'klines' else time_column
+    return db.execute(f'''
+        SELECT {', '.join(fields)} FROM {table}
+        WHERE symbol = ? AND {time_column} >= ? AND {time_column} < ?
+        ORDER BY {order}
+    ''', (symbol.lower(), start, start + DAY_MS))
+
+
+def write_day(db, table, symbol, day, root=COLUMNAR_DIR, partitions=None):
+    """导出一个交易对一天的数据（逐个 row group 写入，内存占用与天数据量无关），返回行数；没有数据时不建文件"""
+    require_pyarrow()
+    table_schema = schema(table)
+    names = table_schema.names
+    path = day_path(root, table, symbol, day)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    writer = None
+    count = 0
+    rows = iter(_day_rows(db, table, symbol, day, partitions))
+    try:
+        while True:
+            chunk = [row for _, row in zip(range(ROW_GROUP_SIZE), rows)]
+            if not chunk:
+                break
+            if writer is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = pq.ParquetWriter(tmp, table_schema, compression='zstd')
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(columns[i], type=table_schema.field(i).type) for i in range(len(names))],
+                schema=table_schema))
+            count += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp, path)
+    return count
+
+
+def _symbols(db, table):
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+        return []
+    return [row[0] for row in db.execute(SYMBOLS_SQL.format(table=table))]
+
+
+def _first_day(db, table, symbol, partitions=None):
+    time_column = TABLES[table][0]
+    first = db.execute(f'SELECT MIN({time_column}) FROM {table} WHERE symbol = ?', (symbol,)).fetchone()[0]
+    days = [day_of(first)] if first is not None else []
+    if table == 'trades' and partitions is not None:
+        days += [day for day, _ in partitions.partitions(table, symbol)[:1]]
+    return min(days) if days else None
+
+
+def export(db, root=COLUMNAR_DIR, tables=None, partitions=None, now_ms=None, overwrite=False):
+    """导出所有交易对已经结束的整天（已存在的文件跳过），返回 {表: 行数}"""
+    require_pyarrow()
+    today = day_start(day_of(now_ms if now_ms is not None else int(time.time() * 1000)))
+    written = {}
+    for table in tables or list(TABLES):
+        written[table] = 0
+        for symbol in _symbols(db, table):
+            first = _first_day(db, table, symbol, partitions)
+            if first is None:
+                continue
+            for start in range(day_start(first), today, DAY_MS):
+                day = day_of(start)
+                if not overwrite and os.path.exists(day_path(root, table, symbol, day)):
+                    continue
+                written[table] += write_day(db, table, symbol, day, root, partitions)
+    return written
+
+
+def list_files(root=COLUMNAR_DIR, table=None, symbol=None):
+    """已导出的文件 [{'table', 'symbol', 'date', 'size'}, ...]（不需要 pyarrow）"""
+    result = []
+    for name in [table] if table else sorted(TABLES):
+        table_dir = os.path.join(root, name)
+        if not os.path.isdir(table_dir):
+            continue
+        for symbol_dir in sorted(os.listdir(table_dir)):
+            sym = symbol_dir.split('=', 1)[-1]
+            if symbol and sym != symbol.lower():
+                continue
+            for date_dir in sorted(os.listdir(os.path.join(table_dir, symbol_dir))):
+                day = date_dir.split('=', 1)[-1]
+                path = day_path(root, name, sym, day)
+                if os.path.exists(path):
+                    result.append({'table': name, 'symbol': sym, 'date': day, 'size': os.path.getsize(path)})
+    return result
+
+
+def read(root, table, symbol=None, start_ms=None, end_ms=None, columns=None):
+    """
+    读取为 pyarrow.Table：交易对/日期条件裁剪目录，时间条件下推到 row group 统计，columns 只解码需要的列
+    返回结果按交易对、时间排序（与文件内顺序一致）
+    """
+    require_pyarrow()
+    time_column, fields = TABLES[table]
+    if columns:
+        unknown = set(columns) - set(fields) - {'symbol', 'date'}
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(sorted(unknown))}")
+    table_dir = os.path.join(root, table)
+    if not os.path.isdir(table_dir):
+        return schema(table).empty_table()
+
+    partitioning = ds.partitioning(pa.schema([('symbol', pa.string()), ('date', pa.string())]), flavor='hive')
+    dataset = ds.dataset(table_dir, format='parquet', partitioning=partitioning)
+    conditions = []
+    if symbol:
+        conditions.append(ds.field('symbol') == symbol.lower())
+    if start_ms is not None:
+        conditions.append(ds.field('date') >= day_of(start_ms))
+        conditions.append(ds.field(time_column) >= start_ms)
+    if end_ms is not None:
+        conditions.append(ds.field('date') <= day_of(end_ms - 1))
+        conditions.append(ds.field(time_column) < end_ms)
+    condition = None
+    for item in conditions:
+        condition = item if condition is None else condition & item
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def to_parquet_bytes(arrow_table):
+    """把读取结果编码为 Parquet（API 返回切片用）"""
+    require_pyarrow()
+    buffer = io.BytesIO()
+    pq.write_table(arrow_table, buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = {'--root': COLUMNAR_DIR, '--tables': None, '--partitions': None}
+    for name in list(options):
+        if name in args:
+            idx = args.index(name)
+            options[name] = args[idx + 1]
+            del args[idx:idx + 2]
+    overwrite = '--overwrite' in args
+    if overwrite:
+        args.remove('--overwrite')
+    path = args[0] if args else DB_PATH
+
+    db = connect_reader(path)
+    store = PartitionStore(options['--partitions']) if options['--partitions'] else None
+    tables = options['--tables'].split(',') if options['--tables'] else None
+    print(f"📦 Exporting {path} -> {options['--root']} (Parquet)")
+    for table, count in export(db, options['--root'], tables, store, overwrite=overwrite).items():
+        print(f"  ✅ {table:20s} {count} rows")
+    db.close()
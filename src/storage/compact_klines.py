@@ -0,0 +1,76 @@
+"""
+K线去重压缩工具 - 删除重复写入的K线
+每个 (symbol, interval, open_time) 只保留 id 最大（最后写入）的一行。
+按交易对/周期分组、按 open_time 分批处理，每批单独提交，不会把整张表读进内存，也不会长时间占用写锁。
+
+用法: python compact_klines.py [数据库路径] [--vacuum]
+"""
+import sys
+
+from database import DB_PATH, connect
+
+
+def _pairs(db):
+    # symbol/interval 为 NULL 的旧数据不受唯一约束影响，不处理
+    return db.execute('''
+        SELECT DISTINCT symbol, interval FROM klines
+        WHERE symbol IS NOT NULL AND interval IS NOT NULL
+    ''').fetchall()
+
+
+def compact_pair(db, symbol, interval, batch_size=1000):
+    """压缩单个交易对/周期的重复K线，返回删除的行数"""
+    removed = 0
+    last_open_time = -1
+
+    while True:
+        # 找出下一批有重复的 open_time（沿索引顺序向后推进）
+        groups = db.execute('''
+            SELECT open_time, MAX(id) FROM klines
+            WHERE symbol = ? AND interval = ? AND open_time > ?
+            GROUP BY open_time
+            HAVING COUNT(*) > 1
+            ORDER BY open_time
+            LIMIT ?
+        ''', (symbol, interval, last_open_time, batch_size)).fetchall()
+
+        if not groups:
+            break
+
+        with db:
+            cursor = db.executemany('''
+                DELETE FROM klines
+                WHERE symbol = ? AND interval = ? AND open_time = ? AND id < ?
+            ''', [(symbol, interval, open_time, keep_id) for open_time, keep_id in groups])
+            removed += cursor.rowcount
+
+        last_open_time = groups[-1][0]
+
+    return removed
+
+
+def compact_klines(db, batch_size=1000, verbose=True):
+    """压缩整张K线表，返回删除的总行数"""
+    total = 0
+    for symbol, interval in _pairs(db):
+        removed = compact_pair(db, symbol, interval, batch_size)
+        total += removed
+        if verbose and removed:
+            print(f"  🧹 {str(symbol).upper()} {interval}: 删除 {removed} 条重复K线")
+    return total
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    path = args[0] if args else DB_PATH
+
+    print(f"🔧 正在压缩 {path} 中的重复K线...")
+    db = connect(path)
+    total = compact_klines(db)
+    print(f"✅ 共删除 {total} 条重复K线")
+
+    if '--vacuum' in sys.argv:
+        print("🔧 正在 VACUUM 回收磁盘空间...")
+        db.execute('VACUUM')
+        print("✅ VACUUM 完成")
+    db.close()
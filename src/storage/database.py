@@ -0,0 +1,42 @@
+"""
+数据库连接工厂 - 所有组件统一从这里获取 crypto_data.db 的连接
+开启WAL后读连接不会阻塞写连接，写连接也不会阻塞读连接
+"""
+import sqlite3
+
+DB_PATH = 'crypto_data.db'
+
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 65536            # 页缓存 64MB（负数表示按KB计）
+MMAP_SIZE = 256 * 1024 * 1024    # 内存映射 256MB
+
+
+def _apply_pragmas(db):
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    db.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    db.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    db.execute('PRAGMA temp_store=MEMORY')
+
+
+def connect(db_path=DB_PATH, check_same_thread=True, row_factory=None):
+    """
+    获取写连接
+    check_same_thread: 跨线程共享连接时传 False
+    """
+    db = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=check_same_thread)
+    _apply_pragmas(db)
+    if row_factory:
+        db.row_factory = row_factory
+    return db
+
+
+def connect_reader(db_path=DB_PATH, check_same_thread=True, row_factory=None):
+    """
+    获取只读连接（Web界面、API、分析器使用）
+    query_only 保证读连接不会意外写库或占用写锁
+    """
+    db = connect(db_path, check_same_thread=check_same_thread, row_factory=row_factory)
+    db.execute('PRAGMA query_only=1')
+    return db
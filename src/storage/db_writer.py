@@ -0,0 +1,307 @@
+"""
+批量写入器 - 单写线程 + 有界队列
+采集线程只负责把行放进队列，由写线程按条数/时间阈值批量 executemany 并一次提交，
+避免每条消息一次 commit（一次 fsync）
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+from database import DB_PATH, connect
+
+_STOP = object()
+_FLUSH = object()
+_ATOMIC = object()
+
+
+class Commit:
+    """submit_atomic 的结果：wait() 阻塞到写线程处理完，返回是否已提交"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.committed = False
+
+    def _set(self, committed):
+        self.committed = committed
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout) and self.committed
+
+
+class BatchWriter:
+    """单写线程批量写入器"""
+
+    def __init__(self, db_path=DB_PATH, batch_size=500, flush_interval=0.2,
+                 max_queue=50000, report_interval=60):
+        """
+        db_path: 数据库路径
+        batch_size: 累计多少行触发一次写入
+        flush_interval: 最多等待多少秒触发一次写入
+        max_queue: 队列上限，满了之后 submit 会阻塞（背压），不会丢数据
+        report_interval: 每隔多少秒打印一次写入统计（0 表示不打印）
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.report_interval = report_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        self._thread = None
+        self._listeners = []
+        self._stats_lock = threading.Lock()
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_failed = 0
+        self.backpressure_waits = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        """启动写线程"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._thread = threading.Thread(target=self._run, daemon=True, name="DB-Writer")
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """写完队列中剩余的数据并停止写线程"""
+        if not self._thread:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def add_commit_listener(self, listener):
+        """
+        每批提交成功后在写线程中调用 listener({sql: [行, ...]})（同一个 listener 只注册一次）
+        用于通知其他进程有新数据（见 live_feed），listener 应当很快返回
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def submit(self, sql, params):
+        """提交一行"""
+        self._put((sql, [params]))
+
+    def submit_many(self, sql, rows):
+        """提交多行（同一条SQL）"""
+        rows = list(rows)
+        if rows:
+            self._put((sql, rows))
+
+    def submit_atomic(self, statements):
+        """
+        statements: [(sql, [行, ...]), ...]，在同一个事务里全部写入或全部不写（不做逐行拆分），
+        之前提交的数据先写入；返回 Commit，调用方在 wait() 确认提交后再推进自己的进度
+        """
+        commit = Commit()
+        self._put((_ATOMIC, ([(sql, list(rows)) for sql, rows in statements], commit)))
+        return commit
+
+    def flush(self, timeout=None):
+        """阻塞直到此前提交的数据全部写入"""
+        done = threading.Event()
+        self._put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def _put(self, item):
+        # 队列满时阻塞等待写线程消化（背压），而不是丢弃
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self.backpressure_waits += 1
+            self.queue.put(item)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _run(self):
+        db = self._connect()
+        pending = {}
+        pending_rows = 0
+        deadline = None
+        next_report = time.monotonic() + self.report_interval if self.report_interval else None
+
+        while True:
+            if deadline is None:
+                timeout = self.flush_interval
+            else:
+                timeout = max(0.0, deadline - time.monotonic())
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            stop = item is _STOP
+            waiter = None
+            atomic = None
+
+            if item is not None and not stop:
+                sql, rows = item
+                if sql is _FLUSH:
+                    waiter = rows
+                elif sql is _ATOMIC:
+                    atomic = rows
+                else:
+                    pending.setdefault(sql, []).extend(rows)
+                    pending_rows += len(rows)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if pending_rows and (stop or waiter or atomic or due or pending_rows >= self.batch_size):
+                self._write(db, pending, pending_rows)
+                pending = {}
+                pending_rows = 0
+                deadline = None
+
+            if atomic:
+                self._write_atomic(db, *atomic)
+
+            if waiter:
+                waiter.set()
+
+            if next_report and time.monotonic() >= next_report:
+                self.print_stats()
+                next_report = time.monotonic() + self.report_interval
+
+            if stop:
+                break
+
+        db.close()
+
+    def _write(self, db, pending, row_count):
+        """
+        一个事务内写入一批数据，失败时重试（数据库被锁等临时错误）；
+        仍然失败时按 SQL 分组、再逐行单独写入，只有出错的行计入丢失行数
+        """
+        start = time.perf_counter()
+        if not self._try_execute(db, pending.items()):
+            pending, row_count = self._write_each(db, pending)
+        self._committed(pending, row_count, start)
+
+    def _write_atomic(self, db, statements, commit):
+        """submit_atomic 提交的语句：一个事务，失败时整组丢弃并告知调用方"""
+        start = time.perf_counter()
+        row_count = sum(len(rows) for _, rows in statements)
+        if not self._try_execute(db, statements):
+            with self._stats_lock:
+                self.rows_failed += row_count
+            print(f"❌ DB Writer gave up on an atomic write of {row_count} rows")
+            commit._set(False)
+            return
+        pending = {}
+        for sql, rows in statements:
+            pending.setdefault(sql, []).extend(rows)
+        self._committed(pending, row_count, start)
+        commit._set(True)
+
+    def _try_execute(self, db, statements):
+        """一个事务内执行 [(sql, 行)]，数据库被锁等临时错误时重试，返回是否提交"""
+        for attempt in range(3):
+            try:
+                with db:
+                    for sql, rows in statements:
+                        db.executemany(sql, rows)
+                return True
+            except sqlite3.Error as e:
+                print(f"❌ DB Writer error (attempt {attempt + 1}/3): {e}")
+                # 约束冲突、参数错误等重试也不会成功
+                if not isinstance(e, sqlite3.OperationalError):
+                    return False
+                time.sleep(0.5 * (attempt + 1))
+        return False
+
+    def _committed(self, pending, row_count, start):
+        """更新写入统计并通知 listener；整批都没有写入时只记丢失行数，不计入批次和刷盘耗时"""
+        if not row_count:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self.rows_written += row_count
+            self.batches_written += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+        for listener in self._listeners:
+            try:
+                listener(pending)
+            except Exception as e:
+                print(f"⚠️ DB Writer commit listener error: {e}")
+
+    def _write_each(self, db, pending):
+        """整批写入失败后的退路：每条 SQL 一个事务，整组失败时逐行写入；返回 (写入成功的行, 行数)"""
+        written = {}
+        failed = 0
+        for sql, rows in pending.items():
+            try:
+                with db:
+                    db.executemany(sql, rows)
+                written[sql] = rows
+                continue
+            except sqlite3.Error:
+                pass
+            ok = []
+            errors = {}
+            try:
+                with db:
+                    for row in rows:
+                        try:
+                            db.execute(sql, row)
+                            ok.append(row)
+                        except sqlite3.Error as e:
+                            errors[str(e)] = errors.get(str(e), 0) + 1
+            except sqlite3.Error as e:
+                # 提交本身失败（如一直被锁），这组全部丢失
+                errors = {str(e): len(rows)}
+                ok = []
+            if ok:
+                written[sql] = ok
+            failed += len(rows) - len(ok)
+            for message, count in errors.items():
+                print(f"❌ DB Writer dropped {count} rows: {message} ({' '.join(sql.split())[:80]})")
+        with self._stats_lock:
+            self.rows_failed += failed
+        return written, sum(len(rows) for rows in written.values())
+
+    def stats(self):
+        """写入统计：队列深度、写入行数、批次数、刷盘耗时"""
+        with self._stats_lock:
+            avg_ms = self._total_flush_ms / self.batches_written if self.batches_written else 0.0
+            return {
+                'queue_depth': self.queue.qsize(),
+                'rows_written': self.rows_written,
+                'batches_written': self.batches_written,
+                'rows_failed': self.rows_failed,
+                'backpressure_waits': self.backpressure_waits,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'avg_flush_ms': round(avg_ms, 2),
+                'max_flush_ms': round(self.max_flush_ms, 2)
+            }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"[DB Writer] queue: {s['queue_depth']}, rows: {s['rows_written']}, batches: {s['batches_written']}, "
+              f"flush avg/max: {s['avg_flush_ms']:.1f}/{s['max_flush_ms']:.1f} ms, "
+              f"backpressure: {s['backpressure_waits']}, failed: {s['rows_failed']}")
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_path=DB_PATH):
+    """获取（并启动）该数据库共享的写入器，同一进程内每个库只有一个写线程"""
+    with _writers_lock:
+        writer = _writers.get(db_path)
+        if writer is None:
+            writer = BatchWriter(db_path).start()
+            _writers[db_path] = writer
+        return writer
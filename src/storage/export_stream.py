@@ -0,0 +1,146 @@
+"""
+流式导出 - 按 (时间, id) 键集分页，从游标逐块生成 NDJSON / CSV，内存占用与导出行数无关
+每页最多 limit 行；下一页的续传令牌在开始输出前就确定（只读索引找到本页最后一行的键），
+由 API 放在响应头 X-Next-Token 中，客户端带上 after=<令牌> 继续，不需要 OFFSET。
+"""
+import base64
+import csv
+import io
+import json
+
+from orderbook_codec import decode_row
+
+# 表 -> 时间列；都有以 symbol（K线/指标还有 interval）开头、以时间列结尾的索引，(时间, id) 正好是索引顺序
+TIME_COLUMNS = {
+    'trades': 'timestamp',
+    'orderbook': 'timestamp',
+    'klines': 'open_time',
+    'indicators': 'open_time',
+    'trades_1m': 'open_time',
+    'ticker_24h': 'timestamp',
+    'open_interest': 'timestamp',
+    'funding_rate': 'timestamp',
+    'long_short_ratio': 'timestamp',
+    'top_trader_position': 'timestamp',
+}
+
+# 需要指定周期才能走索引的表
+INTERVAL_TABLES = {'klines', 'indicators'}
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+CHUNK_ROWS = 1000           # 每次从游标取多少行编码为一块输出
+MAX_PAGE_ROWS = 1000000
+
+
+def encode_token(time_value, row_id):
+    return base64.urlsafe_b64encode(f'{time_value}:{row_id}'.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """令牌 -> (时间, id)，格式不对时抛 ValueError"""
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        time_value, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        return int(time_value), int(row_id)
+    except Exception:
+        raise ValueError('Invalid continuation token')
+
+
+class ExportPage:
+    """一页导出：构造时确定查询范围和续传令牌，rows() 按键集顺序逐行读取"""
+
+    def __init__(self, db, table, symbol, start_time=None, end_time=None, after=None, limit=100000,
+                 interval=None):
+        """
+        db: 读连接（row_factory 为 sqlite3.Row 时输出带列名）
+        start_time / end_time: 时间范围 [start_time, end_time)，毫秒
+        after: 上一页返回的续传令牌
+        limit: 本页最多行数
+        """
+        if table not in TIME_COLUMNS:
+            raise ValueError('Invalid table name')
+        if not symbol:
+            raise ValueError('symbol is required')
+        if table in INTERVAL_TABLES and not interval:
+            raise ValueError(f'interval is required for {table}')
+
+        self.db = db
+        self.table = table
+        self.limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+        time_column = TIME_COLUMNS[table]
+        self._order = f'{time_column}, id'
+
+        where = ['symbol = ?']
+        params = [symbol.lower()]
+        if table in INTERVAL_TABLES:
+            where.append('interval = ?')
+            params.append(interval)
+        # 起点：续传令牌之后，或 start_time 起（id 从 0 开始，所以 (start_time, -1) 之后包含 start_time）
+        key = decode_token(after) if after else (start_time if start_time is not None else -1, -1)
+        where.append(f'({self._order}) > (?, ?)')
+        params.extend(key)
+        if end_time is not None:
+            where.append(f'{time_column} < ?')
+            params.append(end_time)
+        self._where = ' AND '.join(where)
+        self._params = params
+
+        # 本页最后一行的键；其后还有数据时生成续传令牌，本页查询截止到这个键
+        last = db.execute(f'''
+            SELECT {time_column}, id FROM {table} WHERE {self._where}
+            ORDER BY {self._order} LIMIT 1 OFFSET ?
+        ''', params + [self.limit - 1]).fetchone()
+        self.next_token = None
+        if last is not None:
+            more = db.execute(f'''
+                SELECT 1 FROM {table} WHERE {self._where} AND ({self._order}) > (?, ?)
+                ORDER BY {self._order} LIMIT 1
+            ''', params + [last[0], last[1]]).fetchone()
+            if more:
+                self.next_token = encode_token(last[0], last[1])
+                self._where += f' AND ({self._order}) <= (?, ?)'
+                self._params = params + [last[0], last[1]]
+
+    def rows(self):
+        cursor = self.db.execute(f'SELECT * FROM {self.table} WHERE {self._where} ORDER BY {self._order}',
+                                 self._params)
+        while True:
+            chunk = cursor.fetchmany(CHUNK_ROWS)
+            if not chunk:
+                break
+            yield from chunk
+
+    def _records(self):
+        for row in self.rows():
+            yield decode_row(row) if self.table == 'orderbook' else dict(row)
+
+    def ndjson(self):
+        """逐块生成 NDJSON（每行一个 JSON 对象）"""
+        lines = []
+        for record in self._records():
+            lines.append(json.dumps(record, separators=(',', ':')))
+            if len(lines) >= CHUNK_ROWS:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    def csv(self):
+        """逐块生成 CSV（首行为表头；订单簿档位列为 JSON 字符串）"""
+        buffer = io.StringIO()
+        writer = None
+        for record in self._records():
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(record), extrasaction='ignore')
+                writer.writeheader()
+            writer.writerow({k: json.dumps(v) if isinstance(v, list) else v for k, v in record.items()})
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def chunks(self, fmt='ndjson'):
+        return self.csv() if fmt == 'csv' else self.ndjson()
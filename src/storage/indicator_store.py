@@ -0,0 +1,216 @@
+"""
+技术指标快照表 - 每根K线收盘时写入一行，(symbol, interval, open_time) 唯一
+Web界面、云端API、分析器和回测读取同一份指标值，查询只是一次索引查找。
+采集器在K线收盘时写入实时值；启动时用 missing_rows() 补齐回补K线对应的指标，
+整段历史可用 backfill() 向量化重算:
+    python indicator_store.py [数据库路径] [--symbol ethusdt] [--interval 1h]
+"""
+import os
+import sys
+
+import numpy as np
+
+from database import DB_PATH, connect
+
+# 列顺序即写入顺序；值为原始浮点数（不取整），尚未就绪的单项为 NULL
+INDICATOR_FIELDS = [
+    'ema_12', 'ema_26',
+    'macd', 'macd_signal', 'macd_histogram',
+    'rsi', 'atr',
+    'boll_upper', 'boll_middle', 'boll_lower', 'boll_width',
+]
+
+MIN_CANDLES = 26    # 与 calculate_all_indicators 一致，之前的K线不写指标
+WARMUP_CANDLES = 500    # 增量补齐时向前多取的K线数，EMA/Wilder 在此长度内已收敛
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS indicators (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT,
+        interval TEXT,
+        open_time INTEGER,
+        ema_12 REAL,
+        ema_26 REAL,
+        macd REAL,
+        macd_signal REAL,
+        macd_histogram REAL,
+        rsi REAL,
+        atr REAL,
+        boll_upper REAL,
+        boll_middle REAL,
+        boll_lower REAL,
+        boll_width REAL
+    )
+'''
+
+# 依赖 (symbol, interval, open_time) 唯一索引（见 migrations.UNIQUE_INDEXES）
+INDICATOR_UPSERT_SQL = f'''
+    INSERT INTO indicators (symbol, interval, open_time, {', '.join(INDICATOR_FIELDS)})
+    VALUES (?, ?, ?, {', '.join('?' * len(INDICATOR_FIELDS))})
+    ON CONFLICT(symbol, interval, open_time) DO UPDATE SET
+        {', '.join(f'{field} = excluded.{field}' for field in INDICATOR_FIELDS)}
+'''
+
+
+def make_row(symbol, interval, open_time, values):
+    """values: {指标名: 值}（如 IndicatorRegistry.values 的返回值）-> 写入参数"""
+    return (symbol, interval, open_time) + tuple(values.get(field) for field in INDICATOR_FIELDS)
+
+
+def query_history(db, symbol, interval, start_time=None, end_time=None, limit=500):
+    """按时间范围查询指标历史（从旧到新）；还没有指标表的旧库（未运行 migrations）返回空列表"""
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='indicators'").fetchone():
+        return []
+    query = f'SELECT open_time, {", ".join(INDICATOR_FIELDS)} FROM indicators WHERE symbol = ? AND interval = ?'
+    params = [symbol.lower(), interval]
+    if start_time is not None:
+        query += ' AND open_time >= ?'
+        params.append(start_time)
+    if end_time is not None:
+        query += ' AND open_time <= ?'
+        params.append(end_time)
+
+    # 指定起点时从起点往后取，否则取最近的 limit 条
+    if start_time is not None:
+        query += ' ORDER BY open_time ASC LIMIT ?'
+        params.append(limit)
+        rows = db.execute(query, params).fetchall()
+    else:
+        query += ' ORDER BY open_time DESC LIMIT ?'
+        params.append(limit)
+        rows = db.execute(query, params).fetchall()[::-1]
+
+    columns = ['open_time'] + INDICATOR_FIELDS
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def compute_history(klines):
+    """
+    对整段K线（从旧到新，[(open_time, open, high, low, close, ...), ...]）计算每根K线的指标
+    返回 [(open_time, {指标名: 值}), ...]，从第 MIN_CANDLES 根开始
+    """
+    from indicators import TechnicalIndicators
+
+    n = len(klines)
+    if n < MIN_CANDLES:
+        return []
+
+    data = np.asarray([k[:5] for k in klines], dtype=float)
+    open_time, high, low, close = data[:, 0], data[:, 2], data[:, 3], data[:, 4]
+
+    # 各序列的第一个值对应的K线下标
+    ema_12 = TechnicalIndicators.ema_series(close, 12)                      # 11
+    ema_26 = TechnicalIndicators.ema_series(close, 26)                      # 25
+    macd = TechnicalIndicators.macd_series(close, ema_fast=ema_12, ema_slow=ema_26)   # 25 / 33
+    rsi = TechnicalIndicators.rsi_series(close)                             # 14
+    atr = TechnicalIndicators.atr_series(high, low, close)                  # 14
+    bands = TechnicalIndicators.bollinger_series(close)                     # 19
+
+    def aligned(series, first):
+        # 补 NaN 使下标与K线对齐
+        return np.concatenate([np.full(first, np.nan), series])[:n]
+
+    columns = {
+        'ema_12': aligned(ema_12, 11),
+        'ema_26': aligned(ema_26, 25),
+        'macd': aligned(macd['macd'], 25),
+        'macd_signal': aligned(macd['signal'], 33),
+        'macd_histogram': aligned(macd['histogram'], 33),
+        'rsi': aligned(rsi, 14),
+        'atr': aligned(atr, 14),
+        'boll_upper': aligned(bands['upper'], 19),
+        'boll_middle': aligned(bands['middle'], 19),
+        'boll_lower': aligned(bands['lower'], 19),
+        'boll_width': aligned(bands['width'], 19),
+    }
+
+    history = []
+    for i in range(MIN_CANDLES - 1, n):
+        values = {}
+        for field in INDICATOR_FIELDS:
+            value = columns[field][i]
+            values[field] = None if np.isnan(value) else float(value)
+        history.append((int(open_time[i]), values))
+    return history
+
+
+def _load_klines(db, symbol, interval):
+    return db.execute('''
+        SELECT open_time, open, high, low, close FROM klines
+        WHERE symbol = ? AND interval = ?
+        ORDER BY open_time
+    ''', (symbol, interval)).fetchall()
+
+
+def _history_rows(symbol, interval, klines, after=None):
+    return [
+        make_row(symbol, interval, open_time, values)
+        for open_time, values in compute_history(klines)
+        if after is None or open_time > after
+    ]
+
+
+def missing_rows(db, symbol, interval):
+    """
+    指标表中缺失的部分（最后一条指标之后的已入库K线），返回待写入的参数列表
+    向前多取 WARMUP_CANDLES 根K线预热，读取量只与缺口大小有关、与历史总长度无关
+    """
+    last = db.execute(
+        'SELECT MAX(open_time) FROM indicators WHERE symbol = ? AND interval = ?', (symbol, interval)
+    ).fetchone()[0]
+    if last is None:
+        return _history_rows(symbol, interval, _load_klines(db, symbol, interval))
+
+    recent = db.execute('''
+        SELECT open_time, open, high, low, close FROM klines
+        WHERE symbol = ? AND interval = ? AND open_time > ?
+        ORDER BY open_time
+    ''', (symbol, interval, last)).fetchall()
+    if not recent:
+        return []
+    warmup = db.execute('''
+        SELECT open_time, open, high, low, close FROM klines
+        WHERE symbol = ? AND interval = ? AND open_time <= ?
+        ORDER BY open_time DESC LIMIT ?
+    ''', (symbol, interval, last, WARMUP_CANDLES)).fetchall()
+    return _history_rows(symbol, interval, warmup[::-1] + recent, after=last)
+
+
+def backfill(db, symbol, interval, batch_size=5000):
+    """用库中全部K线重算并写入该交易对/周期的指标历史，返回写入行数"""
+    rows = _history_rows(symbol, interval, _load_klines(db, symbol, interval))
+    for start in range(0, len(rows), batch_size):
+        with db:
+            db.executemany(INDICATOR_UPSERT_SQL, rows[start:start + batch_size])
+    return len(rows)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'indicators'))
+    from migrations import migrate
+
+    args = sys.argv[1:]
+    options = {}
+    for name in ('--symbol', '--interval'):
+        if name in args:
+            idx = args.index(name)
+            options[name] = args[idx + 1]
+            del args[idx:idx + 2]
+    path = args[0] if args else DB_PATH
+
+    db = connect(path)
+    db.execute(CREATE_TABLE_SQL)
+    db.commit()
+    migrate(db)
+
+    pairs = db.execute('''
+        SELECT DISTINCT symbol, interval FROM klines
+        WHERE symbol IS NOT NULL AND interval IS NOT NULL
+    ''').fetchall()
+    for symbol, interval in pairs:
+        if options.get('--symbol', symbol) != symbol or options.get('--interval', interval) != interval:
+            continue
+        count = backfill(db, symbol, interval)
+        print(f"  ✅ {symbol.upper()} {interval}: {count} 条指标")
+    db.close()
+    print("✅ 指标回补完成")
@@ -0,0 +1,128 @@
+"""
+数据库迁移 - 为热点查询建立复合索引，为K线建立唯一键，把订单簿旧JSON行转换为二进制列，
+为原地更新的表建立变更序号（见 replication）；各采集器在 init_database 之后调用 migrate()，也可以单独运行: python migrations.py [数据库路径]
+"""
+import sys
+
+from compact_klines import compact_klines
+from database import DB_PATH, connect
+from orderbook_codec import convert_legacy_rows, ensure_columns
+from replication import ensure_change_tracking
+
+# 表 -> [(索引名, 索引列)]
+INDEXES = {
+    'trades': [('idx_trades_symbol_time', 'symbol, timestamp')],
+    'orderbook': [('idx_orderbook_symbol_time', 'symbol, timestamp')],
+    'ticker_24h': [('idx_ticker_24h_symbol_time', 'symbol, timestamp')],
+    'open_interest': [('idx_open_interest_symbol_time', 'symbol, timestamp')],
+    'funding_rate': [('idx_funding_rate_symbol_time', 'symbol, timestamp')],
+    'long_short_ratio': [('idx_long_short_ratio_symbol_time', 'symbol, timestamp')],
+    'top_trader_position': [('idx_top_trader_position_symbol_time', 'symbol, timestamp')],
+}
+
+# 唯一索引：建立前需要先清理已有的重复数据
+UNIQUE_INDEXES = {
+    'klines': [('uq_klines_symbol_interval_open_time', 'symbol, interval, open_time')],
+    'indicators': [('uq_indicators_symbol_interval_open_time', 'symbol, interval, open_time')],
+    'trades_1m': [('uq_trades_1m_symbol_open_time', 'symbol, open_time')],
+    'trades_1s': [('uq_trades_1s_symbol_open_time', 'symbol, open_time')],
+    'trade_bars': [('uq_trade_bars_symbol_type_open_time', 'symbol, bar_type, open_time, first_trade_id')],
+}
+
+# 已被唯一索引取代的旧索引
+OBSOLETE_INDEXES = ['idx_klines_symbol_interval_time']
+
+
+def _existing_tables(db):
+    return {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+
+def _index_exists(db, name):
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (name,)
+    ).fetchone() is not None
+
+
+def create_tables(db, tables):
+    """
+    tables: {表名: 建表SQL}；建表和这些表的唯一索引在同一个事务里提交
+    upsert 语句（ON CONFLICT）在没有唯一键的表结构上准备会失败，而 SQLite 不会因此重新加载表结构，
+    所以其他连接（写线程、其他采集进程）不能看到还没建唯一索引的新表
+    """
+    db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        for table, sql in tables.items():
+            db.execute(sql)
+            for name, columns in UNIQUE_INDEXES.get(table, []):
+                db.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def ensure_indexes(db):
+    """
+    为已存在的表创建缺失的索引（表可能由不同的采集器创建，所以每次启动都检查）
+    多个采集器同时启动时可能同时迁移，建索引都带 IF NOT EXISTS
+    """
+    tables = _existing_tables(db)
+    created = []
+    for table, indexes in INDEXES.items():
+        if table not in tables:
+            continue
+        for name, columns in indexes:
+            if not _index_exists(db, name):
+                db.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+                created.append(name)
+    db.commit()
+    return created
+
+
+def ensure_unique_indexes(db):
+    """创建唯一索引；旧库中已有重复K线时先原地去重"""
+    tables = _existing_tables(db)
+    created = []
+    for table, indexes in UNIQUE_INDEXES.items():
+        if table not in tables:
+            continue
+        for name, columns in indexes:
+            if _index_exists(db, name):
+                continue
+            if table == 'klines':
+                removed = compact_klines(db, verbose=False)
+                if removed:
+                    print(f"🧹 Removed {removed} duplicate klines")
+            db.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+            created.append(name)
+
+    for name in OBSOLETE_INDEXES:
+        db.execute(f'DROP INDEX IF EXISTS {name}')
+    db.commit()
+    return created
+
+
+def migrate(db):
+    """执行全部迁移，返回本次新建的索引名"""
+    created = ensure_indexes(db) + ensure_unique_indexes(db)
+    for name in created:
+        print(f"✅ Index created: {name}")
+
+    for name in ensure_columns(db):
+        print(f"✅ Column added: orderbook.{name}")
+    for table in ensure_change_tracking(db):
+        print(f"✅ Column added: {table}.change_seq")
+    converted = convert_legacy_rows(db)
+    if converted:
+        print(f"✅ Orderbook rows converted to binary: {converted}")
+    return created
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    print(f"🔧 Migrating {path} ...")
+    db = connect(path)
+    migrate(db)
+    db.close()
+    print("✅ Migration complete")
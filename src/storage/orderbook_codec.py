@@ -0,0 +1,149 @@
+"""
+订单簿二进制存储 - 档位打包成 float64 数组存 BLOB
+每档两个 float64（价格, 数量）交替排列，固定小端字节序；20档一侧 320 字节，
+读取时不需要解析JSON、也不需要把字符串价格转换成浮点数。
+买卖总量和失衡度在写入时算好，单独存列，只看买卖比的查询连BLOB都不用读。
+"""
+import json
+import sys
+from array import array
+
+from database import DB_PATH, connect
+
+# 旧的JSON行转换进度索引：存在说明还有未转换的旧行
+LEGACY_INDEX = 'idx_orderbook_legacy_json'
+
+NEW_COLUMNS = [
+    ('bids_blob', 'BLOB'),
+    ('asks_blob', 'BLOB'),
+    ('bid_total', 'REAL'),
+    ('ask_total', 'REAL'),
+    ('imbalance', 'REAL'),
+]
+
+
+def pack_levels(levels):
+    """[[价格, 数量], ...] -> bytes"""
+    values = array('d', (float(x) for level in levels for x in level[:2]))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_levels(blob):
+    """bytes -> [[价格, 数量], ...]"""
+    if not blob:
+        return []
+    values = array('d')
+    values.frombytes(blob)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return [[values[i], values[i + 1]] for i in range(0, len(values), 2)]
+
+
+def encode(bids, asks):
+    """
+    编码一条订单簿快照
+    返回 (bids_blob, asks_blob, bid_total, ask_total, imbalance)
+    """
+    bid_total = sum(float(level[1]) for level in bids)
+    ask_total = sum(float(level[1]) for level in asks)
+    total = bid_total + ask_total
+    imbalance = (bid_total - ask_total) / total if total > 0 else 0.0
+    return pack_levels(bids), pack_levels(asks), bid_total, ask_total, imbalance
+
+
+def decode_row(row):
+    """把查询结果（dict）中的BLOB列还原为 bids/asks 列表，便于JSON输出"""
+    row = dict(row)
+    if 'bids_blob' in row:
+        blob = row.pop('bids_blob')
+        if blob is not None:
+            row['bids'] = unpack_levels(blob)
+    if 'asks_blob' in row:
+        blob = row.pop('asks_blob')
+        if blob is not None:
+            row['asks'] = unpack_levels(blob)
+    return row
+
+
+def _columns(db):
+    return {row[1] for row in db.execute('PRAGMA table_info(orderbook)')}
+
+
+def ensure_columns(db):
+    """为旧表补齐二进制列；旧表里已有JSON行时建立转换进度索引，返回新增的列名"""
+    existing = _columns(db)
+    if not existing:
+        return []
+
+    added = []
+    for name, col_type in NEW_COLUMNS:
+        if name not in existing:
+            db.execute(f'ALTER TABLE orderbook ADD COLUMN {name} {col_type}')
+            added.append(name)
+
+    # 部分索引只包含还没转换的行，转换完成后删除，之后启动不再扫描整张表
+    if added and db.execute('SELECT 1 FROM orderbook LIMIT 1').fetchone():
+        db.execute(f'CREATE INDEX IF NOT EXISTS {LEGACY_INDEX} ON orderbook (id) WHERE bids IS NOT NULL')
+    db.commit()
+    return added
+
+
+def convert_legacy_rows(db, batch_size=5000, verbose=True):
+    """
+    把旧的JSON行分批转换为二进制列（每批一个事务），转换后清空JSON文本
+    返回转换的行数；无法解析的行只清空JSON，汇总列保持 NULL
+    """
+    if not db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (LEGACY_INDEX,)
+    ).fetchone():
+        return 0
+
+    converted = 0
+    broken = 0
+    last_id = -1
+    while True:
+        rows = db.execute(f'''
+            SELECT id, bids, asks FROM orderbook INDEXED BY {LEGACY_INDEX}
+            WHERE bids IS NOT NULL AND id > ?
+            ORDER BY id LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, bids, asks in rows:
+            try:
+                updates.append(encode(json.loads(bids), json.loads(asks or '[]')) + (row_id,))
+            except (TypeError, ValueError, IndexError):
+                updates.append((None, None, None, None, None, row_id))
+                broken += 1
+
+        with db:
+            db.executemany('''
+                UPDATE orderbook
+                SET bids_blob = ?, asks_blob = ?, bid_total = ?, ask_total = ?, imbalance = ?,
+                    bids = NULL, asks = NULL
+                WHERE id = ?
+            ''', updates)
+        converted += len(updates)
+        last_id = rows[-1][0]
+        if verbose:
+            print(f"  🔄 Orderbook rows converted: {converted}")
+
+    db.execute(f'DROP INDEX IF EXISTS {LEGACY_INDEX}')
+    db.commit()
+    if verbose and broken:
+        print(f"  ⚠️ {broken} orderbook rows had unreadable JSON")
+    return converted
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    print(f"🔧 Converting JSON orderbook rows in {path} ...")
+    db = connect(path)
+    ensure_columns(db)
+    total = convert_legacy_rows(db)
+    db.close()
+    print(f"✅ Converted {total} rows (run VACUUM to reclaim space)")
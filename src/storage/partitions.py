@@ -0,0 +1,224 @@
+"""
+按时间分区的原始数据存储 - 每个交易对每天一个 SQLite 文件: <根目录>/<表>/<交易对>/<YYYY-MM-DD>.db（UTC）
+写入按每行的时间戳路由到对应日期的分区；读取先按文件名裁剪出与时间范围相交的分区，再在分区内走 timestamp 索引；
+删除或归档一整天的数据只是删除/移动一个文件，不需要 DELETE + VACUUM。
+主库只保留最近的热数据（所有读取方照常查询），超过保留期的行由 rollup_job 移入分区。
+
+用法: python partitions.py <分区目录> list|drop|archive [表] [交易对] [--before YYYY-MM-DD] [--archive-dir DIR]
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from database import connect, connect_reader
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# 表 -> [(列名, 类型)]；每个文件只有一个交易对，不需要 symbol 列；id 保留主库中的原始 id
+TABLES = {
+    'trades': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('timestamp', 'INTEGER'),
+        ('price', 'REAL'),
+        ('quantity', 'REAL'),
+        ('is_buyer_maker', 'INTEGER'),
+        ('trade_id', 'INTEGER'),
+    ],
+    'orderbook': [
+        ('id', 'INTEGER PRIMARY KEY'),
+        ('timestamp', 'INTEGER'),
+        ('bids_blob', 'BLOB'),
+        ('asks_blob', 'BLOB'),
+        ('bid_total', 'REAL'),
+        ('ask_total', 'REAL'),
+        ('imbalance', 'REAL'),
+    ],
+}
+
+MAX_OPEN = 32       # 同时打开的分区连接数上限
+
+
+def columns(table):
+    return [name for name, _ in TABLES[table]]
+
+
+def day_of(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def day_start(day):
+    return int(datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class PartitionStore:
+    """分区的路由、读取和整体删除/归档（可跨线程共享，连接按 LRU 缓存）"""
+
+    def __init__(self, root, max_open=MAX_OPEN):
+        self.root = root
+        self.max_open = max_open
+        self._conns = OrderedDict()
+        self._lock = threading.RLock()
+
+    def path(self, table, symbol, day):
+        return os.path.join(self.root, table, symbol.lower(), f'{day}.db')
+
+    def symbols(self, table):
+        directory = os.path.join(self.root, table)
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+    def partitions(self, table, symbol, start_ms=None, end_ms=None):
+        """与 [start_ms, end_ms) 相交的分区 [(日期, 路径), ...]，按日期排序（只看文件名，不打开文件）"""
+        directory = os.path.join(self.root, table, symbol.lower())
+        if not os.path.isdir(directory):
+            return []
+        first = day_of(start_ms) if start_ms is not None else None
+        last = day_of(end_ms - 1) if end_ms is not None else None
+        result = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.db'):
+                continue
+            day = name[:-3]
+            if (first and day < first) or (last and day > last):
+                continue
+            result.append((day, os.path.join(directory, name)))
+        return result
+
+    def _connect(self, table, symbol, day):
+        """写入用的连接（不存在时建文件和表）"""
+        key = (table, symbol.lower(), day)
+        db = self._conns.get(key)
+        if db is not None:
+            self._conns.move_to_end(key)
+            return db
+        path = self.path(table, symbol, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = connect(path, check_same_thread=False)
+        schema = ', '.join(f'{name} {col_type}' for name, col_type in TABLES[table])
+        db.execute(f'CREATE TABLE IF NOT EXISTS {table} ({schema})')
+        db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table} (timestamp)')
+        db.commit()
+        self._conns[key] = db
+        while len(self._conns) > self.max_open:
+            self._conns.popitem(last=False)[1].close()
+        return db
+
+    def insert(self, table, symbol, rows):
+        """
+        按时间戳把行写入对应日期的分区（每个分区一个事务），行格式同 columns(table)
+        id 相同的行覆盖写，同一批数据重复写入结果不变；返回写入的行数
+        """
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(day_of(row[1]), []).append(row)
+        names = columns(table)
+        sql = f'INSERT OR REPLACE INTO {table} ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})'
+        with self._lock:
+            for day, day_rows in by_day.items():
+                db = self._connect(table, symbol, day)
+                with db:
+                    db.executemany(sql, day_rows)
+        return sum(len(day_rows) for day_rows in by_day.values())
+
+    def query(self, table, symbol, start_ms, end_ms, fields=None, hot_db=None):
+        """
+        按时间顺序逐行返回 [start_ms, end_ms) 内的数据，只打开相交的分区
+        hot_db: 主库连接；传入时分区之后再接上主库中尚未移入分区的行
+        """
+        fields = fields or columns(table)
+        sql = f'''
+            SELECT {', '.join(fields)} FROM {table}
+            WHERE timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp
+        '''
+        for _, path in self.partitions(table, symbol, start_ms, end_ms):
+            # 读取用独立的只读连接，不占用（也不会被淘汰掉）写入缓存的连接
+            db = connect_reader(path)
+            try:
+                yield from db.execute(sql, (start_ms, end_ms))
+            finally:
+                db.close()
+        if hot_db is not None:
+            yield from hot_db.execute(f'''
+                SELECT {', '.join(fields)} FROM {table}
+                WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp
+            ''', (symbol.lower(), start_ms, end_ms))
+
+    def _release(self, table, symbol, day):
+        """关闭连接并把 WAL 合并回主文件，之后可以直接删除/移动文件"""
+        with self._lock:
+            db = self._conns.pop((table, symbol.lower(), day), None)
+            if db is None and os.path.exists(self.path(table, symbol, day)):
+                db = connect(self.path(table, symbol, day))
+            if db is not None:
+                db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                db.execute('PRAGMA journal_mode=DELETE')
+                db.close()
+
+    def drop(self, table, symbol, before_ms):
+        """删除 before_ms 之前的整天分区，返回删除的日期"""
+        dropped = []
+        for day, path in self.partitions(table, symbol, end_ms=before_ms):
+            if day_start(day) + DAY_MS > before_ms:
+                continue
+            self._release(table, symbol, day)
+            os.remove(path)
+            dropped.append(day)
+        return dropped
+
+    def archive(self, table, symbol, before_ms, archive_dir):
+        """把 before_ms 之前的整天分区移动到归档目录（同一文件系统内只是改名），返回归档的日期"""
+        archived = []
+        for day, path in self.partitions(table, symbol, end_ms=before_ms):
+            if day_start(day) + DAY_MS > before_ms:
+                continue
+            self._release(table, symbol, day)
+            target = os.path.join(archive_dir, table, symbol.lower(), f'{day}.db')
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            archived.append(day)
+        return archived
+
+    def close(self):
+        with self._lock:
+            for db in self._conns.values():
+                db.close()
+            self._conns.clear()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    before = archive_dir = None
+    if '--before' in args:
+        idx = args.index('--before')
+        before = day_start(args[idx + 1])
+        del args[idx:idx + 2]
+    if '--archive-dir' in args:
+        idx = args.index('--archive-dir')
+        archive_dir = args[idx + 1]
+        del args[idx:idx + 2]
+    if len(args) < 2 or args[1] not in ('list', 'drop', 'archive'):
+        print("用法: python partitions.py <分区目录> list|drop|archive [表] [交易对] "
+              "[--before YYYY-MM-DD] [--archive-dir DIR]")
+        sys.exit(1)
+
+    store = PartitionStore(args[0])
+    command = args[1]
+    tables = [args[2]] if len(args) > 2 else list(TABLES)
+    for table in tables:
+        for symbol in ([args[3]] if len(args) > 3 else store.symbols(table)):
+            if command == 'list':
+                for day, path in store.partitions(table, symbol):
+                    print(f"  {table:9s} {symbol:10s} {day}  {os.path.getsize(path) / 1024 / 1024:8.1f} MB")
+            elif before is None:
+                print("❌ drop/archive 需要 --before YYYY-MM-DD")
+                sys.exit(1)
+            elif command == 'drop':
+                for day in store.drop(table, symbol, before):
+                    print(f"🗑️ Dropped {table}/{symbol}/{day}")
+            else:
+                for day in store.archive(table, symbol, before, archive_dir or 'archive'):
+                    print(f"📦 Archived {table}/{symbol}/{day}")
+    store.close()
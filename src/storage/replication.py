@@ -0,0 +1,222 @@
+"""
+增量复制 - 云端按表返回高水位之后的新行，本地节点批量写入自己的 SQLite
+只追加的表按 id 复制（id 单调递增）；原地更新的表（K线、指标、分钟汇总）按变更序号 change_seq 复制：
+触发器在每次插入/更新时把该行的 change_seq 设为表内最大值 + 1，所以原地更新的未收盘K线、
+事后补采的旧K线（open_time 比已同步的更早）都会排在高水位之后被取到。
+批次格式: {'columns': [...], 'rows': [[...], ...], 'next': 续传位置或 None}，BLOB 列为 base64。
+"""
+import base64
+import sqlite3
+
+# 只追加的表：按 id 复制
+ID_TABLES = ['trades', 'orderbook', 'ticker_24h', 'open_interest', 'funding_rate', 'long_short_ratio',
+             'top_trader_position']
+
+# 原地更新的表：按变更序号复制（列和触发器由 migrations 调用 ensure_change_tracking 建立）
+SEQ_TABLES = ['klines', 'indicators', 'trades_1m']
+SEQ_COLUMN = 'change_seq'
+
+BATCH_SIZE = 50000
+MAX_BATCH_SIZE = 200000
+
+ID_CHANGES_SQL = 'SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?'
+SEQ_CHANGES_SQL = f'SELECT * FROM {{table}} WHERE {SEQ_COLUMN} > ? ORDER BY {SEQ_COLUMN} LIMIT ?'
+
+# 新序号取表内最大值 + 1（走 change_seq 索引）；更新触发器只在序号没变时执行，自身的 UPDATE 不会再次触发
+_NEXT_SEQ = f'UPDATE {{table}} SET {SEQ_COLUMN} = (SELECT IFNULL(MAX({SEQ_COLUMN}), 0) + 1 FROM {{table}}) WHERE id = NEW.id'
+TRIGGERS_SQL = [
+    f'''CREATE TRIGGER IF NOT EXISTS {{table}}_{SEQ_COLUMN}_insert AFTER INSERT ON {{table}}
+    BEGIN {_NEXT_SEQ}; END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {{table}}_{SEQ_COLUMN}_update AFTER UPDATE ON {{table}}
+    WHEN NEW.{SEQ_COLUMN} IS OLD.{SEQ_COLUMN}
+    BEGIN {_NEXT_SEQ}; END''',
+]
+
+STATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        table_name TEXT PRIMARY KEY,
+        value INTEGER
+    )
+'''
+
+
+def _columns(db, table):
+    return [row[1] for row in db.execute(f'PRAGMA table_info({table})')]
+
+
+def _add_seq_column(db, table):
+    """
+    在一个写事务（BEGIN IMMEDIATE）里重新检查并加列：多个采集器同时启动迁移时只有一个进程加列，
+    其余进程拿到写锁后看到列已存在，不会因 duplicate column 失败；返回是否由本进程加列
+    """
+    db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        if SEQ_COLUMN in _columns(db, table):
+            db.rollback()
+            return False
+        db.execute(f'ALTER TABLE {table} ADD COLUMN {SEQ_COLUMN} INTEGER')
+        db.execute(f'UPDATE {table} SET {SEQ_COLUMN} = id')
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return True
+
+
+def ensure_change_tracking(db):
+    """为原地更新的表补齐 change_seq 列（已有行按 id 编号）、索引和触发器，返回新增列的表名"""
+    added = []
+    for table in SEQ_TABLES:
+        columns = _columns(db, table)
+        if not columns:
+            continue
+        if SEQ_COLUMN not in columns and _add_seq_column(db, table):
+            added.append(table)
+        db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{SEQ_COLUMN} ON {table} ({SEQ_COLUMN})')
+        for sql in TRIGGERS_SQL:
+            db.execute(sql.format(table=table))
+    db.commit()
+    return added
+
+
+def _existing(db):
+    return {row[0]: row[1] for row in db.execute("SELECT name, sql FROM sqlite_master WHERE type='table'")}
+
+
+def tables_info(db):
+    """可复制的表: [{'table', 'mode', 'schema', 'indexes', 'high_water'}, ...]"""
+    existing = _existing(db)
+    info = []
+    for table in ID_TABLES + SEQ_TABLES:
+        if table not in existing:
+            continue
+        if table in SEQ_TABLES:
+            # 还没迁移（没有 change_seq）的表暂不提供复制
+            if SEQ_COLUMN not in _columns(db, table):
+                continue
+            mode, column = 'seq', SEQ_COLUMN
+        else:
+            mode, column = 'id', 'id'
+        indexes = [row[0] for row in db.execute(
+            "SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql LIKE 'CREATE UNIQUE%'", (table,))]
+        info.append({
+            'table': table,
+            'mode': mode,
+            'schema': existing[table],
+            'indexes': indexes,
+            'high_water': db.execute(f'SELECT MAX({column}) FROM {table}').fetchone()[0],
+        })
+    return info
+
+
+def changes(db, table, after=None, limit=BATCH_SIZE):
+    """
+    一批变化的行
+    after: 上次的最大 id（id 表）或最大 change_seq（原地更新的表），第一批传 None
+    """
+    limit = max(1, min(int(limit), MAX_BATCH_SIZE))
+    if table not in _existing(db):
+        raise ValueError('Invalid table name')
+    if table in SEQ_TABLES:
+        sql = SEQ_CHANGES_SQL
+    elif table in ID_TABLES:
+        sql = ID_CHANGES_SQL
+    else:
+        raise ValueError('Invalid table name')
+    try:
+        after = int(after) if after is not None else -1
+    except (TypeError, ValueError):
+        raise ValueError('Invalid after')
+    cursor = db.execute(sql.format(table=table), (after, limit))
+
+    columns = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+    blob_columns = sorted({i for row in rows for i, value in enumerate(row) if isinstance(value, bytes)})
+    if blob_columns:
+        rows = [[base64.b64encode(v).decode() if isinstance(v, bytes) else v for v in row] for row in rows]
+    else:
+        rows = [list(row) for row in rows]
+
+    nxt = None
+    if len(rows) == limit:
+        nxt = rows[-1][columns.index(_position_column(table))]
+    return {'table': table, 'columns': columns, 'blob_columns': blob_columns, 'rows': rows, 'next': nxt}
+
+
+def _position_column(table):
+    return SEQ_COLUMN if table in SEQ_TABLES else 'id'
+
+
+def high_water(batch):
+    """批次推进到的水位（id 表为最大 id，原地更新的表为最大 change_seq），空批次返回 None"""
+    if not batch['rows']:
+        return None
+    column = batch['columns'].index(_position_column(batch['table']))
+    return max(row[column] for row in batch['rows'])
+
+
+def prepare_local(db, info):
+    """在本地库建出与云端相同的表和唯一索引（已存在则跳过，云端新增的列补到本地表上）"""
+    db.execute(STATE_TABLE_SQL)
+    for item in info:
+        db.execute(item['schema'].replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+        local_columns = set(_columns(db, item['table']))
+        schema = sqlite3.connect(':memory:')
+        schema.execute(item['schema'])
+        for row in schema.execute(f"PRAGMA table_info({item['table']})"):
+            if row[1] not in local_columns:
+                db.execute(f"ALTER TABLE {item['table']} ADD COLUMN {row[1]} {row[2]}")
+        schema.close()
+        for sql in item['indexes']:
+            db.execute(sql.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX IF NOT EXISTS', 1))
+    db.commit()
+
+
+def apply(db, batch):
+    """把一批行写入本地库（一个事务，按 id/唯一键覆盖），返回行数"""
+    rows = batch['rows']
+    if not rows:
+        return 0
+    blob_columns = batch.get('blob_columns') or []
+    if blob_columns:
+        rows = [[base64.b64decode(v) if i in blob_columns and v is not None else v for i, v in enumerate(row)]
+                for row in rows]
+    columns = batch['columns']
+    with db:
+        db.executemany(f'''
+            INSERT OR REPLACE INTO {batch['table']} ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', rows)
+    return len(rows)
+
+
+def _state_key(table):
+    # 原地更新的表以前按 open_time 记录水位，换成 change_seq 后用新的键，旧水位不会被误当作序号
+    return f'{table}.{SEQ_COLUMN}' if table in SEQ_TABLES else table
+
+
+def load_state(db):
+    return dict(db.execute('SELECT table_name, value FROM sync_state'))
+
+
+def save_state(db, table, value):
+    with db:
+        db.execute('''
+            INSERT INTO sync_state (table_name, value) VALUES (?, ?)
+            ON CONFLICT(table_name) DO UPDATE SET value = excluded.value
+        ''', (_state_key(table), value))
+
+
+def start_position(table, state):
+    """本次同步的起点：上次同步到的最大 id / change_seq（第一次同步为 None）"""
+    return state.get(_state_key(table))
+
+
+def advance(db, state, table, batch):
+    """一批写入本地之后推进并保存该表的水位"""
+    value = high_water(batch)
+    key = _state_key(table)
+    if value is not None and (state.get(key) is None or value > state[key]):
+        state[key] = value
+        save_state(db, table, value)
@@ -0,0 +1,302 @@
+"""
+成交汇总与归档后台任务 - 原始成交汇总进 trades_1s / trades_1m，超过保留期的原始数据移出主库后分批删除
+按交易对在 rollup_state 表记录水位，每轮只处理水位之后已经结束的整分钟；汇总行覆盖写，重复执行结果相同，
+中途退出后从水位继续。读库用只读连接，汇总行、水位和删除都交给共享的 BatchWriter，不与采集写线程争写锁。
+超过保留期的数据去向：
+  配置了分区目录时，成交和订单簿移入按天分区的 SQLite 文件（见 partitions），之后可整天删除/归档；
+  否则成交压缩归档为 <归档目录>/trades/<交易对>/<YYYY-MM-DD>/<HH>.csv.gz（UTC，每小时一个文件）。
+trades_1s 与原始成交一起过期删除，trades_1m 长期保留。
+归档删除需要显式开启（--retention-days）：默认只汇总、不删除主库中的原始数据；
+容器部署时归档目录/分区目录要放在持久卷上，否则重新部署后归档就丢了。
+
+用法: python rollup_job.py [数据库路径] [--retention-days N] [--archive-dir DIR] [--partitions DIR]
+                          [--interval 秒] [--once]
+"""
+import csv
+import gzip
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from database import DB_PATH, connect, connect_reader
+from db_writer import get_writer
+from migrations import create_tables
+from partitions import PartitionStore, columns
+from trade_rollup import (MINUTE_MS, MINUTE_UPSERT_SQL, SECOND_MS, SECOND_UPSERT_SQL, SECONDS_TABLE_SQL,
+                          SYMBOLS_SQL, CREATE_TABLE_SQL as MINUTES_TABLE_SQL, bucket_rows)
+
+HOUR_MS = 60 * MINUTE_MS
+
+RETENTION_DAYS = None       # 原始成交保留天数，更早的归档后删除；None 表示全部保留、只汇总
+ARCHIVE_DIR = 'archive'
+RUN_INTERVAL = 60           # 每轮间隔（秒）
+SETTLE_MS = 5000            # 只汇总 5 秒之前已结束的分钟，给迟到的成交留出写入时间
+DELETE_BATCH = 5000         # 每次删除的行数（每批单独提交，写锁只占用很短时间）
+
+ARCHIVE_FIELDS = columns('trades')
+
+STATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER
+    )
+'''
+
+STATE_UPSERT_SQL = '''
+    INSERT INTO rollup_state (name, value) VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET value = excluded.value
+'''
+
+RANGE_SQL = '''
+    SELECT timestamp, price, quantity, is_buyer_maker FROM trades
+    WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp
+'''
+
+# 表 -> 移出主库的行（列顺序同分区表）
+MOVE_SQL = {table: f'''
+    SELECT {', '.join(columns(table))} FROM {table}
+    WHERE symbol = ? AND timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp
+''' for table in ('trades', 'orderbook')}
+
+DELETE_SQL = {table: f'''
+    DELETE FROM {table} WHERE id IN (
+        SELECT id FROM {table} WHERE symbol = ? AND timestamp >= ? AND timestamp < ? LIMIT {DELETE_BATCH}
+    )
+''' for table in ('trades', 'orderbook')}
+
+ARCHIVE_SQL = MOVE_SQL['trades']
+DELETE_TRADES_SQL = DELETE_SQL['trades']
+
+DELETE_SECONDS_SQL = '''
+    DELETE FROM trades_1s WHERE symbol = ? AND open_time >= ? AND open_time < ?
+'''
+
+
+def init_tables(db_path=DB_PATH):
+    """建表和唯一索引（启动时执行一次，同一个事务提交）"""
+    db = connect(db_path)
+    create_tables(db, {'trades_1s': SECONDS_TABLE_SQL, 'trades_1m': MINUTES_TABLE_SQL,
+                       'rollup_state': STATE_TABLE_SQL})
+    db.close()
+
+
+def archive_path(archive_dir, symbol, hour_ms):
+    hour = datetime.fromtimestamp(hour_ms / 1000, tz=timezone.utc)
+    return os.path.join(archive_dir, 'trades', symbol, hour.strftime('%Y-%m-%d'), hour.strftime('%H') + '.csv.gz')
+
+
+def read_archive(path):
+    """读取归档文件，返回 ARCHIVE_FIELDS 顺序的行"""
+    with gzip.open(path, 'rt', newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [(int(r[0]), int(r[1]), float(r[2]), float(r[3]), int(r[4]),
+                 int(r[5]) if r[5] else None) for r in reader]
+
+
+class TradeRollupJob:
+    """后台汇总/归档任务，一个数据库只需要一个实例（多币种采集器或单独进程里运行）"""
+
+    def __init__(self, db_path=DB_PATH, retention_days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR,
+                 interval=RUN_INTERVAL, writer=None, partitions=None):
+        """
+        retention_days: 原始数据保留天数（None 表示只汇总、不归档删除）
+        archive_dir: 归档目录（没有配置分区时使用）
+        partitions: PartitionStore；配置后成交和订单簿移入按天分区，而不是写 csv.gz
+        interval: 每轮间隔（秒）
+        writer: 写入器（None 时使用该库共享的写线程）
+        """
+        self.db_path = db_path
+        self.retention_ms = int(retention_days * 86400 * 1000) if retention_days is not None else None
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.writer = writer or get_writer(db_path)
+        self.partitions = partitions
+        self._stop = threading.Event()
+        self._thread = None
+        self.rows_rolled = 0
+        self.rows_archived = 0
+        init_tables(db_path)
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Trade-Rollup")
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        db = connect_reader(self.db_path)
+        while not self._stop.is_set():
+            try:
+                self.run_once(db)
+            except Exception as e:
+                print(f"❌ Trade rollup error: {e}")
+            self._stop.wait(self.interval)
+        db.close()
+
+    def run_once(self, db, now_ms=None):
+        """执行一轮：先汇总，汇总写完后再归档，返回 (汇总的成交数, 归档的成交数)"""
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        state = dict(db.execute('SELECT name, value FROM rollup_state'))
+        rolled = archived = 0
+        for symbol in self._symbols(db, 'trades'):
+            rolled += self.rollup_symbol(db, symbol, state, now_ms)
+        self.writer.flush()
+        if self.retention_ms is not None:
+            # 订单簿是二进制档位，只移入分区，不写 csv
+            tables = ('trades', 'orderbook') if self.partitions is not None else ('trades',)
+            for table in tables:
+                for symbol in self._symbols(db, table):
+                    archived += self.archive_table(db, table, symbol, state, now_ms)
+
+        self.rows_rolled += rolled
+        self.rows_archived += archived
+        if rolled or archived:
+            print(f"🗜️ Trade rollup: {rolled} trades rolled up, {archived} archived")
+        return rolled, archived
+
+    def _symbols(self, db, table):
+        if not db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+            return []
+        return [row[0] for row in db.execute(SYMBOLS_SQL.format(table=table))]
+
+    def _start(self, db, table, symbol, state, key, span_ms):
+        """水位；第一次运行时从该交易对最早的一行开始"""
+        if key in state:
+            return state[key]
+        first = db.execute(f'SELECT MIN(timestamp) FROM {table} WHERE symbol = ?', (symbol,)).fetchone()[0]
+        return None if first is None else first // span_ms * span_ms
+
+    def rollup_symbol(self, db, symbol, state, now_ms):
+        """把水位之后已结束的整分钟（每次最多一小时）汇总进 trades_1s / trades_1m"""
+        key = f'rollup:{symbol}'
+        start = self._start(db, 'trades', symbol, state, key, MINUTE_MS)
+        if start is None:
+            return 0
+        upto = (now_ms - SETTLE_MS) // MINUTE_MS * MINUTE_MS
+        rolled = 0
+        while start < upto:
+            end = min(start + HOUR_MS, upto)
+            trades = db.execute(RANGE_SQL, (symbol, start, end)).fetchall()
+            # 汇总行和水位在同一个事务里提交：水位不会越过没写进去的汇总行（之后归档会删掉这段原始成交）
+            commit = self.writer.submit_atomic([
+                (SECOND_UPSERT_SQL, [(symbol,) + row for row in bucket_rows(trades, SECOND_MS)]),
+                (MINUTE_UPSERT_SQL, [(symbol,) + row for row in bucket_rows(trades, MINUTE_MS)]),
+                (STATE_UPSERT_SQL, [(key, end)]),
+            ])
+            if not commit.wait():
+                print(f"❌ Trade rollup {symbol}: rows not committed, retrying from the watermark next round")
+                break
+            state[key] = start = end
+            rolled += len(trades)
+        return rolled
+
+    def archive_table(self, db, table, symbol, state, now_ms):
+        """
+        把保留期之前的整小时数据移出主库后分批删除（成交还要求该小时已经汇总过）
+        配置了分区时写入当天的分区，按 id 覆盖写，中途退出后重复执行结果不变；
+        否则成交写入 csv.gz，文件先写临时文件再改名，文件已存在说明上次在删除途中退出，只需删完剩下的行
+        """
+        key = f'archive:{symbol}' if table == 'trades' else f'archive:{table}:{symbol}'
+        start = self._start(db, table, symbol, state, key, HOUR_MS)
+        if start is None:
+            return 0
+        cutoff = (now_ms - self.retention_ms) // HOUR_MS * HOUR_MS
+        if table == 'trades':
+            cutoff = min(cutoff, state.get(f'rollup:{symbol}', 0) // HOUR_MS * HOUR_MS)
+        archived = 0
+        while start < cutoff:
+            end = start + HOUR_MS
+            if self.partitions is not None:
+                rows = db.execute(MOVE_SQL[table], (symbol, start, end)).fetchall()
+                archived += self.partitions.insert(table, symbol, rows)
+            else:
+                path = archive_path(self.archive_dir, symbol, start)
+                if not os.path.exists(path):
+                    rows = db.execute(ARCHIVE_SQL, (symbol, start, end)).fetchall()
+                    if rows:
+                        self._write_archive(path, rows)
+                        archived += len(rows)
+            if self._delete(db, table, symbol, start, end):
+                print(f"❌ Trade archive {table} {symbol}: rows left after delete, retrying next round")
+                break
+            statements = [(STATE_UPSERT_SQL, [(key, end)])]
+            if table == 'trades':
+                statements.insert(0, (DELETE_SECONDS_SQL, [(symbol, start, end)]))
+            if not self.writer.submit_atomic(statements).wait():
+                break
+            state[key] = start = end
+        return archived
+
+    def _write_archive(self, path, rows):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with gzip.open(tmp, 'wt', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(ARCHIVE_FIELDS)
+            writer.writerows(rows)
+        os.replace(tmp, path)
+
+    def _count(self, db, table, symbol, start, end):
+        return db.execute(f'SELECT COUNT(*) FROM {table} WHERE symbol = ? AND timestamp >= ? AND timestamp < ?',
+                          (symbol, start, end)).fetchone()[0]
+
+    def _delete(self, db, table, symbol, start, end):
+        """每批删除单独提交，期间采集写入照常进行；返回删除后还剩的行数"""
+        remaining = self._count(db, table, symbol, start, end)
+        for _ in range(0, remaining, DELETE_BATCH):
+            self.writer.submit(DELETE_SQL[table], (symbol, start, end))
+            self.writer.flush()
+        return self._count(db, table, symbol, start, end) if remaining else 0
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = {'--retention-days': RETENTION_DAYS, '--archive-dir': ARCHIVE_DIR, '--partitions': None,
+               '--interval': RUN_INTERVAL}
+    for name in list(options):
+        if name in args:
+            idx = args.index(name)
+            options[name] = args[idx + 1]
+            del args[idx:idx + 2]
+    once = '--once' in args
+    if once:
+        args.remove('--once')
+    path = args[0] if args else DB_PATH
+
+    partitions = PartitionStore(options['--partitions']) if options['--partitions'] else None
+    retention_days = options['--retention-days']
+    job = TradeRollupJob(path, retention_days=float(retention_days) if retention_days is not None else None,
+                         archive_dir=options['--archive-dir'], interval=float(options['--interval']),
+                         partitions=partitions)
+    if retention_days is None:
+        print(f"🗜️ Trade rollup for {path}: rollup only, raw data is kept")
+    else:
+        target = options['--partitions'] or options['--archive-dir']
+        print(f"🗜️ Trade rollup for {path}: keep {retention_days} days raw, archive -> {target}")
+    if once:
+        reader = connect_reader(path)
+        job.run_once(reader)
+        reader.close()
+        job.writer.stop()
+    else:
+        job.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            job.stop()
+            job.writer.flush(timeout=10)
@@ -0,0 +1,272 @@
+"""
+数据库快照 - 用 SQLite 在线备份 API 生成一致的快照，再分块压缩成文件供下载
+备份在一个读事务内完成（WAL 下不阻塞采集写入），得到的是某一时刻的一致副本，而不是边写边复制的文件；
+压缩按 1MB 分块进行，内存占用与数据库大小无关。压缩后的文件落盘，HTTP 层可以直接按 Range 断点续传。
+最近生成的快照在 MAX_AGE 秒内复用，保留最近 KEEP 个，续传时可以按名字取回同一个快照。
+大库的备份和压缩要几分钟，Web 接口用 request_snapshot 在后台线程生成（同一时间只生成一个，
+多个 gunicorn worker 之间用快照目录里的 .building 标记协调），请求立即返回，客户端轮询到生成完成再下载。
+磁盘空间：生成期间同时存在未压缩的副本和压缩文件，快照目录所在磁盘需要约 2 倍数据库大小的剩余空间
+（不足时拒绝生成）；失败或进程被杀留下的临时文件在下次生成前清理。
+
+用法: python snapshot.py [数据库路径] [--dir DIR] [--compression gzip|zstd]
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from database import DB_PATH, connect_reader
+
+SNAPSHOT_DIR = 'snapshots'
+MAX_AGE = 600               # 快照复用时间（秒）
+KEEP = 2                    # 保留最近几个快照（正在续传的下载还能取到旧快照）
+CHUNK_SIZE = 1024 * 1024
+STALE_AGE = 600             # 超过这么久没有写入的临时文件/构建标记视为失败的残留
+SPACE_FACTOR = 2            # 生成快照需要的剩余空间（数据库大小的倍数）
+
+EXTENSIONS = {'gzip': '.db.gz', 'zstd': '.db.zst'}
+
+_lock = threading.Lock()
+_errors = {}                # 快照名 -> 后台生成失败的原因
+
+
+def available_compressions():
+    return ['gzip', 'zstd'] if zstandard is not None else ['gzip']
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _compress(src, dst, compression):
+    tmp = f'{dst}.{os.getpid()}.tmp'
+    try:
+        with open(src, 'rb') as f_in:
+            if compression == 'zstd':
+                with open(tmp, 'wb') as raw, zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(raw) as f_out:
+                    shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+            else:
+                with gzip.open(tmp, 'wb', compresslevel=6) as f_out:
+                    shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+        os.replace(tmp, dst)
+    finally:
+        _remove(tmp)
+
+
+def backup(db_path, target):
+    """在线备份到 target（一次完成，整个备份看到的是同一个事务快照）"""
+    tmp = f'{target}.{os.getpid()}.tmp'
+    try:
+        src = connect_reader(db_path)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst)
+            # 副本不带 WAL 标记，下载后就是一个独立的文件
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp, target)
+    finally:
+        _remove(tmp)
+        _remove(tmp + '-journal')
+
+
+def snapshots(snapshot_dir=SNAPSHOT_DIR, compression='gzip'):
+    """已有快照的文件名，从新到旧"""
+    if not os.path.isdir(snapshot_dir):
+        return []
+    ext = EXTENSIONS[compression]
+    return sorted((name for name in os.listdir(snapshot_dir) if name.endswith(ext)), reverse=True)
+
+
+def snapshot_path(name, snapshot_dir=SNAPSHOT_DIR):
+    """按名字取快照路径（名字不合法或文件不存在时返回 None）"""
+    if os.path.basename(name) != name or not any(name.endswith(ext) for ext in EXTENSIONS.values()):
+        return None
+    path = os.path.join(snapshot_dir, name)
+    return path if os.path.exists(path) else None
+
+
+def _fresh(snapshot_dir, compression, max_age):
+    existing = snapshots(snapshot_dir, compression)
+    if existing:
+        path = os.path.join(snapshot_dir, existing[0])
+        if time.time() - os.path.getmtime(path) < max_age:
+            return path
+    return None
+
+
+def _groups(snapshot_dir):
+    """快照目录里生成中的文件按快照名分组: {名字: [路径, ...]}（不含已完成的压缩快照）"""
+    groups = {}
+    for entry in os.listdir(snapshot_dir):
+        if entry.endswith(('.tmp', '.db', '.building', '-journal')):
+            groups.setdefault(entry.split('.', 1)[0], []).append(os.path.join(snapshot_dir, entry))
+    return groups
+
+
+def _last_write(paths):
+    times = []
+    for path in paths:
+        try:
+            times.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(times, default=0)
+
+
+def cleanup(snapshot_dir=SNAPSHOT_DIR):
+    """删除失败或被杀的生成过程留下的临时文件、未压缩副本和构建标记，返回删除的文件数"""
+    removed = 0
+    if not os.path.isdir(snapshot_dir):
+        return removed
+    now = time.time()
+    for paths in _groups(snapshot_dir).values():
+        # 同一个快照的文件里只要有一个还在写入，就是正在进行的生成
+        if now - _last_write(paths) > STALE_AGE:
+            for path in paths:
+                _remove(path)
+                removed += 1
+    return removed
+
+
+def building(snapshot_dir=SNAPSHOT_DIR):
+    """正在生成的快照名（任一进程），没有时返回 None"""
+    if not os.path.isdir(snapshot_dir):
+        return None
+    now = time.time()
+    for name, paths in sorted(_groups(snapshot_dir).items(), reverse=True):
+        if any(path.endswith('.building') for path in paths) and now - _last_write(paths) <= STALE_AGE:
+            return name
+    return None
+
+
+def check_space(db_path, snapshot_dir):
+    """剩余空间不足 SPACE_FACTOR 倍数据库大小时抛 RuntimeError"""
+    size = sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+    free = shutil.disk_usage(snapshot_dir).free
+    if free < size * SPACE_FACTOR:
+        raise RuntimeError(f"快照目录剩余空间不足: 需要约 {size * SPACE_FACTOR / 1024 / 1024:.0f} MB，"
+                           f"剩余 {free / 1024 / 1024:.0f} MB")
+
+
+def _new_name(snapshot_dir):
+    name = f'crypto_data_{time.strftime("%Y%m%d_%H%M%S")}'
+    marker = os.path.join(snapshot_dir, name + '.building')
+    # 独占创建标记，另一个进程同时开始生成时以先创建者为准
+    os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    return name
+
+
+def build(db_path, snapshot_dir, compression, name):
+    """生成名为 name 的快照（调用方已创建 .building 标记），失败时删除临时文件，返回压缩文件路径"""
+    raw = os.path.join(snapshot_dir, name + '.db')
+    path = os.path.join(snapshot_dir, name + EXTENSIONS[compression])
+    try:
+        backup(db_path, raw)
+        _compress(raw, path, compression)
+    finally:
+        _remove(raw)
+        _remove(os.path.join(snapshot_dir, name + '.building'))
+
+    for old in snapshots(snapshot_dir, compression)[KEEP:]:
+        _remove(os.path.join(snapshot_dir, old))
+    return path
+
+
+def _check_compression(compression):
+    if compression not in available_compressions():
+        raise ValueError(f"不支持的压缩格式: {compression}（可用: {', '.join(available_compressions())}）")
+
+
+def latest(db_path=DB_PATH, snapshot_dir=SNAPSHOT_DIR, compression='gzip', max_age=MAX_AGE):
+    """返回可下载的压缩快照路径：最近 max_age 秒内的直接复用，否则在当前线程新建一个"""
+    _check_compression(compression)
+    with _lock:
+        path = _fresh(snapshot_dir, compression, max_age)
+        if path:
+            return path
+        os.makedirs(snapshot_dir, exist_ok=True)
+        cleanup(snapshot_dir)
+        check_space(db_path, snapshot_dir)
+        return build(db_path, snapshot_dir, compression, _new_name(snapshot_dir))
+
+
+def _build_in_background(db_path, snapshot_dir, compression, name):
+    start = time.time()
+    try:
+        path = build(db_path, snapshot_dir, compression, name)
+        print(f"✅ Snapshot ready: {path} ({time.time() - start:.1f}s)")
+    except Exception as e:
+        _errors[name] = str(e)
+        print(f"❌ Snapshot {name} failed: {e}")
+
+
+def request_snapshot(db_path=DB_PATH, snapshot_dir=SNAPSHOT_DIR, compression='gzip', max_age=MAX_AGE):
+    """
+    不阻塞的 latest：有可复用的快照时返回 (路径, None)；
+    否则返回 (None, 生成中的快照名)，需要时在后台线程开始生成，调用方稍后再次请求
+    """
+    _check_compression(compression)
+    with _lock:
+        path = _fresh(snapshot_dir, compression, max_age)
+        if path:
+            return path, None
+        os.makedirs(snapshot_dir, exist_ok=True)
+        name = building(snapshot_dir)
+        if name:
+            return None, name
+        cleanup(snapshot_dir)
+        check_space(db_path, snapshot_dir)
+        try:
+            name = _new_name(snapshot_dir)
+        except FileExistsError:
+            return None, building(snapshot_dir)
+        threading.Thread(target=_build_in_background, args=(db_path, snapshot_dir, compression, name),
+                         daemon=True, name='Snapshot').start()
+        return None, name
+
+
+def last_error(name):
+    """后台生成失败的原因（本进程），没有时返回 None"""
+    return _errors.get(name)
+
+
+def decompress(src, dst, compression='gzip'):
+    """解压下载的快照（分块进行）"""
+    with open(dst, 'wb') as f_out:
+        if compression == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("解压 zstd 快照需要 zstandard: pip install zstandard")
+            with open(src, 'rb') as raw, zstandard.ZstdDecompressor().stream_reader(raw) as f_in:
+                shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+        else:
+            with gzip.open(src, 'rb') as f_in:
+                shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = {'--dir': SNAPSHOT_DIR, '--compression': 'gzip'}
+    for name in list(options):
+        if name in args:
+            idx = args.index(name)
+            options[name] = args[idx + 1]
+            del args[idx:idx + 2]
+    path = args[0] if args else DB_PATH
+
+    start = time.time()
+    result = latest(path, options['--dir'], options['--compression'], max_age=0)
+    print(f"✅ Snapshot: {result} ({os.path.getsize(result) / 1024 / 1024:.1f} MB, {time.time() - start:.1f}s)")
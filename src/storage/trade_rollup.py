@@ -0,0 +1,181 @@
+"""
+成交汇总表 - 每个交易对每分钟（trades_1m）/ 每秒（trades_1s）一行：主动买入/卖出量、笔数、成交额（VWAP = 成交额 / 成交量）
+trades_1m 由采集器在每分钟结束时写入（见 trade_flow.TradeFlow），后台任务 rollup_job 从原始成交重算并补齐两张表；
+Web界面、分析器和API查询最近N小时的买卖量时读取汇总行（1小时只有60行），不再扫描原始成交。
+"""
+import time
+
+import numpy as np
+
+# 汇总行的字段（不含 symbol），顺序即写入顺序；trades_1s 的 open_time 同样是毫秒
+MINUTE_FIELDS = ['open_time', 'buy_volume', 'sell_volume', 'buy_count', 'sell_count', 'quote_volume']
+
+SECOND_MS = 1000
+MINUTE_MS = 60 * 1000
+
+
+def _table_sql(table):
+    return f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT,
+        open_time INTEGER,
+        buy_volume REAL,
+        sell_volume REAL,
+        buy_count INTEGER,
+        sell_count INTEGER,
+        quote_volume REAL
+    )
+'''
+
+
+# 依赖 (symbol, open_time) 唯一索引（见 migrations.UNIQUE_INDEXES）
+def _upsert_sql(table):
+    return f'''
+    INSERT INTO {table} (symbol, {', '.join(MINUTE_FIELDS)})
+    VALUES (?, {', '.join('?' * len(MINUTE_FIELDS))})
+    ON CONFLICT(symbol, open_time) DO UPDATE SET
+        {', '.join(f'{field} = excluded.{field}' for field in MINUTE_FIELDS[1:])}
+'''
+
+
+CREATE_TABLE_SQL = _table_sql('trades_1m')
+MINUTE_UPSERT_SQL = _upsert_sql('trades_1m')
+SECONDS_TABLE_SQL = _table_sql('trades_1s')
+SECOND_UPSERT_SQL = _upsert_sql('trades_1s')
+
+# 表中出现过的交易对：递归 CTE 沿 symbol 开头的索引逐个跳到下一个交易对，不扫描全表
+SYMBOLS_SQL = '''
+    WITH RECURSIVE s(symbol) AS (
+        SELECT MIN(symbol) FROM {table}
+        UNION ALL
+        SELECT (SELECT MIN(symbol) FROM {table} WHERE symbol > s.symbol) FROM s WHERE s.symbol IS NOT NULL
+    )
+    SELECT symbol FROM s WHERE symbol IS NOT NULL
+'''
+
+# 原始成交按秒聚合（启动时补齐汇总表之后的部分）
+RAW_SECONDS_SQL = '''
+    SELECT timestamp / 1000 AS second,
+        SUM(CASE WHEN is_buyer_maker=0 THEN quantity ELSE 0 END),
+        SUM(CASE WHEN is_buyer_maker=1 THEN quantity ELSE 0 END),
+        SUM(CASE WHEN is_buyer_maker=0 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN is_buyer_maker=1 THEN 1 ELSE 0 END),
+        SUM(price * quantity)
+    FROM trades WHERE symbol = ? AND timestamp >= ?
+    GROUP BY second ORDER BY second
+'''
+
+# since 之后的分钟汇总（从旧到新）
+MINUTES_SQL = f'''
+    SELECT {', '.join(MINUTE_FIELDS)} FROM trades_1m
+    WHERE symbol = ? AND open_time >= ?
+    ORDER BY open_time
+'''
+
+# 窗口内的买卖量合计：汇总表部分 + 汇总表之后的原始成交；{where} 为 'symbol = ? AND ' 或空（全部交易对）
+ROLLUP_TOTALS_SQL = '''
+    SELECT SUM(buy_volume), SUM(sell_volume), SUM(buy_count + sell_count), SUM(quote_volume), MAX(open_time)
+    FROM trades_1m WHERE {where}open_time >= ?
+'''
+RAW_TOTALS_SQL = '''
+    SELECT
+        SUM(CASE WHEN is_buyer_maker=0 THEN quantity ELSE 0 END),
+        SUM(CASE WHEN is_buyer_maker=1 THEN quantity ELSE 0 END),
+        COUNT(*),
+        SUM(price * quantity)
+    FROM trades WHERE {where}timestamp >= ?
+'''
+
+
+def summarize(buy_volume, sell_volume, trades, quote_volume):
+    """买卖量汇总 -> 对外格式（与 TradeFlow.snapshot 相同）"""
+    buy_volume = buy_volume or 0.0
+    sell_volume = sell_volume or 0.0
+    volume = buy_volume + sell_volume
+    return {
+        'buy_volume': buy_volume,
+        'sell_volume': sell_volume,
+        'volume': volume,
+        'trades': int(trades or 0),
+        'vwap': (quote_volume or 0.0) / volume if volume > 0 else 0.0,
+        'buy_sell_ratio': buy_volume / sell_volume if sell_volume > 0 else 0.0,
+    }
+
+
+def bucket_rows(trades, span_ms):
+    """
+    原始成交 [(timestamp, price, quantity, is_buyer_maker), ...]（按时间排序）按 span_ms 分桶，
+    返回 MINUTE_FIELDS 顺序的汇总行（只含有成交的桶）
+    """
+    if not len(trades):
+        return []
+    data = np.asarray(trades, dtype=np.float64)
+    starts_ms = data[:, 0].astype(np.int64) // span_ms * span_ms
+    quantity = data[:, 2]
+    sells = data[:, 3] != 0
+    first = np.flatnonzero(np.r_[True, starts_ms[1:] != starts_ms[:-1]])
+    columns = (
+        np.add.reduceat(np.where(sells, 0.0, quantity), first),
+        np.add.reduceat(np.where(sells, quantity, 0.0), first),
+        np.add.reduceat((~sells).astype(np.int64), first),
+        np.add.reduceat(sells.astype(np.int64), first),
+        np.add.reduceat(data[:, 1] * quantity, first),
+    )
+    return list(zip(starts_ms[first].tolist(), *(column.tolist() for column in columns)))
+
+
+def load_minutes(db, symbol, since_ms):
+    """读取 since_ms 之后的分钟汇总（从旧到新），格式同 MINUTE_FIELDS"""
+    return db.execute(MINUTES_SQL, (symbol, since_ms)).fetchall()
+
+
+def _tables(db):
+    """库中已有的成交表（采集器或 migrations 之前创建的旧库没有 trades_1m）"""
+    return {row[0] for row in db.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('trades', 'trades_1m')")}
+
+
+def _symbol_totals(db, symbol, since, raw_since, tables=('trades', 'trades_1m')):
+    """单个交易对的 (买入量, 卖出量, 笔数, 成交额)；tables 为库中已有的成交表"""
+    where, params = ('symbol = ? AND ', [symbol]) if symbol else ('', [])
+    rollup = (None,) * 5
+    if 'trades_1m' in tables:
+        rollup = db.execute(ROLLUP_TOTALS_SQL.format(where=where), params + [since]).fetchone()
+    if rollup[4] is not None:
+        raw_since = rollup[4] + MINUTE_MS
+    if 'trades' not in tables:
+        return tuple(value or 0 for value in rollup[:4])
+
+    raw = db.execute(RAW_TOTALS_SQL.format(where=where), params + [raw_since]).fetchone()
+    return tuple((a or 0) + (b or 0) for a, b in zip(rollup[:4], raw))
+
+
+def flow_totals(db, symbol=None, window_ms=3600 * 1000, now_ms=None):
+    """
+    最近 window_ms 内的买卖量汇总（symbol 为 None 时统计全部交易对）
+    窗口起点按分钟对齐；汇总表之后尚未写入的部分（正在进行的一分钟）从原始成交补上，
+    没有汇总行的交易对（或没有 trades_1m 表的库）退回到原始成交扫描
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    since = (now_ms - window_ms) // MINUTE_MS * MINUTE_MS
+    raw_since = now_ms - window_ms
+    tables = _tables(db)
+
+    if symbol:
+        symbols = [symbol]
+    else:
+        # 按交易对分别查询，原始成交才能走 (symbol, timestamp) 索引；
+        # 交易对取原始成交和汇总表的并集（原始成交已归档的交易对只在汇总表里）
+        symbols = set()
+        for table in tables:
+            symbols.update(row[0] for row in db.execute(SYMBOLS_SQL.format(table=table)))
+        symbols = sorted(symbols)
+
+    totals = [0.0, 0.0, 0, 0.0]
+    if not tables:
+        return summarize(*totals)
+    for name in symbols:
+        for i, value in enumerate(_symbol_totals(db, name, since, raw_since, tables)):
+            totals[i] += value
+    return summarize(*totals)
@@ -1,10 +1,13 @@
 """
 多币种Web界面 - 支持BTC、ETH、BNB、SOL、BERA
 """
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 from flask_cors import CORS
-import sqlite3
 from datetime import datetime, timedelta
+from database import connect_reader
+from live_feed import SSE_HEADERS, get_hub
+from response_cache import ResponseCache
+from trade_rollup import flow_totals
 import json
 
 app = Flask(__name__)
@@ -19,9 +22,22 @@ SYMBOLS = {
     'berausdt': 'BERA'
 }
 
+# 最近10笔成交（概览、价格接口）
+RECENT_TRADES_SQL = '''
+    SELECT price, timestamp FROM trades
+    WHERE symbol = ?
+    ORDER BY timestamp DESC LIMIT 10
+'''
+# 最新成交价 / 某时刻之前的最后成交价（对比接口）
+LAST_PRICE_SQL = 'SELECT price FROM trades WHERE symbol = ? ORDER BY timestamp DESC LIMIT 1'
+PRICE_BEFORE_SQL = 'SELECT price FROM trades WHERE symbol = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT 1'
+
+# 聚合接口的响应缓存，采集进程写入新数据后按交易对失效（见 response_cache）
+cache = ResponseCache(feed=get_hub)
+
 def get_db():
     """获取数据库连接"""
-    return sqlite3.connect('crypto_data.db')
+    return connect_reader()
 
 def get_symbol_table_prefix(symbol):
     """获取交易对的表前缀"""
@@ -43,6 +59,7 @@ def get_symbols():
     return jsonify(list(SYMBOLS.keys()))
 
 @app.route('/api/overview')
+@cache.cached(ttl=2, symbols=list(SYMBOLS))
 def get_overview():
     """获取所有币种的概览"""
     try:
@@ -54,11 +71,7 @@ def get_overview():
         for symbol_key, symbol_name in SYMBOLS.items():
             try:
                 # 获取最近10笔交易的平均价格
-                recent_trades = cursor.execute(f"""
-                    SELECT price, timestamp FROM trades 
-                    WHERE symbol = ?
-                    ORDER BY timestamp DESC LIMIT 10
-                """, (symbol_key,)).fetchall()
+                recent_trades = cursor.execute(RECENT_TRADES_SQL, (symbol_key,)).fetchall()
                 
                 if recent_trades:
                     avg_price = sum([t[0] for t in recent_trades]) / len(recent_trades)
@@ -71,18 +84,11 @@ def get_overview():
                         ORDER BY timestamp DESC LIMIT 1
                     """, (symbol_key,)).fetchone()
                     
-                    # 计算1小时买卖比
-                    timestamp_1h = int((datetime.now() - timedelta(hours=1)).timestamp() * 1000)
-                    buy_sell = cursor.execute("""
-                        SELECT 
-                            SUM(CASE WHEN is_buyer_maker=0 THEN quantity ELSE 0 END) as buy_volume,
-                            SUM(CASE WHEN is_buyer_maker=1 THEN quantity ELSE 0 END) as sell_volume
-                        FROM trades WHERE symbol = ? AND timestamp > ?
-                    """, (symbol_key, timestamp_1h)).fetchone()
-                    
-                    buy_volume = buy_sell[0] if buy_sell and buy_sell[0] else 0
-                    sell_volume = buy_sell[1] if buy_sell and buy_sell[1] else 0
-                    buy_sell_ratio = round(buy_volume / sell_volume, 2) if sell_volume > 0 else 0
+                    # 计算1小时买卖比（读每分钟汇总表）
+                    flow = flow_totals(db, symbol_key)
+                    buy_volume = flow['buy_volume']
+                    sell_volume = flow['sell_volume']
+                    buy_sell_ratio = round(flow['buy_sell_ratio'], 2)
                     
                     overview.append({
                         'symbol': symbol_key,
@@ -119,9 +125,28 @@ def get_overview():
         return jsonify(overview)
         
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/events')
+def live_events():
+    """实时推送（SSE）：最新价格、滚动买卖比、最近成交和新收盘K线，参数 symbols=ethusdt,btcusdt（默认全部）"""
+    symbols = request.args.get('symbols')
+    symbols = [s.strip().lower() for s in symbols.split(',') if s.strip()] if symbols else None
+    try:
+        hub = get_hub()
+    except OSError as e:
+        return jsonify({'error': f'Live feed unavailable: {e}'}), 503
+    stream = hub.stream(symbols)
+    if stream is None:
+        # 连接数达到上限（见 live_feed.MAX_STREAMS），浏览器退回轮询
+        response = jsonify({'error': 'Too many live connections'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    return Response(stream_with_context(stream), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 @app.route('/api/symbol/<symbol>/price')
+@cache.cached(ttl=1)
 def get_symbol_price(symbol):
     """获取指定交易对的价格"""
     try:
@@ -129,11 +154,7 @@ def get_symbol_price(symbol):
         cursor = db.cursor()
         
         # 最近10笔交易的平均价格
-        recent_trades = cursor.execute("""
-            SELECT price, timestamp FROM trades 
-            WHERE symbol = ?
-            ORDER BY timestamp DESC LIMIT 10
-        """, (symbol,)).fetchall()
+        recent_trades = cursor.execute(RECENT_TRADES_SQL, (symbol,)).fetchall()
         
         if recent_trades:
             avg_price = sum([t[0] for t in recent_trades]) / len(recent_trades)
@@ -160,9 +181,10 @@ def get_symbol_price(symbol):
             'volume_24h': round(ticker_24h[1], 2) if ticker_24h else 0
         })
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/symbol/<symbol>/trades')
+@cache.cached(ttl=1)
 def get_symbol_trades(symbol):
     """获取指定交易对的最近交易"""
     try:
@@ -189,7 +211,7 @@ def get_symbol_trades(symbol):
         
         return jsonify(trades_list)
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/symbol/<symbol>/analysis', methods=['GET', 'POST'])
 def get_symbol_analysis(symbol):
@@ -198,9 +220,6 @@ def get_symbol_analysis(symbol):
         from ai_analyzer import AIAnalyzer
         
         analyzer = AIAnalyzer(symbol=symbol)
-        data = analyzer.get_recent_data(hours=1)
-        
-        lm_available = analyzer.test_lm_studio_connection()
         
         # 获取用户配置（如果是POST请求）
         config = None
@@ -208,6 +227,11 @@ def get_symbol_analysis(symbol):
             config = request.get_json()
             print(f"收到配置: {config}")
         
+        # 只有配置选了扩展指标时才额外计算
+        data = analyzer.get_recent_data(hours=1, extended=(config or {}).get('indicators'))
+        
+        lm_available = analyzer.test_lm_studio_connection()
+        
         if lm_available:
             analysis = analyzer.analyze_with_lm_studio(data, config=config)
         else:
@@ -229,9 +253,10 @@ def get_symbol_analysis(symbol):
         import traceback
         print(f"分析错误: {e}")
         traceback.print_exc()
-        return jsonify({'error': str(e)})
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/compare')
+@cache.cached(ttl=5, symbols=list(SYMBOLS))
 def compare_symbols():
     """对比所有交易对"""
     try:
@@ -244,13 +269,9 @@ def compare_symbols():
         for symbol_key, symbol_name in SYMBOLS.items():
             try:
                 # 获取价格变化
-                recent_price = cursor.execute("""
-                    SELECT price FROM trades WHERE symbol = ? ORDER BY timestamp DESC LIMIT 1
-                """, (symbol_key,)).fetchone()
+                recent_price = cursor.execute(LAST_PRICE_SQL, (symbol_key,)).fetchone()
                 
-                old_price = cursor.execute("""
-                    SELECT price FROM trades WHERE symbol = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT 1
-                """, (symbol_key, timestamp_1h)).fetchone()
+                old_price = cursor.execute(PRICE_BEFORE_SQL, (symbol_key, timestamp_1h)).fetchone()
                 
                 if recent_price and old_price:
                     price_change = ((recent_price[0] - old_price[0]) / old_price[0]) * 100
@@ -268,7 +289,12 @@ def compare_symbols():
         return jsonify(comparison)
         
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """响应缓存命中统计"""
+    return jsonify(cache.stats())
 
 if __name__ == '__main__':
     print("""
@@ -0,0 +1,158 @@
+"""
+响应缓存 - 同一秒内所有客户端请求的聚合接口（概览、多币种价格/摘要、对比）只计算一次
+按 路由 + 查询参数 缓存整段响应，每个路由各自的 TTL，总条数超过上限时按 LRU 淘汰；
+采集进程提交新数据后发出 commit 事件（见 live_feed），涉及该交易对的缓存失效，
+收不到通知（没有同机的采集进程）时靠 TTL 过期。采集时每个进程每秒会提交好几次，所以同一个缓存项
+每个 TTL 内最多因新数据失效一次：安静一段时间后的第一次写入立即生效，持续写入时数据最多旧一个 TTL。响应带 ETag，客户端带 If-None-Match 且内容未变时返回 304。
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request
+
+MAX_ENTRIES = 512
+
+
+class _Entry:
+    __slots__ = ('body', 'mimetype', 'etag', 'ttl', 'expires', 'symbols')
+
+    def __init__(self, body, mimetype, etag, ttl, symbols):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.ttl = ttl
+        self.expires = time.monotonic() + ttl
+        self.symbols = symbols
+
+
+class ResponseCache:
+    """进程内共享的响应缓存（线程安全）"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, feed=None):
+        """
+        max_entries: 缓存条数上限（LRU）
+        feed: 返回 LiveHub 的函数（如 live_feed.get_hub），第一次请求时订阅 commit 事件；None 时只按 TTL 过期
+        """
+        self.max_entries = max_entries
+        self.feed = feed
+        self._entries = OrderedDict()
+        self._coalesce_until = {}   # 缓存键 -> 上次因新数据失效的时间 + TTL，在此之前不再因新数据失效
+        self._lock = threading.Lock()
+        self._listening_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype, ttl, symbols=None):
+        """保存一段响应；symbols 为响应依赖的交易对（None 表示任何交易对有新数据都失效）"""
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        entry = _Entry(body, mimetype, etag, ttl, frozenset(symbols) if symbols else None)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, symbols=None, coalesce=True):
+        """
+        让依赖这些交易对的缓存失效（symbols 为 None 时全部），返回失效条数
+        coalesce: 上次失效还不到该项的 TTL 时保留（由 TTL 过期），持续写入时缓存仍能命中
+        """
+        symbols = {s.lower() for s in symbols} if symbols else None
+        now = time.monotonic()
+        with self._lock:
+            matched = [(key, entry) for key, entry in self._entries.items()
+                       if symbols is None or entry.symbols is None or entry.symbols & symbols]
+            self._coalesce_until = {key: t for key, t in self._coalesce_until.items() if t > now}
+            stale = []
+            for key, entry in matched:
+                if coalesce and key in self._coalesce_until:
+                    self.coalesced += 1
+                    continue
+                del self._entries[key]
+                self._coalesce_until[key] = now + entry.ttl
+                stale.append(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'not_modified': self.not_modified,
+                'invalidations': self.invalidations,
+                'coalesced': self.coalesced,
+                'listening': self._listening_pid == os.getpid(),
+            }
+
+    def _listen(self):
+        # gunicorn fork 出的每个 worker 各自订阅一次
+        if self.feed is None or self._listening_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listening_pid == os.getpid():
+                return
+            self._listening_pid = os.getpid()
+        try:
+            self.feed().add_listener(self.invalidate)
+        except OSError as e:
+            print(f"⚠️ 响应缓存未订阅写入通知，只按 TTL 过期: {e}")
+
+    def cached(self, ttl, symbols=None):
+        """
+        Flask 视图装饰器：只缓存 200 响应
+        symbols: 响应依赖的交易对列表；不传时取路由参数 symbol，没有该参数则任何新数据都使缓存失效
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                self._listen()
+                key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                entry = self.get(key)
+                status = 'HIT'
+                if entry is None:
+                    status = 'MISS'
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    depends = symbols
+                    if depends is None and 'symbol' in kwargs:
+                        depends = [kwargs['symbol'].lower()]
+                    entry = self.put(key, response.get_data(), response.mimetype, ttl, depends)
+
+                response = make_response(entry.body)
+                response.mimetype = entry.mimetype
+                response.set_etag(entry.etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                response.headers['X-Cache'] = status
+                response.make_conditional(request)
+                if response.status_code == 304:
+                    with self._lock:
+                        self.not_modified += 1
+                return response
+            return wrapper
+        return decorator
@@ -3,8 +3,9 @@ Web用户界面 - 可视化实时数据和AI分析
 """
 from flask import Flask, render_template, jsonify
 from flask_cors import CORS
-import sqlite3
 from datetime import datetime, timedelta
+from database import connect_reader
+from trade_rollup import flow_totals
 import json
 import threading
 import time
@@ -14,7 +15,7 @@ CORS(app)
 
 def get_db():
     """获取数据库连接"""
-    return sqlite3.connect('crypto_data.db')
+    return connect_reader()
 
 @app.route('/')
 def index():
@@ -156,36 +157,21 @@ def get_market_stats():
         db = get_db()
         cursor = db.cursor()
         
-        # 最近1小时的买卖压力
-        timestamp_1h = int((datetime.now() - timedelta(hours=1)).timestamp() * 1000)
-        
-        buy_sell = cursor.execute("""
-            SELECT 
-                SUM(CASE WHEN is_buyer_maker=0 THEN quantity ELSE 0 END) as buy_volume,
-                SUM(CASE WHEN is_buyer_maker=1 THEN quantity ELSE 0 END) as sell_volume
-            FROM trades WHERE timestamp > ?
-        """, (timestamp_1h,)).fetchone()
-        
-        buy_volume = buy_sell[0] if buy_sell[0] else 0
-        sell_volume = buy_sell[1] if buy_sell[1] else 0
-        buy_sell_ratio = round(buy_volume / sell_volume, 2) if sell_volume > 0 else 0
+        # 最近1小时的买卖压力（读每分钟汇总表）
+        flow = flow_totals(db)
+        buy_volume = flow['buy_volume']
+        sell_volume = flow['sell_volume']
+        buy_sell_ratio = round(flow['buy_sell_ratio'], 2)
         
         # 最新订单簿
         orderbook = cursor.execute("""
-            SELECT bids, asks FROM orderbook 
+            SELECT bid_total, ask_total FROM orderbook 
             ORDER BY timestamp DESC LIMIT 1
         """).fetchone()
         
         orderbook_ratio = 1.0
-        if orderbook:
-            try:
-                bids = json.loads(orderbook[0])
-                asks = json.loads(orderbook[1])
-                total_bids = sum([float(b[1]) for b in bids[:20]])
-                total_asks = sum([float(a[1]) for a in asks[:20]])
-                orderbook_ratio = round(total_bids / total_asks, 2) if total_asks > 0 else 1.0
-            except:
-                pass
+        if orderbook and orderbook[1]:
+            orderbook_ratio = round((orderbook[0] or 0) / orderbook[1], 2)
         
         db.close()
         
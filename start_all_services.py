@@ -59,13 +59,19 @@ def main():
     start_service("BNB 合约", "python start_bnb_futures.py")
     time.sleep(2)
     start_service("SOL 合约", "python start_sol_futures.py")
+    time.sleep(2)
+    
+    # 原始成交 -> trades_1s / trades_1m 汇总；只汇总、不删除原始成交
+    # （需要归档删除时加 --retention-days N，并用 --archive-dir / --partitions 指向持久卷）
+    print("\n[后台任务]")
+    start_service("成交汇总", "python src/storage/rollup_job.py")
     time.sleep(5)
     
     # 启动API服务器
     print("\n[API服务器]")
     api_process = start_service(
         "API服务器",
-        "gunicorn -w 2 -b 0.0.0.0:5001 --timeout 120 cloud_api_server:app"
+        "gunicorn -w 2 -k gthread --threads 32 -b 0.0.0.0:5001 --timeout 120 cloud_api_server:app"
     )
     
     print("\n" + "=" * 60)
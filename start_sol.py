@@ -3,6 +3,8 @@ import os
 
 os.chdir(r'C:\Users\jierr\Desktop\jk')
 sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\collectors')
+sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\storage')
+sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\indicators')
 
 from binance_collector import BinanceDataCollector
 
@@ -4,6 +4,7 @@ import time
 
 os.chdir(r'C:\Users\jierr\Desktop\jk')
 sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\collectors')
+sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\storage')
 
 from futures_collector import FuturesDataCollector
 
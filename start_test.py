@@ -6,6 +6,8 @@ os.chdir(r'C:\Users\jierr\Desktop\jk')
 
 # 添加源码路径
 sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\collectors')
+sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\storage')
+sys.path.insert(0, r'C:\Users\jierr\Desktop\jk\src\indicators')
 
 print("当前工作目录:", os.getcwd())
 print("Python路径:", sys.path[:3])
@@ -0,0 +1,16 @@
+"""
+pytest配置 - 把仓库根目录（cloud_api_server 等入口）和 src 下各模块目录加入导入路径（与启动脚本的 sys.path 设置一致）
+"""
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+for name in sorted(os.listdir(SRC_DIR)):
+    path = os.path.join(SRC_DIR, name)
+    if os.path.isdir(path) and path not in sys.path:
+        sys.path.insert(0, path)
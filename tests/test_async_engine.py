@@ -0,0 +1,47 @@
+"""
+测试异步采集引擎：周期任务按间隔调度、阻塞调用在固定大小的线程池中执行
+"""
+import asyncio
+import threading
+import time
+
+from async_engine import AsyncCollectorEngine
+from db_writer import BatchWriter
+
+
+class FakeCollector:
+    def __init__(self, symbol, delay=0.05):
+        self.symbol = symbol
+        self.delay = delay
+        self.calls = 0
+        self.threads = set()
+
+    def stream_handlers(self):
+        return {}
+
+    def fetch_ticker_24h(self):
+        # 模拟阻塞的REST请求
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        self.calls += 1
+
+
+def test_periodic_tasks_share_a_small_pool(tmp_path):
+    writer = BatchWriter(str(tmp_path / 'engine.db'), report_interval=0).start()
+    collectors = [FakeCollector(f'sym{i}usdt') for i in range(20)]
+    engine = AsyncCollectorEngine(collectors, writer=writer, ticker_interval=0.2,
+                                  flush_interval=0.1, rest_workers=2)
+
+    before = threading.active_count()
+    asyncio.run(engine.run(duration=0.5))
+
+    # 20个交易对共用2个REST线程（外加写库检查线程），而不是每个交易对一个线程
+    threads = set().union(*(c.threads for c in collectors))
+    assert len(threads) <= 2
+    assert threading.active_count() - before <= 3
+    assert all(c.calls >= 1 for c in collectors[:4])
+    assert engine.runs['DB-Flush'] >= 2
+
+    engine.executor.shutdown(wait=True)
+    engine.flush_executor.shutdown(wait=True)
+    writer.stop()
@@ -0,0 +1,140 @@
+"""
+测试成交聚合K线：向量化聚合与逐笔聚合一致，分页回放与一次聚合一致
+"""
+import numpy as np
+import pytest
+
+import threading
+import time
+from types import SimpleNamespace
+
+from bar_aggregator import BAR_UPSERT_SQL, BarAggregator, CREATE_TABLE_SQL, aggregate, make_row, replay
+from binance_collector import BAR_FLUSH_DELAY_MS, BinanceDataCollector
+from database import connect
+from migrations import migrate
+
+
+def _trades(n, seed=11):
+    rng = np.random.default_rng(seed)
+    timestamps = 1700000000000 + np.cumsum(rng.integers(0, 400, n))
+    prices = 2500 + np.cumsum(rng.normal(0, 0.2, n))
+    quantities = np.round(rng.exponential(0.5, n), 4)
+    sells = rng.random(n) < 0.5
+    trade_ids = np.arange(1, n + 1)
+    return timestamps, prices, quantities, sells, trade_ids
+
+
+def _streaming(bar_type, trades):
+    aggregator = BarAggregator(bar_type)
+    bars = []
+    for t, p, q, m, a in zip(*(column.tolist() for column in trades)):
+        bars += aggregator.add(t, p, q, m, a)
+    return bars, aggregator
+
+
+@pytest.mark.parametrize('bar_type', ['time:1', 'time:60', 'volume:25', 'dollar:50000', 'tick:100'])
+def test_vectorized_matches_streaming(bar_type):
+    trades = _trades(20000)
+    expected, aggregator = _streaming(bar_type, trades)
+    bars, remainder = aggregate(bar_type, *trades)
+
+    assert len(bars) == len(expected) > 10
+    for bar, ref in zip(bars, expected):
+        assert bar.keys() == ref.keys()
+        for field in bar:
+            assert bar[field] == pytest.approx(ref[field], rel=1e-9), field
+
+    # 未完成部分与逐笔聚合器中尚未完成的K线一致
+    partial = aggregator.current()
+    if remainder < len(trades[0]):
+        assert partial['trades_count'] == len(trades[0]) - remainder
+        assert partial['first_trade_id'] == trades[4][remainder]
+    else:
+        assert partial is None
+
+
+def test_bar_contents():
+    trades = _trades(5000)
+    bars, _ = aggregate('volume:10', *trades)
+    timestamps, prices, quantities, sells, _ = trades
+    for bar in bars:
+        assert bar['volume'] >= 10
+        assert bar['buy_volume'] + bar['sell_volume'] == pytest.approx(bar['volume'])
+        assert bar['low'] <= bar['vwap'] <= bar['high']
+    assert sum(bar['trades_count'] for bar in bars) <= len(timestamps)
+
+    time_bars, _ = aggregate('time:1', *trades)
+    assert all(bar['open_time'] % 1000 == 0 and bar['close_time'] - bar['open_time'] < 1000 for bar in time_bars)
+
+
+def test_time_bar_flush():
+    aggregator = BarAggregator('time:1')
+    assert aggregator.add(1000, 10.0, 1.0, False, 1) == []
+    assert aggregator.add(1500, 12.0, 1.0, True, 2) == []
+    assert aggregator.flush(now_ms=1999) == []
+    # 本机时钟落后于成交时间时不提前结束
+    assert aggregator.flush(now_ms=500) == []
+    bar, = aggregator.flush(now_ms=2000)
+    assert (bar['open'], bar['high'], bar['close'], bar['vwap']) == (10.0, 12.0, 12.0, 11.0)
+    assert (bar['buy_volume'], bar['sell_volume'], bar['trades_count']) == (1.0, 1.0, 2)
+    assert aggregator.current() is None
+
+
+class _Writer:
+    def __init__(self):
+        self.rows = []
+
+    def submit(self, sql, params):
+        if sql == BAR_UPSERT_SQL:
+            self.rows.append(params)
+
+
+def test_collector_flushes_idle_time_bars():
+    collector = SimpleNamespace(symbol='flushusdt', writer=_Writer(), live=None, stats=SimpleNamespace(
+        record=lambda *args: None, set_latest=lambda *args: None),
+        bar_aggregators=[BarAggregator('time:1'), BarAggregator('volume:100')], _bar_lock=threading.Lock())
+    now = int(time.time() * 1000)
+    # 普通成交（t）没有聚合ID（a），K线记录的成交ID与 trades 表一致
+    trade = {'T': now - BAR_FLUSH_DELAY_MS - 2000, 'p': '10.0', 'q': '1.0', 'm': False, 't': 42}
+    BinanceDataCollector.handle_trade(collector, trade)
+
+    # 没有新成交：本机时间过了时间格 BAR_FLUSH_DELAY_MS 之后由定时任务结束
+    assert BinanceDataCollector.flush_bars(collector) == 1
+    assert collector.writer.rows[0][1] == 'time:1' and collector.writer.rows[0][-2:] == (42, 42)
+    BinanceDataCollector.handle_trade(collector, dict(trade, T=now, t=43))
+    assert BinanceDataCollector.flush_bars(collector) == 0
+
+    # 停止时强制结束所有未完成的K线（包括未满的成交量K线）
+    assert BinanceDataCollector.flush_bars(collector, force=True) == 2
+    assert sorted(row[1] for row in collector.writer.rows[1:]) == ['time:1', 'volume:100']
+    assert collector.writer.rows[-1][-2:] == (42, 43)
+
+
+def test_replay_pages_match_single_pass(tmp_path):
+    db = connect(str(tmp_path / 'bars.db'))
+    db.execute('''
+        CREATE TABLE trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, timestamp INTEGER,
+            price REAL, quantity REAL, is_buyer_maker INTEGER, trade_id INTEGER
+        )
+    ''')
+    db.execute(CREATE_TABLE_SQL)
+    db.commit()
+    migrate(db)
+
+    trades = _trades(12000)
+    with db:
+        db.executemany(
+            'INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker, trade_id) VALUES (?, ?, ?, ?, ?, ?)',
+            [('ethusdt',) + row for row in zip(*(column.tolist() for column in trades))])
+
+    expected, _ = aggregate('volume:40', *trades)
+    bars = list(replay(db, 'ethusdt', 'volume:40', page_size=1000))
+    assert [bar['first_trade_id'] for bar in bars] == [bar['first_trade_id'] for bar in expected]
+    assert bars[-1]['volume'] == pytest.approx(expected[-1]['volume'])
+
+    with db:
+        db.executemany(BAR_UPSERT_SQL, [make_row('ethusdt', 'volume:40', bar) for bar in bars])
+        db.executemany(BAR_UPSERT_SQL, [make_row('ethusdt', 'volume:40', bar) for bar in bars])
+    assert db.execute('SELECT COUNT(*) FROM trade_bars').fetchone()[0] == len(bars)
+    db.close()
@@ -0,0 +1,62 @@
+"""
+测试批量指标：一条查询取回多个窗口，二维批量计算与逐个计算结果一致
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from batch_indicators import compute_batch, load_windows
+from binance_collector import BinanceDataCollector
+from database import connect
+from indicators import TechnicalIndicators
+
+INSERT_SQL = '''
+    INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = connect(str(tmp_path / 'batch.db'))
+    BinanceDataCollector.init_database(SimpleNamespace(db=db, symbol='ethusdt'))
+
+    rng = np.random.default_rng(11)
+    sizes = {('btcusdt', '1h'): 300, ('ethusdt', '1h'): 250, ('btcusdt', '4h'): 80, ('ethusdt', '4h'): 10}
+    for (symbol, interval), n in sizes.items():
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        db.executemany(INSERT_SQL, [
+            (symbol, interval, i * 1000, c, c + 0.5, c - 0.5, c, 1.0) for i, c in enumerate(close)
+        ])
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_load_windows_returns_latest_candles_in_order(db):
+    windows = load_windows(db, ['BTCUSDT', 'ethusdt', 'solusdt'], ['1h', '4h'], window=200)
+
+    assert len(windows[('btcusdt', '1h')]) == 200
+    assert windows[('btcusdt', '1h')][-1][0] == 299 * 1000
+    assert [k[0] for k in windows[('btcusdt', '4h')]] == [i * 1000 for i in range(80)]
+    assert len(windows[('ethusdt', '4h')]) == 10
+    assert windows[('solusdt', '1h')] == []
+
+
+def test_batch_matches_single_computation(db):
+    windows = load_windows(db, ['btcusdt', 'ethusdt', 'solusdt'], ['1h', '4h'])
+    results = compute_batch(windows)
+
+    for key, klines in windows.items():
+        expected = TechnicalIndicators.calculate_all_indicators(klines)
+        result = results[key]
+        assert result['available'] == expected['available'], key
+        if not expected['available']:
+            continue
+        assert result['ema_12'] == pytest.approx(expected['ema_12'], abs=0.011)
+        assert result['rsi'] == pytest.approx(expected['rsi'], abs=0.011)
+        assert result['atr'] == pytest.approx(expected['atr'], abs=1e-4)
+        assert result['macd']['trend'] == expected['macd']['trend']
+        assert result['bollinger']['upper'] == pytest.approx(expected['bollinger']['upper'], abs=0.011)
+        assert result['bollinger']['position'] == expected['bollinger']['position']
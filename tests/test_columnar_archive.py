@@ -0,0 +1,69 @@
+"""
+测试列式归档：按交易对/日期导出 Parquet，读取时按时间范围和列下推，与库中数据一致
+"""
+from types import SimpleNamespace
+
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from binance_collector import BinanceDataCollector
+from columnar_archive import day_path, export, list_files, read
+from database import connect
+from futures_collector import FuturesDataCollector
+from partitions import DAY_MS, day_start
+
+START = day_start('2024-03-01')
+MINUTE = 60 * 1000
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = connect(str(tmp_path / 'data.db'))
+    fake = SimpleNamespace(db=db, symbol='ethusdt')
+    BinanceDataCollector.init_database(fake)
+    FuturesDataCollector.init_database(fake)
+    with db:
+        db.executemany('INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker, trade_id) '
+                       'VALUES (?, ?, ?, ?, ?, ?)',
+                       [(symbol, START + i * 7000, 100 + i, 0.5, i % 2, i)
+                        for symbol in ('ethusdt', 'btcusdt') for i in range(30000)])
+        db.executemany('INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume) '
+                       'VALUES (?, ?, ?, 1, 2, 0.5, 1.5, 10)',
+                       [('ethusdt', '1h', START + i * 3600000) for i in range(72)])
+        db.executemany('INSERT INTO funding_rate (symbol, timestamp, funding_rate, next_funding_time) '
+                       'VALUES (?, ?, ?, ?)',
+                       [('ethusdt', START + i * 8 * 3600000, 0.0001 * i, 0) for i in range(9)])
+    yield db
+    db.close()
+
+
+def test_export_and_pushdown(db, tmp_path):
+    root = str(tmp_path / 'columnar')
+    now = START + 2 * DAY_MS + 5 * MINUTE
+    written = export(db, root, now_ms=now)
+    # 只导出已经结束的整天
+    assert written['trades'] == 2 * sum(1 for i in range(30000) if START + i * 7000 < START + 2 * DAY_MS)
+    assert written['klines'] == 48
+    assert written['funding_rate'] == 6
+    assert {f['date'] for f in list_files(root, 'trades')} == {'2024-03-01', '2024-03-02'}
+    # 再次执行时已有文件跳过
+    assert export(db, root, now_ms=now) == {name: 0 for name in written}
+
+    start, end = START + DAY_MS - 10 * MINUTE, START + DAY_MS + 20 * MINUTE
+    sliced = read(root, 'trades', 'ethusdt', start, end, columns=['timestamp', 'price'])
+    assert sliced.column_names == ['timestamp', 'price']
+    expected = db.execute('SELECT timestamp, price FROM trades WHERE symbol = ? AND timestamp >= ? AND timestamp < ? '
+                          'ORDER BY timestamp', ('ethusdt', start, end)).fetchall()
+    assert list(zip(*sliced.to_pydict().values())) == expected
+
+    klines = read(root, 'klines', 'ethusdt', columns=['interval', 'open_time', 'close'])
+    assert klines.num_rows == 48 and set(klines.column('interval').to_pylist()) == {'1h'}
+
+    with pytest.raises(ValueError):
+        read(root, 'trades', 'ethusdt', columns=['nope'])
+
+    # 文件内按时间排序、分成多个 row group，时间过滤可以跳过整个 row group
+    metadata = pq.ParquetFile(day_path(root, 'trades', 'ethusdt', '2024-03-01')).metadata
+    assert metadata.num_row_groups >= 1
+    assert metadata.row_group(0).column(1).statistics.min == START
@@ -0,0 +1,59 @@
+"""
+测试组合流：多个交易对的数据流按上限分组到少量连接，{"stream", "data"} 消息分发给对应交易对的处理函数
+"""
+import json
+from types import SimpleNamespace
+
+from binance_collector import KLINE_INTERVALS, BinanceDataCollector
+from combined_stream import CombinedStream
+
+
+class _Collector:
+    """记录收到的消息，数据流名称与 BinanceDataCollector.stream_handlers 相同"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.received = []
+        fake = SimpleNamespace(symbol=symbol, **{
+            name: (lambda data, name=name: self.received.append((name, data)))
+            for name in ('handle_trade', 'handle_depth', 'handle_kline')
+        })
+        self.handlers = BinanceDataCollector.stream_handlers(fake)
+
+    def stream_handlers(self):
+        return self.handlers
+
+
+def _frame(stream, data):
+    return json.dumps({'stream': stream, 'data': data})
+
+
+def test_groups_respect_connection_limit():
+    collectors = [_Collector(f'sym{i}usdt') for i in range(10)]
+    per_symbol = 2 + len(KLINE_INTERVALS)
+    stream = CombinedStream(collectors, streams_per_connection=25)
+
+    assert len(stream.handlers) == 10 * per_symbol
+    assert [len(group) for group in stream.groups] == [25, 25, 25, 15]
+    # 每个数据流只订阅一次
+    names = [name for group in stream.groups for name in group]
+    assert sorted(names) == sorted(stream.handlers)
+    assert [t.name for t in stream.threads()] == ['Combined-1', 'Combined-2', 'Combined-3', 'Combined-4']
+    assert len(CombinedStream(collectors).groups) == 1
+
+
+def test_dispatch_to_symbol_handler():
+    eth, btc = _Collector('ethusdt'), _Collector('btcusdt')
+    stream = CombinedStream([eth, btc])
+
+    stream.dispatch(_frame('ethusdt@aggTrade', {'p': '2000'}))
+    stream.dispatch(_frame('btcusdt@kline_1h', {'k': {'i': '1h'}}))
+    stream.dispatch(_frame('btcusdt@depth@100ms', {'u': 1}))
+    assert eth.received == [('handle_trade', {'p': '2000'})]
+    assert btc.received == [('handle_kline', {'k': {'i': '1h'}}), ('handle_depth', {'u': 1})]
+
+    # 未订阅的数据流、没有 stream 字段的消息和无法解析的消息都被忽略
+    stream.dispatch(_frame('solusdt@aggTrade', {'p': '100'}))
+    stream.dispatch(json.dumps({'result': None, 'id': 1}))
+    stream.dispatch('not json')
+    assert len(eth.received) == 1 and len(btc.received) == 2
@@ -0,0 +1,43 @@
+"""
+测试连接工厂：WAL与各项PRAGMA生效，读连接只读且不阻塞写连接
+"""
+import sqlite3
+
+import pytest
+
+from database import connect, connect_reader
+
+
+def test_writer_pragmas(tmp_path):
+    db = connect(str(tmp_path / 'factory.db'))
+
+    assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert db.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert db.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+    assert db.execute('PRAGMA cache_size').fetchone()[0] < 0
+    db.close()
+
+
+def test_reader_is_query_only_and_does_not_block_writer(tmp_path):
+    path = str(tmp_path / 'factory.db')
+    writer = connect(path)
+    writer.execute('CREATE TABLE trades (id INTEGER PRIMARY KEY, price REAL)')
+    writer.execute('INSERT INTO trades (price) VALUES (1.0)')
+    writer.commit()
+
+    reader = connect_reader(path, row_factory=sqlite3.Row)
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute('INSERT INTO trades (price) VALUES (2.0)')
+    reader.rollback()
+
+    # 读事务进行中，写连接仍可提交（WAL）
+    reader.execute('BEGIN')
+    assert reader.execute('SELECT COUNT(*) AS n FROM trades').fetchone()['n'] == 1
+    writer.execute('INSERT INTO trades (price) VALUES (3.0)')
+    writer.commit()
+    assert reader.execute('SELECT COUNT(*) AS n FROM trades').fetchone()['n'] == 1
+    reader.execute('COMMIT')
+    assert reader.execute('SELECT COUNT(*) AS n FROM trades').fetchone()['n'] == 2
+
+    reader.close()
+    writer.close()
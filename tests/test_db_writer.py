@@ -0,0 +1,136 @@
+"""
+测试批量写入器：批量提交、按时间阈值刷盘、队列满时背压
+"""
+import sqlite3
+import threading
+import time
+
+from db_writer import BatchWriter
+
+INSERT_SQL = 'INSERT INTO trades (symbol, timestamp, price) VALUES (?, ?, ?)'
+
+
+def _make_db(tmp_path):
+    path = str(tmp_path / 'writer.db')
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE trades (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, timestamp INTEGER, price REAL)')
+    db.commit()
+    db.close()
+    return path
+
+
+def _count(path):
+    db = sqlite3.connect(path)
+    count = db.execute('SELECT COUNT(*) FROM trades').fetchone()[0]
+    db.close()
+    return count
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    path = _make_db(tmp_path)
+    writer = BatchWriter(path, batch_size=100, flush_interval=5, report_interval=0).start()
+
+    for i in range(1000):
+        writer.submit(INSERT_SQL, ('ethusdt', i, 100.0 + i))
+    writer.flush()
+
+    assert _count(path) == 1000
+    stats = writer.stats()
+    assert stats['rows_written'] == 1000
+    assert stats['batches_written'] <= 11
+    assert stats['queue_depth'] == 0
+    writer.stop()
+
+
+def test_partial_batch_is_flushed_after_interval(tmp_path):
+    path = _make_db(tmp_path)
+    writer = BatchWriter(path, batch_size=500, flush_interval=0.05, report_interval=0).start()
+
+    writer.submit_many(INSERT_SQL, [('btcusdt', i, 1.0) for i in range(3)])
+    deadline = time.time() + 2
+    while _count(path) < 3 and time.time() < deadline:
+        time.sleep(0.02)
+
+    assert _count(path) == 3
+    writer.stop()
+
+
+def test_full_queue_blocks_instead_of_dropping(tmp_path):
+    path = _make_db(tmp_path)
+    writer = BatchWriter(path, batch_size=10, flush_interval=0.01, max_queue=5, report_interval=0)
+
+    # 写线程未启动时队列很快写满，生产者必须阻塞等待
+    producer = threading.Thread(
+        target=lambda: [writer.submit(INSERT_SQL, ('solusdt', i, 1.0)) for i in range(50)]
+    )
+    producer.start()
+    time.sleep(0.2)
+    assert producer.is_alive()
+    assert writer.stats()['backpressure_waits'] == 1
+
+    writer.start()
+    producer.join(5)
+    writer.flush()
+
+    assert not producer.is_alive()
+    assert _count(path) == 50
+    writer.stop()
+
+
+def test_bad_rows_do_not_drop_the_batch(tmp_path):
+    path = _make_db(tmp_path)
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE marks (symbol TEXT PRIMARY KEY, price REAL NOT NULL)')
+    db.commit()
+    db.close()
+    committed = []
+    writer = BatchWriter(path, batch_size=100, flush_interval=5, report_interval=0)
+    writer.add_commit_listener(committed.append)
+    writer.start()
+
+    # 同一批里：一组完全正常，另一组有一行违反 NOT NULL，还有一组写向不存在的表
+    writer.submit_many(INSERT_SQL, [('ethusdt', i, 1.0) for i in range(5)])
+    mark_sql = 'INSERT INTO marks (symbol, price) VALUES (?, ?)'
+    writer.submit_many(mark_sql, [('ethusdt', 1.0), ('btcusdt', None), ('solusdt', 2.0)])
+    writer.submit('INSERT INTO missing (symbol) VALUES (?)', ('ethusdt',))
+    writer.flush()
+
+    assert _count(path) == 5
+    db = sqlite3.connect(path)
+    assert [r[0] for r in db.execute('SELECT symbol FROM marks ORDER BY symbol')] == ['ethusdt', 'solusdt']
+    db.close()
+    stats = writer.stats()
+    assert stats['rows_written'] == 7 and stats['rows_failed'] == 2
+    # 提交通知只包含实际写入的行
+    assert sum(len(rows) for pending in committed for rows in pending.values()) == 7
+    assert committed[-1][mark_sql] == [('ethusdt', 1.0), ('solusdt', 2.0)]
+
+    # 整批都写入失败时不计批次，也不通知
+    batches = stats['batches_written']
+    writer.submit(mark_sql, ('bnbusdt', None))
+    writer.flush()
+    stats = writer.stats()
+    assert stats['batches_written'] == batches and stats['rows_failed'] == 3
+    assert sum(len(rows) for pending in committed for rows in pending.values()) == 7
+    writer.stop()
+
+
+def test_atomic_submit_is_all_or_nothing(tmp_path):
+    path = _make_db(tmp_path)
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE marks (symbol TEXT PRIMARY KEY, price REAL NOT NULL)')
+    db.commit()
+    db.close()
+    writer = BatchWriter(path, batch_size=100, flush_interval=5, report_interval=0).start()
+    mark_sql = 'INSERT INTO marks (symbol, price) VALUES (?, ?)'
+
+    # 一行出错时整组都不写入，调用方能知道
+    failed = writer.submit_atomic([(INSERT_SQL, [('ethusdt', 1, 1.0)]), (mark_sql, [('ethusdt', None)])])
+    assert not failed.wait(5)
+    ok = writer.submit_atomic([(INSERT_SQL, [('ethusdt', 2, 1.0)]), (mark_sql, [('ethusdt', 1.0)])])
+    assert ok.wait(5)
+
+    assert _count(path) == 1
+    stats = writer.stats()
+    assert stats['rows_written'] == 2 and stats['rows_failed'] == 2
+    writer.stop()
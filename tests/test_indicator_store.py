@@ -0,0 +1,114 @@
+"""
+测试指标快照表：收盘时写入的增量值、整段回补、缺口补齐三者一致
+"""
+import numpy as np
+import pytest
+
+from database import connect
+from indicator_store import (CREATE_TABLE_SQL, INDICATOR_UPSERT_SQL, backfill, make_row,
+                             missing_rows, query_history)
+from migrations import migrate
+from streaming import IndicatorRegistry
+
+
+def _klines(n, seed=5):
+    rng = np.random.default_rng(seed)
+    close = 3000 + np.cumsum(rng.normal(0, 5, n))
+    high = close + rng.uniform(0, 3, n)
+    low = close - rng.uniform(0, 3, n)
+    return [(i * 60000, c, h, l, c, 1.0) for i, (h, l, c) in enumerate(zip(high, low, close))]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = connect(str(tmp_path / 'ind.db'))
+    db.execute('''
+        CREATE TABLE klines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, interval TEXT, open_time INTEGER,
+            open REAL, high REAL, low REAL, close REAL, volume REAL
+        )
+    ''')
+    db.execute(CREATE_TABLE_SQL)
+    db.commit()
+    migrate(db)
+    yield db
+    db.close()
+
+
+def _insert_klines(db, klines):
+    with db:
+        db.executemany(
+            'INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [('ethusdt', '1m') + k for k in klines])
+
+
+def test_backfill_matches_streaming(db):
+    klines = _klines(300)
+    _insert_klines(db, klines)
+    assert backfill(db, 'ethusdt', '1m') == 300 - 25
+
+    registry = IndicatorRegistry()
+    for k in klines:
+        registry.update('ethusdt', '1m', k[0], k[2], k[3], k[4])
+    live = registry.values('ethusdt', '1m')
+
+    stored = query_history(db, 'ethusdt', '1m', limit=1)[0]
+    assert stored['open_time'] == live['open_time']
+    for field in ('ema_12', 'ema_26', 'macd', 'macd_signal', 'rsi', 'atr', 'boll_upper', 'boll_width'):
+        assert stored[field] == pytest.approx(live[field], rel=1e-8, abs=1e-8), field
+
+    # 第26根K线起才有指标；信号线要到第34根
+    first = query_history(db, 'ethusdt', '1m', start_time=0, limit=1)[0]
+    assert first['open_time'] == 25 * 60000
+    assert first['macd'] is not None and first['macd_signal'] is None
+
+
+def test_missing_rows_fills_gap_and_upsert_is_idempotent(db):
+    klines = _klines(1000)
+    _insert_klines(db, klines[:800])
+    backfill(db, 'ethusdt', '1m')
+    _insert_klines(db, klines[800:])
+
+    rows = missing_rows(db, 'ethusdt', '1m')
+    assert [row[2] for row in rows] == [k[0] for k in klines[800:]]
+    with db:
+        db.executemany(INDICATOR_UPSERT_SQL, rows)
+        db.executemany(INDICATOR_UPSERT_SQL, rows)
+    assert missing_rows(db, 'ethusdt', '1m') == []
+
+    count = db.execute('SELECT COUNT(*) FROM indicators').fetchone()[0]
+    assert count == 1000 - 25
+
+    # 预热后的缺口值与整段重算一致
+    full = dict((r['open_time'], r) for r in query_history(db, 'ethusdt', '1m', start_time=0, limit=2000))
+    backfill(db, 'ethusdt', '1m')
+    recomputed = query_history(db, 'ethusdt', '1m', limit=1)[0]
+    assert full[recomputed['open_time']]['ema_26'] == pytest.approx(recomputed['ema_26'], rel=1e-9)
+
+
+def test_query_history_range(db):
+    with db:
+        db.executemany(INDICATOR_UPSERT_SQL, [
+            make_row('ethusdt', '1h', t, {'rsi': float(t)}) for t in range(10)
+        ])
+    rows = query_history(db, 'ETHUSDT', '1h', start_time=3, end_time=6)
+    assert [r['open_time'] for r in rows] == [3, 4, 5, 6]
+    assert [r['open_time'] for r in query_history(db, 'ethusdt', '1h', limit=2)] == [8, 9]
+    assert rows[0]['ema_12'] is None
+
+
+def test_api_on_database_without_indicators_table(tmp_path, monkeypatch):
+    import cloud_api_server
+
+    # 旧库：只有K线表，还没运行 migrations 建指标表
+    path = str(tmp_path / 'old.db')
+    db = connect(path)
+    db.execute('CREATE TABLE klines (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, interval TEXT, open_time INTEGER)')
+    db.commit()
+    assert query_history(db, 'ethusdt', '1h') == []
+    db.close()
+
+    monkeypatch.setattr(cloud_api_server, 'DB_PATH', path)
+    response = cloud_api_server.app.test_client().get('/api/indicators/ethusdt/1h')
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 0 and response.get_json()['data'] == []
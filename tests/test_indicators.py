@@ -0,0 +1,162 @@
+"""
+测试向量化指标与逐根循环参考实现的数值等价性
+"""
+import numpy as np
+import pytest
+
+from indicators import TechnicalIndicators as TI
+from reference_indicators import ReferenceIndicators as Ref
+
+
+def _candles(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 2500 + np.cumsum(rng.normal(0, 5, n))
+    high = close + rng.uniform(0, 4, n)
+    low = close - rng.uniform(0, 4, n)
+    return high.tolist(), low.tolist(), close.tolist()
+
+
+@pytest.mark.parametrize('n', [30, 200, 5000])
+def test_series_match_reference(n):
+    high, low, close = _candles(n)
+
+    for period in (1, 12, 26):
+        assert np.allclose(TI.ema_series(close, period), Ref.calculate_ema(close, period), rtol=1e-10)
+
+    # 参考实现只返回最后一个值，逐个前缀比较序列
+    rsi = TI.rsi_series(close, 14)
+    atr = TI.atr_series(high, low, close, 14)
+    for end in (15, n // 2, n):
+        assert rsi[end - 15] == pytest.approx(Ref.calculate_rsi(close[:end]), abs=0.01)
+        assert atr[end - 15] == pytest.approx(Ref.calculate_atr(high[:end], low[:end], close[:end]), abs=1e-4)
+
+    bands = TI.bollinger_series(close, 20)
+    ref = Ref.calculate_bollinger_bands(close)
+    assert bands['upper'][-1] == pytest.approx(ref['upper'], abs=0.01)
+    assert bands['lower'][-1] == pytest.approx(ref['lower'], abs=0.01)
+
+
+def test_hand_checked_values():
+    # 线性上涨 p[t] = t：以 SMA 起始的 EMA(n) 恰好滞后 (n-1)/2，EMA12 = t-5.5，EMA26 = t-12.5
+    ramp = [float(i) for i in range(60)]
+    assert TI.calculate_ema(ramp, 12)[-1] == pytest.approx(53.5)
+    assert TI.calculate_ema(ramp, 26)[-1] == pytest.approx(46.5)
+    # 同一根K线的快慢线相减：MACD = 7，信号线 = 7，柱状图 = 0
+    # （原实现错位取 28 根之前的快线，上涨行情里得到 -21）
+    macd = TI.calculate_macd(ramp)
+    assert (macd['macd'], macd['signal'], macd['histogram']) == pytest.approx((7.0, 7.0, 0.0))
+    assert TI.macd_series(ramp)['macd'] == pytest.approx(np.full(35, 7.0))
+    # 只涨不跌 RSI = 100，只跌不涨 RSI = 0
+    assert TI.calculate_rsi(ramp) == 100.0
+    assert TI.calculate_rsi(ramp[::-1]) == 0.0
+    # 每根K线的真实波幅都是 2（高低价差 2，收盘价每根 +1 仍在区间内）
+    assert TI.calculate_atr([p + 1 for p in ramp], [p - 1 for p in ramp], ramp) == pytest.approx(2.0)
+
+
+def test_long_series_stays_stable():
+    # 100万根K线跨越多个计算块，结果应与逐根循环一致
+    _, _, close = _candles(1_000_000)
+    assert np.allclose(TI.ema_series(close, 12)[-1000:], Ref.calculate_ema(close, 12)[-1000:], rtol=1e-9)
+
+
+def test_all_indicators_match_reference():
+    high, low, close = _candles(200)
+    klines = [(i, c, h, l, c, 1.0) for i, (h, l, c) in enumerate(zip(high, low, close))]
+
+    result = TI.calculate_all_indicators(klines)
+    expected = Ref.calculate_all_indicators(klines)
+
+    assert result['ema_12'] == pytest.approx(expected['ema_12'], abs=0.01)
+    assert result['ema_26'] == pytest.approx(expected['ema_26'], abs=0.01)
+    assert result['rsi'] == pytest.approx(expected['rsi'], abs=0.01)
+    assert result['atr'] == pytest.approx(expected['atr'], abs=1e-4)
+    for key in ('macd', 'signal', 'histogram'):
+        assert result['macd'][key] == pytest.approx(expected['macd'][key], abs=1e-4)
+    assert result['macd']['trend'] == expected['macd']['trend']
+    assert result['bollinger']['position'] == expected['bollinger']['position']
+
+
+def test_rolling_extremes_and_channels():
+    high, low, close = (np.array(x) for x in _candles(500))
+    windows_high = np.lib.stride_tricks.sliding_window_view(high, 20)
+    windows_low = np.lib.stride_tricks.sliding_window_view(low, 20)
+
+    donchian = TI.donchian_series(high, low, 20)
+    assert np.array_equal(donchian['upper'], windows_high.max(axis=1))
+    assert np.array_equal(donchian['lower'], windows_low.min(axis=1))
+
+    stoch = TI.stochastic_series(high, low, close, 14, 3)
+    hh = np.lib.stride_tricks.sliding_window_view(high, 14).max(axis=1)
+    ll = np.lib.stride_tricks.sliding_window_view(low, 14).min(axis=1)
+    k = (close[13:] - ll) / (hh - ll) * 100
+    assert np.allclose(stoch['k'], k)
+    assert np.allclose(stoch['d'], np.convolve(k, np.ones(3) / 3, mode='valid'))
+
+    keltner = TI.keltner_series(high, low, close)
+    assert keltner['middle'][-1] == pytest.approx(TI.ema_series(close, 20)[-1])
+    assert keltner['upper'][-1] - keltner['middle'][-1] == pytest.approx(2 * TI.atr_series(high, low, close, 10)[-1])
+
+
+def test_volume_indicators():
+    high, low, close = (np.array(x) for x in _candles(300))
+    volume = np.random.default_rng(1).uniform(1, 10, 300)
+    typical = (high + low + close) / 3
+
+    # 两个时段：第二段从第100根开始重新累计
+    open_time = np.arange(300) * 60000 + (np.arange(300) >= 100) * 86_400_000
+    vwap = TI.vwap_series(high, low, close, volume, open_time)
+    assert vwap[99] == pytest.approx(np.sum(typical[:100] * volume[:100]) / np.sum(volume[:100]))
+    assert vwap[-1] == pytest.approx(np.sum(typical[100:] * volume[100:]) / np.sum(volume[100:]))
+    assert TI.anchored_vwap_series(high, low, close, volume, 250)[-1] == pytest.approx(
+        np.sum(typical[250:] * volume[250:]) / np.sum(volume[250:]))
+
+    obv = TI.obv_series(close, volume)
+    expected = [0.0]
+    for i in range(1, 300):
+        step = volume[i] if close[i] > close[i - 1] else -volume[i] if close[i] < close[i - 1] else 0.0
+        expected.append(expected[-1] + step)
+    assert np.allclose(obv, expected)
+
+    z = TI.zscore_series(volume, 20)
+    window = volume[-20:]
+    assert z[-1] == pytest.approx((window[-1] - window.mean()) / window.std())
+
+
+def test_dmi_and_supertrend():
+    high, low, close = (np.array(x) for x in _candles(400))
+    dmi = TI.dmi_series(high, low, close, 14)
+    assert len(dmi['plus_di']) == 400 - 14
+    assert len(dmi['adx']) == 400 - 27
+    assert np.all((dmi['adx'] >= 0) & (dmi['adx'] <= 100))
+
+    st = TI.supertrend_series(high, low, close, 10, 3.0)
+    assert len(st['supertrend']) == 400 - 10
+    # 多头时止损线在收盘价下方，空头时在上方
+    tail = close[10:]
+    assert np.all(np.where(st['direction'] > 0, st['supertrend'] <= tail, st['supertrend'] >= tail))
+
+
+def test_extended_indicators_in_all_indicators():
+    high, low, close = _candles(200)
+    klines = [(i * 60000, c, h, l, c, 2.0, 1.0) for i, (h, l, c) in enumerate(zip(high, low, close))]
+    result = TI.calculate_all_indicators(klines, extended=True)
+    assert set(result['extended']) == {'vwap', 'stochastic', 'adx', 'obv', 'keltner', 'donchian', 'supertrend', 'zscore'}
+    assert 'extended' not in TI.calculate_all_indicators(klines)
+    assert TI.calculate_extended_indicators(klines[:10]).keys() == {'vwap', 'obv'}
+
+
+def test_extended_indicators_skip_missing_taker_volume():
+    high, low, close = _candles(200)
+    klines = [(i * 60000, c, h, l, c, 2.0 + i % 5, 1.0 + i % 3 if i % 7 else None)
+              for i, (h, l, c) in enumerate(zip(high, low, close))]
+    zscore = TI.calculate_extended_indicators(klines)['zscore']
+    # 缺失的行不参与，也不会被当作 0.5 填入
+    known = [k for k in klines if k[6] is not None]
+    ratio = np.array([k[6] / k[5] for k in known])
+    window = ratio[-20:]
+    assert zscore['taker_buy_ratio'] == round(float((window[-1] - window.mean()) / window.std()), 2)
+    # 最新一根没有主动买入量时该项为 None，其余指标照常计算
+    klines[-1] = klines[-1][:6] + (None,)
+    zscore = TI.calculate_extended_indicators(klines)['zscore']
+    assert zscore['taker_buy_ratio'] is None
+    assert 'volume' in zscore
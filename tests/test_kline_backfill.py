@@ -0,0 +1,94 @@
+"""
+测试K线增量回补：冷启动只取默认根数，中断后从断点继续（完整的页不再请求），已是最新时不发请求
+"""
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import binance_collector
+from binance_collector import DEFAULT_LOOKBACK, INTERVAL_MS, MAX_KLINES_PER_REQUEST, BinanceDataCollector
+from database import connect
+
+NOW = 1700000000000 + 30000     # 某一分钟的中间
+STEP = INTERVAL_MS['1m']
+
+
+class _Writer:
+    """直接写库，代替后台写线程"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def submit_many(self, sql, rows):
+        with self.db:
+            self.db.executemany(sql, rows)
+
+
+class _Binance:
+    """假的 /api/v3/klines：按 startTime/endTime/limit 返回K线，fail_after 次请求之后报错"""
+
+    def __init__(self, fail_after=None):
+        self.requests = []
+        self.fail_after = fail_after
+
+    def get(self, url, params=None, **kwargs):
+        if self.fail_after is not None and len(self.requests) >= self.fail_after:
+            raise requests.ConnectionError('connection reset')
+        self.requests.append(params)
+        step = INTERVAL_MS[params['interval']]
+        opens = range(params['startTime'], params['endTime'] + 1, step)
+        klines = [[t, '1', '2', '0.5', '1.5', '10', t + step - 1, '15', 3, '4', '6', '0']
+                  for t in list(opens)[:params['limit']]]
+        return SimpleNamespace(status_code=200, json=lambda: klines)
+
+
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    db = connect(str(tmp_path / 'klines.db'))
+    BinanceDataCollector.init_database(SimpleNamespace(db=db))
+    monkeypatch.setattr(binance_collector, 'time', SimpleNamespace(time=lambda: NOW / 1000, sleep=lambda s: None))
+    yield SimpleNamespace(db=db, symbol='ethusdt', writer=_Writer(db))
+    db.close()
+
+
+def _backfill(collector, monkeypatch, binance, backfill_days=None):
+    monkeypatch.setattr(requests, 'get', binance.get)
+    return BinanceDataCollector.backfill_interval(collector, '1m', backfill_days)
+
+
+def _open_times(collector):
+    return [row[0] for row in collector.db.execute(
+        "SELECT open_time FROM klines WHERE symbol = 'ethusdt' AND interval = '1m' ORDER BY open_time")]
+
+
+def test_fresh_database_fetches_default_lookback(collector, monkeypatch):
+    binance = _Binance()
+    current_open = NOW // STEP * STEP
+    assert _backfill(collector, monkeypatch, binance) == DEFAULT_LOOKBACK['1m']
+    assert len(binance.requests) == 1
+    assert binance.requests[0]['startTime'] == current_open - DEFAULT_LOOKBACK['1m'] * STEP
+    # 未收盘的当前K线不写入
+    assert _open_times(collector)[-1] == current_open - STEP
+
+
+def test_resume_after_partial_run(collector, monkeypatch):
+    # 深度回补 1 天 = 1440 根，两页；第二页请求失败
+    with pytest.raises(requests.ConnectionError):
+        _backfill(collector, monkeypatch, _Binance(fail_after=1), backfill_days=1)
+    assert len(_open_times(collector)) == MAX_KLINES_PER_REQUEST
+
+    # 重跑：已完整的第一页跳过，只请求剩下的一页
+    binance = _Binance()
+    assert _backfill(collector, monkeypatch, binance, backfill_days=1) == 1440 - MAX_KLINES_PER_REQUEST
+    assert len(binance.requests) == 1
+    open_times = _open_times(collector)
+    assert len(open_times) == 1440 and open_times == sorted(set(open_times))
+    assert open_times[-1] - open_times[0] == 1439 * STEP
+
+
+def test_up_to_date_database_sends_no_requests(collector, monkeypatch):
+    _backfill(collector, monkeypatch, _Binance())
+    binance = _Binance()
+    assert _backfill(collector, monkeypatch, binance) == 0
+    assert binance.requests == []
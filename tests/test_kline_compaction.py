@@ -0,0 +1,72 @@
+"""
+测试K线去重与幂等写入：旧库重复K线原地压缩，唯一键建立后重复写入变为更新
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from binance_collector import BinanceDataCollector, KLINE_UPSERT_SQL
+from compact_klines import compact_klines
+from database import connect
+import migrations
+from migrations import migrate
+
+
+def _kline(symbol, interval, open_time, close):
+    return (symbol, interval, open_time, close, close, close, close, 1.0,
+            open_time + 59999, close, 10, 0.5, close / 2)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = connect(str(tmp_path / 'klines.db'))
+    BinanceDataCollector.init_database(SimpleNamespace(db=db))
+    yield db
+    db.close()
+
+
+def _insert_duplicates(db):
+    # 模拟升级前的旧库：没有唯一约束，同一根K线被多次写入
+    db.execute('DROP INDEX uq_klines_symbol_interval_open_time')
+    sql = '''INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume, close_time,
+        quote_volume, trades_count, taker_buy_volume, taker_buy_quote_volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+    for restart in range(3):
+        for i in range(50):
+            db.execute(sql, _kline('ethusdt', '1m', i * 60000, 100.0 + restart))
+            db.execute(sql, _kline('btcusdt', '1h', i * 3600000, 200.0 + restart))
+    db.commit()
+
+
+def test_compaction_keeps_latest_row_per_candle(db):
+    _insert_duplicates(db)
+
+    removed = compact_klines(db, batch_size=7, verbose=False)
+
+    assert removed == 200
+    rows = db.execute('SELECT symbol, interval, COUNT(*), MIN(close), MAX(close) FROM klines GROUP BY symbol, interval').fetchall()
+    assert sorted(rows) == [('btcusdt', '1h', 50, 202.0, 202.0), ('ethusdt', '1m', 50, 102.0, 102.0)]
+
+
+def test_migration_dedupes_then_adds_unique_key(db):
+    _insert_duplicates(db)
+
+    created = migrate(db)
+
+    assert 'uq_klines_symbol_interval_open_time' in created
+    assert db.execute('SELECT COUNT(*) FROM klines').fetchone()[0] == 100
+
+
+def test_concurrent_migration_does_not_fail(db, monkeypatch):
+    # 另一个采集器进程在本进程检查之后、建索引之前已经建好了索引
+    monkeypatch.setattr(migrations, '_index_exists', lambda db, name: False)
+    migrate(db)
+    assert db.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'uq_klines_symbol_interval_open_time'").fetchone()[0] == 1
+
+
+def test_upsert_is_idempotent(db):
+    db.executemany(KLINE_UPSERT_SQL, [_kline('solusdt', '5m', i * 300000, 10.0) for i in range(20)])
+    db.executemany(KLINE_UPSERT_SQL, [_kline('solusdt', '5m', i * 300000, 11.0) for i in range(20)])
+    db.commit()
+
+    assert db.execute('SELECT COUNT(*), MIN(close), MAX(close) FROM klines').fetchone() == (20, 11.0, 11.0)
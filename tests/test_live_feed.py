@@ -0,0 +1,115 @@
+"""
+测试实时推送：发布端合并价格事件，订阅端一份消息分发给多个连接，慢连接丢弃旧事件，SSE 先发最新状态
+"""
+import json
+import os
+import time
+
+import pytest
+
+from live_feed import LiveHub, LivePublisher, QUEUE_SIZE, format_sse
+from trade_flow import TradeFlowRegistry
+
+NOW = 1700000000000
+
+
+class _Capture(LivePublisher):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.messages = []
+
+    def send(self, event, symbol, data):
+        self.messages.append({'event': event, 'symbol': symbol, 'data': data})
+
+
+def test_publisher_coalesces_trades():
+    flows = TradeFlowRegistry()
+    publisher = _Capture(flows=flows)
+    for i in range(100):
+        flows.add('ethusdt', NOW + i * 10, 2000.0 + i, 1.0, i % 4 == 0)
+        publisher.trade('ethusdt', NOW + i * 10, 2000.0 + i, 1.0, i % 4 == 0)
+
+    # 100 笔成交合并为一条价格事件，只带最近的成交
+    assert publisher.publish() == 1
+    message = publisher.messages[0]
+    assert message['event'] == 'price' and message['data']['price'] == 2099.0
+    assert len(message['data']['trades']) == 20 and message['data']['trades'][-1][1] == 2099.0
+    assert message['data']['flow']['1m'] == 3.0
+    # 没有新成交时不再发送
+    assert publisher.publish() == 0
+
+
+def test_hub_fan_out_and_snapshot():
+    hub = LiveHub()
+    eth, everything = hub.subscribe(['ethusdt']), hub.subscribe()
+    hub.dispatch({'event': 'price', 'symbol': 'ethusdt', 'data': {'price': 1.0}})
+    hub.dispatch({'event': 'price', 'symbol': 'btcusdt', 'data': {'price': 2.0}})
+    hub.dispatch({'event': 'kline', 'symbol': 'ethusdt', 'data': {'interval': '1m', 'close': 3.0}})
+    assert eth.qsize() == 2 and everything.qsize() == 3
+
+    # 慢连接只保留最新的 QUEUE_SIZE 条
+    for i in range(QUEUE_SIZE + 10):
+        hub.dispatch({'event': 'price', 'symbol': 'ethusdt', 'data': {'price': float(i)}})
+    assert eth.qsize() == QUEUE_SIZE
+    hub.unsubscribe(eth)
+    hub.unsubscribe(everything)
+
+    # 新连接先收到每个交易对/周期的最新状态
+    stream = hub.stream(['ethusdt'], heartbeat=0.01, max_seconds=0.05)
+    assert next(stream).startswith('retry:')
+    initial = [next(stream), next(stream)]
+    assert format_sse({'event': 'price', 'symbol': 'ethusdt', 'data': {'price': float(QUEUE_SIZE + 9)}}) in initial
+    assert any(chunk.startswith('event: kline') for chunk in initial)
+    assert hub.clients() == 1
+    assert list(stream) and hub.clients() == 0
+
+
+def test_stream_limit():
+    hub = LiveHub(max_streams=2)
+    first, second = hub.stream(), hub.stream()
+    # 连接数达到上限时拒绝，不再占用 worker 线程
+    assert hub.stream() is None
+    # 还没开始读取就断开的连接也要退订
+    first.close()
+    assert hub.clients() == 1
+    third = hub.stream(heartbeat=0.01, max_seconds=0.02)
+    assert third is not None and list(third)[0].startswith('retry:')
+    second.close()
+    third.close()
+    assert hub.clients() == 0
+
+
+def test_multicast_round_trip():
+    hub = LiveHub(port=5199)
+    try:
+        hub.start()
+    except OSError as e:
+        pytest.skip(f'multicast unavailable: {e}')
+    q = hub.subscribe()
+    publisher = LivePublisher(port=5199, flows=TradeFlowRegistry())
+    publisher.kline('ethusdt', '1m', NOW, 1.0, 2.0, 0.5, 1.5, 10.0, NOW + 59999)
+    try:
+        message = q.get(timeout=2)
+    finally:
+        hub.stop()
+    assert message['event'] == 'kline' and message['data']['close'] == 1.5
+    assert json.loads(format_sse(message).split('data: ')[1])['symbol'] == 'ethusdt'
+
+
+def test_unix_socket_directory(tmp_path):
+    # 采集器和 Web 服务在不同容器：通过共享目录里的 Unix 套接字发给每个 Web 进程
+    directory = str(tmp_path / 'live')
+    hub = LiveHub(directory=directory).start()
+    q = hub.subscribe()
+    stale = os.path.join(directory, 'hub-999999.sock')
+    open(stale, 'w').close()
+    publisher = LivePublisher(directory=directory, flows=TradeFlowRegistry())
+    try:
+        publisher.kline('ethusdt', '1m', NOW, 1.0, 2.0, 0.5, 1.5, 10.0, NOW + 59999)
+        message = q.get(timeout=2)
+    finally:
+        hub.stop()
+    assert message['event'] == 'kline' and message['data']['close'] == 1.5
+    # 没有进程在收的套接字文件被清理，Web 进程停止时删除自己的套接字
+    assert publisher.sent == 1
+    assert os.listdir(directory) == []
@@ -0,0 +1,69 @@
+"""
+测试本地订单簿：快照+增量同步、缺口检测重新同步、前N档/累计深度/失衡度查询
+"""
+import time
+
+from order_book import LocalOrderBook
+
+SNAPSHOT = {
+    'lastUpdateId': 100,
+    'bids': [['99.0', '1.0'], ['98.0', '2.0'], ['97.0', '3.0']],
+    'asks': [['101.0', '1.5'], ['102.0', '2.5'], ['103.0', '3.5']],
+}
+
+
+def _event(first, last, bids=(), asks=()):
+    return {'U': first, 'u': last, 'b': list(bids), 'a': list(asks)}
+
+
+def _wait_synced(book, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not book.synced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return book.synced
+
+
+def test_snapshot_sync_replays_buffered_events():
+    book = LocalOrderBook('ethusdt', fetch_snapshot=lambda: SNAPSHOT)
+
+    book.process(_event(95, 100, bids=[['99.0', '9.0']]))      # 快照已包含，丢弃
+    book.process(_event(101, 103, bids=[['99.5', '4.0']]))     # 跨越 lastUpdateId+1
+    assert _wait_synced(book)
+
+    assert book.process(_event(104, 105, asks=[['101.0', '0']]))  # 删除最优卖价
+    assert book.last_update_id == 105
+    assert book.best_bid() == (99.5, 4.0)
+    assert book.best_ask() == (102.0, 2.5)
+    assert book.bids[99.0] == 1.0
+
+
+def test_gap_triggers_resync():
+    snapshots = [SNAPSHOT, {'lastUpdateId': 300, 'bids': [['90.0', '1.0']], 'asks': [['91.0', '1.0']]}]
+    book = LocalOrderBook('ethusdt', fetch_snapshot=lambda: snapshots.pop(0))
+    book.process(_event(101, 101))
+    assert _wait_synced(book)
+
+    assert not book.process(_event(250, 301))   # 缺口：期望 U=102
+    assert _wait_synced(book)
+    assert book.resyncs == 1
+    assert book.last_update_id == 301
+    assert book.best_bid() == (90.0, 1.0)
+
+
+def test_queries():
+    book = LocalOrderBook('ethusdt')
+    with book.lock:
+        assert book.load_snapshot(SNAPSHOT)
+
+    top = book.top(2)
+    assert top['bids'] == [[99.0, 1.0], [98.0, 2.0]]
+    assert top['asks'] == [[101.0, 1.5], [102.0, 2.5]]
+
+    cumulative = book.cumulative_depth(3)
+    assert cumulative['bids'][-1] == [97.0, 6.0]
+    assert cumulative['asks'][-1] == [103.0, 7.5]
+
+    assert book.mid_price() == 100.0
+    assert book.spread() == 2.0
+    assert book.depth_within(0.015) == (1.0, 1.5)
+    assert book.imbalance(3) == (6.0 - 7.5) / 13.5
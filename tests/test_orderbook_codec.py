@@ -0,0 +1,52 @@
+"""
+测试订单簿二进制存储：打包/解包往返、旧JSON行分批迁移
+"""
+import json
+import sqlite3
+
+from migrations import migrate
+from orderbook_codec import LEGACY_INDEX, decode_row, encode, pack_levels, unpack_levels
+
+BIDS = [[2500.5, 1.25], [2500.0, 3.0]]
+ASKS = [[2501.0, 0.5], [2502.5, 2.0]]
+
+
+def test_pack_roundtrip_and_totals():
+    blob = pack_levels(BIDS)
+    assert len(blob) == 4 * 8
+    assert unpack_levels(blob) == BIDS
+
+    bids_blob, asks_blob, bid_total, ask_total, imbalance = encode(BIDS, ASKS)
+    assert unpack_levels(asks_blob) == ASKS
+    assert (bid_total, ask_total) == (4.25, 2.5)
+    assert imbalance == (4.25 - 2.5) / 6.75
+
+    row = decode_row({'id': 1, 'bids_blob': bids_blob, 'asks_blob': asks_blob, 'bids': None, 'asks': None})
+    assert row['bids'] == BIDS and row['asks'] == ASKS
+
+
+def test_legacy_json_rows_are_migrated(tmp_path):
+    db = sqlite3.connect(str(tmp_path / 'legacy.db'))
+    db.execute('''
+        CREATE TABLE orderbook (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT,
+                                timestamp INTEGER, bids TEXT, asks TEXT)
+    ''')
+    # 旧格式：价格和数量都是字符串
+    legacy_bids = json.dumps([[str(p), str(q)] for p, q in BIDS])
+    legacy_asks = json.dumps([[str(p), str(q)] for p, q in ASKS])
+    db.executemany('INSERT INTO orderbook (symbol, timestamp, bids, asks) VALUES (?, ?, ?, ?)',
+                   [('ethusdt', i, legacy_bids, legacy_asks) for i in range(25)])
+    db.execute("INSERT INTO orderbook (symbol, timestamp, bids, asks) VALUES ('ethusdt', 99, 'oops', '[]')")
+    db.commit()
+
+    migrate(db)
+
+    rows = db.execute('SELECT bids, asks, bids_blob, bid_total, ask_total FROM orderbook ORDER BY id').fetchall()
+    assert all(r[0] is None and r[1] is None for r in rows)
+    assert unpack_levels(rows[0][2]) == BIDS
+    assert rows[0][3:] == (4.25, 2.5)
+    assert rows[-1][2:] == (None, None, None)
+
+    # 转换完成后进度索引被删除，再次迁移不做任何事
+    assert db.execute("SELECT 1 FROM sqlite_master WHERE name=?", (LEGACY_INDEX,)).fetchone() is None
+    assert migrate(db) == []
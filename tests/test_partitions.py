@@ -0,0 +1,88 @@
+"""
+测试按天分区存储：写入路由到对应日期的文件，读取只打开相交的分区，整天删除/归档，汇总任务把过期数据移入分区
+"""
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from binance_collector import BinanceDataCollector
+from database import connect, connect_reader
+from db_writer import BatchWriter
+from migrations import migrate
+from partitions import DAY_MS, PartitionStore, day_start
+from rollup_job import TradeRollupJob
+
+START = day_start('2024-03-01')
+
+
+def _trades(n, days, seed=3):
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(rng.integers(START, START + days * DAY_MS, n))
+    return [(i + 1, t, 100 + i * 0.01, float(q), int(m), i) for i, (t, q, m) in
+            enumerate(zip(timestamps.tolist(), rng.exponential(1.0, n), rng.random(n) < 0.5))]
+
+
+def test_route_prune_drop(tmp_path):
+    store = PartitionStore(str(tmp_path / 'parts'))
+    trades = _trades(3000, 3)
+    assert store.insert('trades', 'ETHUSDT', trades) == len(trades)
+    # 重复写入按 id 覆盖
+    store.insert('trades', 'ethusdt', trades[:100])
+
+    days = [day for day, _ in store.partitions('trades', 'ethusdt')]
+    assert days == ['2024-03-01', '2024-03-02', '2024-03-03']
+
+    # 只有与时间范围相交的分区参与查询
+    start, end = START + DAY_MS + 3600 * 1000, START + 2 * DAY_MS + 60 * 1000
+    assert [day for day, _ in store.partitions('trades', 'ethusdt', start, end)] == ['2024-03-02', '2024-03-03']
+    rows = list(store.query('trades', 'ethusdt', start, end))
+    assert rows == [t for t in trades if start <= t[1] < end]
+
+    # 整天删除/归档是文件操作
+    assert store.drop('trades', 'ethusdt', START + DAY_MS + 1) == ['2024-03-01']
+    archived = store.archive('trades', 'ethusdt', START + 2 * DAY_MS, str(tmp_path / 'cold'))
+    assert archived == ['2024-03-02']
+    assert os.path.exists(tmp_path / 'cold' / 'trades' / 'ethusdt' / '2024-03-02.db')
+    assert [day for day, _ in store.partitions('trades', 'ethusdt')] == ['2024-03-03']
+    store.close()
+
+
+def test_rollup_job_moves_to_partitions(tmp_path):
+    path = str(tmp_path / 'hot.db')
+    db = connect(path)
+    BinanceDataCollector.init_database(SimpleNamespace(db=db, symbol='ethusdt'))
+    migrate(db)
+    trades = _trades(4000, 2)
+    snapshots = [(t, b'\x00' * 16, b'\x01' * 16, 1.0, 2.0, -0.3) for t in range(START, START + 2 * DAY_MS, 600000)]
+    with db:
+        db.executemany('INSERT INTO trades (id, symbol, timestamp, price, quantity, is_buyer_maker, trade_id) '
+                       'VALUES (?, \'ethusdt\', ?, ?, ?, ?, ?)', trades)
+        db.executemany('INSERT INTO orderbook (symbol, timestamp, bids_blob, asks_blob, bid_total, ask_total, '
+                       'imbalance) VALUES (\'ethusdt\', ?, ?, ?, ?, ?, ?)', snapshots)
+
+    store = PartitionStore(str(tmp_path / 'parts'))
+    writer = BatchWriter(path, report_interval=0).start()
+    job = TradeRollupJob(path, retention_days=1, writer=writer, partitions=store)
+    now = START + 2 * DAY_MS
+    reader = connect_reader(path)
+    job.run_once(reader, now)
+
+    # 保留期之前的行已移入分区，主库 + 分区合起来与原始数据一致
+    assert db.execute('SELECT MIN(timestamp) FROM trades').fetchone()[0] >= START + DAY_MS
+    assert db.execute('SELECT MIN(timestamp) FROM orderbook').fetchone()[0] >= START + DAY_MS
+    assert [day for day, _ in store.partitions('trades', 'ethusdt')] == ['2024-03-01']
+    merged = list(store.query('trades', 'ethusdt', START, now, hot_db=reader))
+    assert merged == trades
+    books = list(store.query('orderbook', 'ethusdt', START, now, fields=['timestamp', 'imbalance'], hot_db=reader))
+    assert [row[0] for row in books] == [row[0] for row in snapshots]
+
+    # 汇总表仍覆盖全部已结束分钟的成交；没有新数据时不再移动
+    assert db.execute('SELECT SUM(buy_count + sell_count) FROM trades_1m').fetchone()[0] == \
+        sum(1 for t in trades if t[1] < now - 60000)
+    assert job.run_once(reader, now) == (0, 0)
+
+    reader.close()
+    writer.stop()
+    store.close()
+    db.close()
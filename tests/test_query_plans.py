@@ -0,0 +1,135 @@
+"""
+查询计划回归测试 - 热点查询必须走索引，不能退化为全表扫描（SCAN）
+表结构直接使用采集器的 init_database 创建，索引由 migrations 创建；
+SQL 取自生产模块的常量，按参数拼接的 API 查询则通过 test client 调用接口，记录实际执行的语句
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import cloud_api_server
+from ai_analyzer import KLINES_SQL, LATEST_SQL, ORDERBOOK_SQL, RECENT_KLINES_SQL
+from bar_aggregator import TRADES_PAGE_SQL
+from batch_indicators import WINDOW_BRANCH_SQL
+from binance_collector import BinanceDataCollector
+from database import connect
+from futures_collector import FuturesDataCollector
+from multi_web_ui import LAST_PRICE_SQL, PRICE_BEFORE_SQL, RECENT_TRADES_SQL
+from replication import ID_CHANGES_SQL, SEQ_CHANGES_SQL
+from rollup_job import DELETE_SQL, DELETE_TRADES_SQL, MOVE_SQL, RANGE_SQL
+from trade_rollup import MINUTES_SQL, RAW_TOTALS_SQL, ROLLUP_TOTALS_SQL
+
+NOW = 1700000000000
+SYMBOL_WHERE = 'symbol = ? AND '
+
+# (说明, SQL, 参数)
+HOT_QUERIES = [
+    # ai_analyzer.AIAnalyzer.get_recent_data
+    ('analyzer klines for indicators', KLINES_SQL, ('ethusdt', 200)),
+    ('analyzer recent klines', RECENT_KLINES_SQL, ('ethusdt', NOW)),
+    ('analyzer orderbook', ORDERBOOK_SQL, ('ethusdt', NOW)),
+] + [
+    (f'analyzer {table}', sql, ('ethusdt',)) for table, sql in LATEST_SQL.items()
+] + [
+    # multi_web_ui
+    ('overview recent trades', RECENT_TRADES_SQL, ('btcusdt',)),
+    ('compare last price', LAST_PRICE_SQL, ('btcusdt',)),
+    ('compare old price', PRICE_BEFORE_SQL, ('btcusdt', NOW)),
+    # trade_rollup.flow_totals / load_minutes
+    ('flow rollup window', ROLLUP_TOTALS_SQL.format(where=SYMBOL_WHERE), ('ethusdt', NOW)),
+    ('flow raw tail', RAW_TOTALS_SQL.format(where=SYMBOL_WHERE), ('ethusdt', NOW)),
+    ('flow rollup minutes', MINUTES_SQL, ('ethusdt', NOW)),
+    # rollup_job
+    ('rollup trades range', RANGE_SQL, ('ethusdt', NOW, NOW + 3600000)),
+    ('rollup archive delete batch', DELETE_TRADES_SQL, ('ethusdt', NOW, NOW + 3600000)),
+    ('rollup orderbook move', MOVE_SQL['orderbook'], ('ethusdt', NOW, NOW + 3600000)),
+    ('rollup orderbook delete batch', DELETE_SQL['orderbook'], ('ethusdt', NOW, NOW + 3600000)),
+    # replication.changes（id 表按主键、原地更新的表按 change_seq）
+    ('replication trades changes', ID_CHANGES_SQL.format(table='trades'), (1000, 50000)),
+    ('replication klines changes', SEQ_CHANGES_SQL.format(table='klines'), (1000, 50000)),
+    # bar_aggregator
+    ('bar replay trades page', TRADES_PAGE_SQL, ('ethusdt', NOW, 0, NOW + 3600000, 500000)),
+    # batch_indicators.load_windows
+    ('batch indicator windows', ' UNION ALL '.join([WINDOW_BRANCH_SQL] * 2),
+     ('ethusdt', '1h', 200, 'btcusdt', '4h', 200)),
+]
+
+# (说明, cloud_api_server 接口)：查询按参数拼接，检查接口实际执行的每条 SELECT
+API_REQUESTS = [
+    ('api trades range', f'/api/trades/ethusdt?start_time={NOW - 3600000}&end_time={NOW}'),
+    ('api klines', f'/api/klines/ethusdt/1h?start_time={NOW}'),
+    ('api funding history', '/api/futures/funding_rate/ethusdt'),
+    ('api open interest history', '/api/futures/open_interest/ethusdt'),
+    ('api long/short history', '/api/futures/long_short_ratio/ethusdt'),
+    ('api export orderbook', '/api/export/orderbook?symbol=ethusdt'),
+    ('api indicators range', f'/api/indicators/ethusdt/1h?start_time={NOW - 3600000}&end_time={NOW}'),
+    ('api indicators latest', '/api/indicators/ethusdt/1h'),
+    # export_stream.ExportPage（键集分页：定位本页最后一行、判断是否还有下一页、按键读取）
+    ('api export trades pages', f'/api/export/trades/stream?symbol=ethusdt&start_time={NOW}'
+                                f'&end_time={NOW + 3600000}&limit=1'),
+    ('api export klines pages', f'/api/export/klines/stream?symbol=ethusdt&interval=1h&limit=1'),
+]
+
+
+def _assert_indexed(db, name, sql, params=()):
+    plan = [row[3] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+    # 'SCAN (subquery-N)' 是读取子查询协程的结果，不是扫表
+    scans = [step for step in plan if step.startswith('SCAN') and not step.startswith('SCAN (subquery')]
+    sorts = [step for step in plan if 'TEMP B-TREE' in step]
+    assert not scans, f'{name} falls back to a table scan: {plan}'
+    assert not sorts, f'{name} sorts in a temp b-tree instead of reading the index in order: {plan}'
+
+
+@pytest.fixture(scope='module')
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('plans') / 'plans.db')
+    db = connect(path)
+    fake = SimpleNamespace(db=db, symbol='ETHUSDT')
+    BinanceDataCollector.init_database(fake)
+    FuturesDataCollector.init_database(fake)
+    # 几行数据让导出分页走到"还有下一页"的分支
+    with db:
+        for i in range(3):
+            db.execute('INSERT INTO trades (symbol, price, quantity, timestamp, is_buyer_maker, trade_id) '
+                       'VALUES (?, ?, ?, ?, ?, ?)', ('ethusdt', 1.0, 1.0, NOW + i, 0, i))
+            db.execute('INSERT INTO klines (symbol, interval, open_time, close_time, open, high, low, close, volume) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', ('ethusdt', '1h', NOW + i * 3600000,
+                                                              NOW + (i + 1) * 3600000 - 1, 1, 1, 1, 1, 1))
+    db.close()
+    return path
+
+
+@pytest.fixture(scope='module')
+def db(db_path):
+    db = connect(db_path)
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize('name,sql,params', HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_index(db, name, sql, params):
+    _assert_indexed(db, name, sql, params)
+
+
+@pytest.mark.parametrize('name,url', API_REQUESTS, ids=[r[0] for r in API_REQUESTS])
+def test_api_queries_use_index(db, db_path, monkeypatch, name, url):
+    statements = []
+    connect_reader = cloud_api_server.connect_reader
+
+    def traced(path=None, **kwargs):
+        reader = connect_reader(db_path, **kwargs)
+        reader.set_trace_callback(statements.append)
+        return reader
+
+    monkeypatch.setattr(cloud_api_server, 'connect_reader', traced)
+    response = cloud_api_server.app.test_client().get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    response.get_data()
+
+    # 查表是否存在（sqlite_master）不是数据表查询
+    selects = [sql for sql in statements
+               if sql.lstrip().upper().startswith(('SELECT', 'WITH')) and 'sqlite_master' not in sql]
+    assert selects, f'{name} ran no queries'
+    for sql in selects:
+        _assert_indexed(db, name, sql)
@@ -0,0 +1,115 @@
+"""
+测试增量复制：云端按高水位分批返回新行，本地批量写入后与云端一致；再次同步只拉取新数据，
+原地更新的K线和事后补采的旧K线都按变更序号被重新取回
+"""
+from types import SimpleNamespace
+
+from binance_collector import BinanceDataCollector
+import replication
+from database import connect, connect_reader
+from replication import (advance, apply, changes, ensure_change_tracking, load_state, prepare_local,
+                         start_position, tables_info)
+
+NOW = 1700000000000
+
+
+def _sync(server, local, batch_size):
+    """与 local_api_client.sync_database 相同的流程，直接调用 changes 代替 HTTP"""
+    info = tables_info(server)
+    prepare_local(local, info)
+    state = load_state(local)
+    synced = {}
+    for item in info:
+        table = item['table']
+        after = start_position(table, state)
+        synced[table] = 0
+        while True:
+            batch = changes(server, table, after, batch_size)
+            synced[table] += apply(local, batch)
+            advance(local, state, table, batch)
+            if batch['next'] is None:
+                break
+            after = batch['next']
+    return synced
+
+
+def _dump(db, table):
+    return db.execute(f'SELECT * FROM {table} ORDER BY id').fetchall()
+
+
+def test_incremental_sync(tmp_path):
+    server = connect(str(tmp_path / 'cloud.db'))
+    BinanceDataCollector.init_database(SimpleNamespace(db=server, symbol='ethusdt'))
+    with server:
+        server.executemany('INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker, trade_id) '
+                           "VALUES ('ethusdt', ?, 100.0, 1.0, 0, ?)", [(NOW + i, i) for i in range(250)])
+        server.executemany('INSERT INTO orderbook (symbol, timestamp, bids_blob, asks_blob, bid_total, ask_total, '
+                           "imbalance) VALUES ('ethusdt', ?, ?, ?, 1.0, 2.0, 0.1)",
+                           [(NOW + i, bytes([i, 0, 255]), b'\x00\x01', ) for i in range(20)])
+        server.executemany('INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume, '
+                           "close_time) VALUES ('ethusdt', '1m', ?, 1, 1, 1, 1, 1, ?)",
+                           [(NOW + i * 60000, NOW + i * 60000 + 59999) for i in range(30)])
+
+    reader = connect_reader(str(tmp_path / 'cloud.db'))
+    local = connect(str(tmp_path / 'local.db'))
+    synced = _sync(reader, local, batch_size=64)
+    assert synced['trades'] == 250 and synced['orderbook'] == 20 and synced['klines'] == 30
+    for table in ('trades', 'orderbook', 'klines'):
+        assert _dump(local, table) == _dump(server, table)
+
+    # 第二次同步：只追加的表只拉取新行；原地更新的K线只拉取更新过的那一根
+    with server:
+        server.execute('INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker, trade_id) '
+                       "VALUES ('ethusdt', ?, 101.0, 2.0, 1, 999)", (NOW + 1000,))
+        server.execute("UPDATE klines SET close = 2, volume = 5 WHERE open_time = ?", (NOW + 29 * 60000,))
+    synced = _sync(reader, local, batch_size=64)
+    assert (synced['trades'], synced['orderbook'], synced['klines']) == (1, 0, 1)
+    for table in ('trades', 'orderbook', 'klines'):
+        assert _dump(local, table) == _dump(server, table)
+
+    # 补采：比已同步的K线更早的 open_time、另一个交易对的K线，以及 upsert 更新已有的K线
+    with server:
+        server.executemany('INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume, '
+                           "close_time) VALUES (?, '1m', ?, 1, 1, 1, 1, 1, ?)",
+                           [(symbol, NOW - (i + 1) * 60000, NOW - i * 60000 - 1)
+                            for symbol in ('ethusdt', 'btcusdt') for i in range(100)])
+        server.execute("INSERT INTO klines (symbol, interval, open_time, open, high, low, close, volume, close_time) "
+                       "VALUES ('ethusdt', '1m', ?, 1, 3, 1, 3, 9, ?) "
+                       "ON CONFLICT(symbol, interval, open_time) DO UPDATE SET close = excluded.close",
+                       (NOW, NOW + 59999))
+    synced = _sync(reader, local, batch_size=64)
+    assert synced['klines'] == 201
+    assert _dump(local, 'klines') == _dump(server, 'klines')
+    state = load_state(local)
+    assert start_position('klines', state) == server.execute('SELECT MAX(change_seq) FROM klines').fetchone()[0]
+
+    # 没有新变化时不再拉取
+    assert not any(_sync(reader, local, batch_size=64).values())
+
+    reader.close()
+    local.close()
+    server.close()
+
+
+def test_concurrent_change_tracking_migration(tmp_path, monkeypatch):
+    # 两个采集器同时升级同一个旧库：first 检查时还没有 change_seq，second 先加了列
+    path = str(tmp_path / 'old.db')
+    first, second = connect(path), connect(path)
+    first.execute('CREATE TABLE klines (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, open_time INTEGER)')
+    first.execute("INSERT INTO klines (symbol, open_time) VALUES ('ethusdt', 1)")
+    first.commit()
+    stale = replication._columns(first, 'klines')
+    assert ensure_change_tracking(second) == ['klines']
+
+    columns = replication._columns
+    calls = []
+
+    def checked_before(db, table):
+        calls.append(table)
+        return stale if len(calls) == 1 else columns(db, table)
+
+    monkeypatch.setattr(replication, '_columns', checked_before)
+    assert ensure_change_tracking(first) == []
+    assert first.execute('SELECT change_seq FROM klines').fetchall() == [(1,)]
+    first.close()
+    second.close()
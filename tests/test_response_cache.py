@@ -0,0 +1,123 @@
+"""
+测试响应缓存：TTL 内命中、If-None-Match 返回 304、LRU 上限、按交易对失效（含 commit 事件经 LiveHub 转发），
+持续写入时每个 TTL 内最多失效一次
+"""
+import time
+
+from flask import Flask, jsonify
+
+from db_writer import BatchWriter
+from live_feed import LiveHub, LivePublisher
+from response_cache import ResponseCache
+from trade_flow import TradeFlowRegistry
+
+
+def _app(cache, calls):
+    app = Flask(__name__)
+
+    @app.route('/api/overview')
+    @cache.cached(ttl=60, symbols=['ethusdt', 'btcusdt'])
+    def overview():
+        calls.append('overview')
+        return jsonify({'n': len(calls)})
+
+    @app.route('/api/symbol/<symbol>/price')
+    @cache.cached(ttl=0.05)
+    def price(symbol):
+        calls.append(symbol)
+        return jsonify({'symbol': symbol, 'n': len(calls)})
+
+    @app.route('/api/broken')
+    @cache.cached(ttl=60)
+    def broken():
+        calls.append('broken')
+        return jsonify({'error': 'x'}), 500
+
+    return app.test_client()
+
+
+def test_hits_etag_and_ttl():
+    cache, calls = ResponseCache(), []
+    client = _app(cache, calls)
+
+    first = client.get('/api/overview')
+    assert first.headers['X-Cache'] == 'MISS'
+    second = client.get('/api/overview')
+    assert second.headers['X-Cache'] == 'HIT' and second.data == first.data
+    assert client.get('/api/overview?x=1').headers['X-Cache'] == 'MISS'     # 参数不同是不同的缓存项
+    assert calls == ['overview', 'overview']
+
+    etag = first.headers['ETag']
+    assert client.get('/api/overview', headers={'If-None-Match': etag}).status_code == 304
+
+    # TTL 到期后重新计算；错误响应不缓存
+    client.get('/api/symbol/ethusdt/price')
+    time.sleep(0.06)
+    assert client.get('/api/symbol/ethusdt/price').headers['X-Cache'] == 'MISS'
+    client.get('/api/broken')
+    client.get('/api/broken')
+    assert calls.count('broken') == 2
+
+    stats = cache.stats()
+    assert stats['hits'] == 2 and stats['not_modified'] == 1 and stats['misses'] == 6
+
+
+def test_lru_and_symbol_invalidation():
+    cache, calls = ResponseCache(max_entries=2), []
+    client = _app(cache, calls)
+    cache.put('stale', b'{}', 'application/json', ttl=60)
+    client.get('/api/overview')
+    client.get('/api/symbol/solusdt/price')
+    assert cache.get('stale') is None and cache.stats()['entries'] == 2
+
+    # solusdt 的新数据只影响依赖 solusdt 的缓存
+    assert cache.invalidate(['SOLUSDT']) == 1
+    assert client.get('/api/overview').headers['X-Cache'] == 'HIT'
+    assert cache.invalidate(['ethusdt']) == 1
+    assert client.get('/api/overview').headers['X-Cache'] == 'MISS'
+
+
+def test_steady_commit_stream_still_hits():
+    cache, calls = ResponseCache(), []
+    client = _app(cache, calls)
+    client.get('/api/overview')
+
+    # 采集器每 0.2 秒提交一次：第一次立即失效，之后 TTL 内的提交都合并，请求继续命中
+    for _ in range(50):
+        cache.invalidate(['ethusdt'])
+        client.get('/api/overview')
+    stats = cache.stats()
+    assert calls == ['overview', 'overview']
+    assert stats['hits'] == 49 and stats['invalidations'] == 1 and stats['coalesced'] == 49
+
+    # TTL 过后的下一次提交重新生效
+    client.get('/api/symbol/ethusdt/price')
+    assert cache.invalidate(['ethusdt']) == 1
+    client.get('/api/symbol/ethusdt/price')
+    assert cache.invalidate(['ethusdt']) == 0
+    time.sleep(0.06)
+    client.get('/api/symbol/ethusdt/price')
+    assert cache.invalidate(['ethusdt']) == 1
+
+
+def test_writer_commit_invalidates_through_hub(tmp_path):
+    hub = LiveHub()
+    cache = ResponseCache(feed=lambda: hub)
+    client = _app(cache, [])
+    client.get('/api/overview')
+
+    # 写入器提交 -> 发布端 commit 事件 -> 订阅端回调（这里直接转发，不经过组播）
+    publisher = LivePublisher(flows=TradeFlowRegistry())
+    publisher.send = lambda event, symbol, data: hub.dispatch({'event': event, 'symbol': symbol, 'data': data})
+    writer = BatchWriter(str(tmp_path / 'w.db'), report_interval=0)
+    writer.add_commit_listener(publisher.committed)
+    writer.add_commit_listener(publisher.committed)
+    writer.start()
+    writer.submit('CREATE TABLE IF NOT EXISTS t (symbol TEXT, v REAL)', ())
+    writer.flush()
+    assert client.get('/api/overview').headers['X-Cache'] == 'HIT'
+    writer.submit('INSERT INTO t VALUES (?, ?)', ('btcusdt', 1.0))
+    writer.flush()
+    writer.stop()
+    assert client.get('/api/overview').headers['X-Cache'] == 'MISS'
+    assert cache.stats()['invalidations'] == 1 and cache.stats()['listening']
@@ -0,0 +1,130 @@
+"""
+测试成交汇总/归档任务：汇总行与原始成交一致，归档文件与删除的行一致，重复执行结果不变
+"""
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from database import connect, connect_reader
+from db_writer import BatchWriter
+from migrations import migrate
+from rollup_job import HOUR_MS, TradeRollupJob, read_archive
+from trade_rollup import MINUTE_MS, flow_totals
+
+START = 1700000000000 // HOUR_MS * HOUR_MS
+NOW = START + 5 * HOUR_MS + 30 * 1000
+
+
+def _trades(symbol, n, seed):
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(rng.integers(START, NOW - 10 * 1000, n))
+    prices = 100 + np.cumsum(rng.normal(0, 0.05, n))
+    quantities = rng.exponential(1.0, n)
+    sells = (rng.random(n) < 0.45).astype(int)
+    return [(symbol, t, p, q, m, i) for i, (t, p, q, m) in
+            enumerate(zip(timestamps.tolist(), prices.tolist(), quantities.tolist(), sells.tolist()))]
+
+
+@pytest.fixture
+def setup(tmp_path):
+    path = str(tmp_path / 'rollup.db')
+    db = connect(path)
+    db.execute('''
+        CREATE TABLE trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, timestamp INTEGER,
+            price REAL, quantity REAL, is_buyer_maker INTEGER, trade_id INTEGER
+        )
+    ''')
+    db.commit()
+    migrate(db)
+    trades = _trades('ethusdt', 20000, 1) + _trades('btcusdt', 8000, 2)
+    with db:
+        db.executemany('INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker, trade_id) '
+                       'VALUES (?, ?, ?, ?, ?, ?)', trades)
+    # 写线程在 TradeRollupJob 建表之后再启动
+    writer = BatchWriter(path, report_interval=0)
+    yield path, db, writer, trades
+    writer.stop()
+    db.close()
+
+
+def test_rollup_and_archive(setup, tmp_path):
+    path, db, writer, trades = setup
+    archive_dir = str(tmp_path / 'archive')
+    # 保留约 3 小时：前 2 个整小时归档
+    job = TradeRollupJob(path, retention_days=3 / 24 - 1e-6, archive_dir=archive_dir, writer=writer)
+    writer.start()
+    reader = connect_reader(path)
+    rolled, archived = job.run_once(reader, NOW)
+    # 只汇总已经结束的整分钟
+    upto = (NOW - 5000) // MINUTE_MS * MINUTE_MS
+    assert rolled == sum(1 for t in trades if t[1] < upto) < len(trades)
+
+    kept = START + 2 * HOUR_MS
+    for symbol in ('ethusdt', 'btcusdt'):
+        expected = [t for t in trades if t[0] == symbol and t[1] < upto]
+        # trades_1s 与原始成交一起过期，只比较保留期内的部分
+        for table, since in (('trades_1m', 0), ('trades_1s', kept)):
+            buy, sell, count = db.execute(f'''
+                SELECT SUM(buy_volume), SUM(sell_volume), SUM(buy_count + sell_count) FROM {table}
+                WHERE symbol = ? AND open_time >= ?
+            ''', (symbol, since)).fetchone()
+            subset = [t for t in expected if t[1] >= since]
+            assert count == len(subset)
+            assert buy == pytest.approx(sum(t[3] for t in subset if not t[4]))
+            assert sell == pytest.approx(sum(t[3] for t in subset if t[4]))
+
+    # 归档的行 = 删除的行，文件内容与原始成交一致
+    old = [t for t in trades if t[1] < kept]
+    files = sorted(glob.glob(os.path.join(archive_dir, 'trades', '*', '*', '*.csv.gz')))
+    rows = [row for f in files for row in read_archive(f)]
+    assert archived == len(rows) == len(old)
+    assert sorted(r[1:] for r in rows) == sorted((t[1], t[2], t[3], t[4], t[5]) for t in old)
+    assert db.execute('SELECT COUNT(*) FROM trades').fetchone()[0] == len(trades) - len(old)
+    assert db.execute('SELECT MIN(open_time) FROM trades_1s').fetchone()[0] >= kept
+
+    # 原始成交删除后，汇总表读取结果不变
+    totals = flow_totals(db, 'ethusdt', 5 * HOUR_MS, NOW)
+    assert totals['trades'] == sum(1 for t in trades if t[0] == 'ethusdt')
+
+    # 从水位继续：没有新数据时什么都不做
+    before = db.execute('SELECT SUM(buy_volume) FROM trades_1m').fetchone()[0]
+    assert job.run_once(reader, NOW) == (0, 0)
+    assert db.execute('SELECT SUM(buy_volume) FROM trades_1m').fetchone()[0] == pytest.approx(before)
+    reader.close()
+
+
+def test_watermark_waits_for_committed_rollup(setup, tmp_path):
+    path, db, writer, trades = setup
+    job = TradeRollupJob(path, retention_days=3 / 24 - 1e-6, archive_dir=str(tmp_path / 'archive'), writer=writer)
+    writer.start()
+    # 汇总行写不进去时：水位不前进，原始成交不归档删除
+    with db:
+        db.execute("CREATE TRIGGER reject_1m BEFORE INSERT ON trades_1m BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+    reader = connect_reader(path)
+    assert job.run_once(reader, NOW) == (0, 0)
+    assert db.execute("SELECT COUNT(*) FROM rollup_state").fetchone()[0] == 0
+    assert db.execute('SELECT COUNT(*) FROM trades').fetchone()[0] == len(trades)
+    assert db.execute('SELECT COUNT(*) FROM trades_1s').fetchone()[0] == 0
+
+    # 恢复后从原来的水位补上
+    with db:
+        db.execute('DROP TRIGGER reject_1m')
+    upto = (NOW - 5000) // MINUTE_MS * MINUTE_MS
+    rolled, archived = job.run_once(reader, NOW)
+    assert rolled == sum(1 for t in trades if t[1] < upto) and archived > 0
+    assert db.execute('SELECT SUM(buy_count + sell_count) FROM trades_1m').fetchone()[0] == rolled
+    reader.close()
+
+
+def test_retention_is_opt_in(setup):
+    path, db, writer, trades = setup
+    job = TradeRollupJob(path, writer=writer)
+    writer.start()
+    reader = connect_reader(path)
+    rolled, archived = job.run_once(reader, NOW)
+    assert rolled > 0 and archived == 0
+    assert db.execute('SELECT COUNT(*) FROM trades').fetchone()[0] == len(trades)
+    reader.close()
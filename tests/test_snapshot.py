@@ -0,0 +1,97 @@
+"""
+测试数据库快照：在线备份只包含已提交的数据，短时间内复用同一个快照，压缩文件解压后与原库一致；
+接口在后台生成快照，失败和残留的临时文件被清理
+"""
+import os
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import snapshot
+from database import connect
+from snapshot import KEEP, building, decompress, latest, request_snapshot, snapshot_path, snapshots
+
+
+def test_snapshot_is_consistent_and_reused(tmp_path):
+    path = str(tmp_path / 'live.db')
+    db = connect(path)
+    db.execute('CREATE TABLE trades (id INTEGER PRIMARY KEY, price REAL)')
+    with db:
+        db.executemany('INSERT INTO trades (price) VALUES (?)', [(float(i),) for i in range(5000)])
+
+    # 备份期间有未提交的写事务：快照里只有已提交的行
+    writer = connect(path)
+    writer.execute('BEGIN')
+    writer.execute('INSERT INTO trades (price) VALUES (-1)')
+    snapshot_dir = str(tmp_path / 'snapshots')
+    first = latest(path, snapshot_dir)
+    writer.rollback()
+    writer.close()
+
+    restored = str(tmp_path / 'restored.db')
+    decompress(first, restored)
+    copy = sqlite3.connect(restored)
+    assert copy.execute('SELECT COUNT(*), SUM(price) FROM trades').fetchone() == (5000, sum(range(5000)))
+    assert copy.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    copy.close()
+
+    # 有效期内复用；新建快照后只保留最近 KEEP 个
+    assert latest(path, snapshot_dir) == first
+    for i in range(KEEP + 1):
+        open(os.path.join(snapshot_dir, f'crypto_data_2000010{i}_000000.db.gz'), 'wb').close()
+    newest = latest(path, snapshot_dir, max_age=0)
+    assert snapshots(snapshot_dir)[0] == os.path.basename(newest)
+    assert len(snapshots(snapshot_dir)) == KEEP
+
+    # 续传按名字取快照，不能跳出快照目录
+    assert snapshot_path(os.path.basename(newest), snapshot_dir) == newest
+    assert snapshot_path('crypto_data_20000100_000000.db.gz', snapshot_dir) is None
+    assert snapshot_path('../live.db', snapshot_dir) is None
+    db.close()
+
+
+def test_background_snapshot_and_cleanup(tmp_path, monkeypatch):
+    path = str(tmp_path / 'live.db')
+    db = connect(path)
+    db.execute('CREATE TABLE trades (id INTEGER PRIMARY KEY, price REAL)')
+    with db:
+        db.executemany('INSERT INTO trades (price) VALUES (?)', [(float(i),) for i in range(1000)])
+    db.close()
+    snapshot_dir = str(tmp_path / 'snapshots')
+    os.makedirs(snapshot_dir)
+
+    # 被杀的生成过程留下的临时文件：超过 STALE_AGE 没有写入的在下次生成前删除
+    leftovers = [os.path.join(snapshot_dir, f'crypto_data_20000101_000000{ext}')
+                 for ext in ('.db', '.db.123.tmp', '.db.gz.123.tmp', '.building')]
+    for leftover in leftovers:
+        open(leftover, 'wb').close()
+        os.utime(leftover, (0, 0))
+    assert building(snapshot_dir) is None
+
+    # 请求立即返回生成中的快照名，生成在后台线程完成
+    path_now, name = request_snapshot(path, snapshot_dir)
+    assert path_now is None and name.startswith('crypto_data_')
+    assert not any(os.path.exists(leftover) for leftover in leftovers)
+    for _ in range(200):
+        if snapshot_path(name + '.db.gz', snapshot_dir):
+            break
+        time.sleep(0.05)
+    assert request_snapshot(path, snapshot_dir) == (os.path.join(snapshot_dir, name + '.db.gz'), None)
+    assert building(snapshot_dir) is None
+    assert sorted(os.listdir(snapshot_dir)) == [name + '.db.gz']
+
+    # 生成失败时不留下临时文件和未压缩副本
+    def fail(f_in, f_out, length):
+        f_out.write(b'partial')
+        raise OSError('disk full')
+    monkeypatch.setattr(snapshot.shutil, 'copyfileobj', fail)
+    with pytest.raises(OSError):
+        latest(path, snapshot_dir, max_age=0)
+    assert sorted(os.listdir(snapshot_dir)) == [name + '.db.gz']
+
+    # 剩余空间不足 2 倍数据库大小时拒绝生成
+    monkeypatch.setattr(snapshot.shutil, 'disk_usage', lambda p: SimpleNamespace(free=10))
+    with pytest.raises(RuntimeError):
+        request_snapshot(path, snapshot_dir, max_age=0)
@@ -0,0 +1,41 @@
+"""
+测试数据流统计：多线程计数、按周期计算速率、汇总行格式
+"""
+import threading
+import time
+
+from stream_stats import StreamStats
+
+
+def test_counts_from_many_threads():
+    stats = StreamStats(interval=0)
+
+    def work():
+        for _ in range(10000):
+            stats.record('ethusdt', 'trade')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats.rates()
+    assert stats.totals() == {'ethusdt': {'trade': 40000}}
+
+
+def test_status_line_reports_rates_and_latest():
+    stats = StreamStats(interval=0)
+    for _ in range(50):
+        stats.record('ethusdt', 'trade')
+    stats.record('btcusdt', 'depth', 10)
+    stats.set_latest('ethusdt', 'price', '2500.10')
+    time.sleep(0.1)
+
+    lines = stats.status_lines()
+    assert lines[0].startswith('[Status] BTCUSDT depth ')
+    assert lines[1].startswith('[Status] ETHUSDT trade ')
+    assert lines[1].endswith('| price 2500.10')
+
+    # 新周期没有消息，只剩最新值
+    assert stats.status_lines() == ['[Status] ETHUSDT price 2500.10']
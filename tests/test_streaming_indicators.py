@@ -0,0 +1,61 @@
+"""
+测试增量指标：逐根更新的结果与整段重算一致
+"""
+import numpy as np
+import pytest
+
+from indicators import TechnicalIndicators as TI
+from streaming import IndicatorRegistry, IndicatorSet
+
+
+def _klines(n, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 60000 + np.cumsum(rng.normal(0, 50, n))
+    high = close + rng.uniform(0, 30, n)
+    low = close - rng.uniform(0, 30, n)
+    return [(i * 60000, c, h, l, c, 1.0) for i, (h, l, c) in enumerate(zip(high, low, close))]
+
+
+def test_incremental_matches_batch():
+    klines = _klines(3000)
+    close = np.array([k[4] for k in klines])
+    high = np.array([k[2] for k in klines])
+    low = np.array([k[3] for k in klines])
+
+    state = IndicatorSet()
+    for k in klines:
+        state.update(k[0], k[2], k[3], k[4])
+
+    assert state.ema_12.value == pytest.approx(TI.ema_series(close, 12)[-1], rel=1e-10)
+    assert state.ema_26.value == pytest.approx(TI.ema_series(close, 26)[-1], rel=1e-10)
+    macd = TI.macd_series(close)
+    assert state.macd.macd == pytest.approx(macd['macd'][-1], abs=1e-7)
+    assert state.macd.signal.value == pytest.approx(macd['signal'][-1], abs=1e-7)
+    assert state.rsi.value == pytest.approx(TI.rsi_series(close)[-1], abs=1e-8)
+    assert state.atr.value == pytest.approx(TI.atr_series(high, low, close)[-1], rel=1e-9)
+
+    bands = TI.bollinger_series(close)
+    snapshot = state.snapshot()
+    assert snapshot['bollinger']['upper'] == pytest.approx(bands['upper'][-1], abs=0.01)
+    assert snapshot['bollinger']['lower'] == pytest.approx(bands['lower'][-1], abs=0.01)
+
+    # 与整段重算的结果格式一致
+    expected = TI.calculate_all_indicators(klines)
+    assert snapshot.keys() == expected.keys()
+    assert snapshot['macd']['trend'] == expected['macd']['trend']
+    assert snapshot['rsi'] == pytest.approx(expected['rsi'], abs=0.01)
+
+
+def test_registry_ignores_replayed_candles():
+    registry = IndicatorRegistry()
+    klines = _klines(40)
+
+    assert registry.seed('ETHUSDT', '1m', klines[:30]) == 30
+    assert registry.latest('ethusdt', '1m')['available']
+    # 重复推送的旧K线不会再次计入
+    assert registry.seed('ethusdt', '1m', klines[25:]) == 10
+
+    latest = registry.latest('ethusdt', '1m')
+    assert latest['candles'] == 40
+    assert latest['open_time'] == klines[-1][0]
+    assert registry.latest('ethusdt', '5m') is None
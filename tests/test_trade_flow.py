@@ -0,0 +1,126 @@
+"""
+测试滚动成交统计：窗口累计值与直接求和一致，分钟汇总与汇总表读取一致
+"""
+import numpy as np
+import pytest
+
+from database import connect
+from migrations import migrate
+from trade_flow import TradeFlow, TradeFlowRegistry
+from trade_rollup import CREATE_TABLE_SQL, MINUTE_UPSERT_SQL, flow_totals, load_minutes
+
+START = 1700000000000
+
+
+def _trades(n, seed=2):
+    rng = np.random.default_rng(seed)
+    timestamps = START + np.cumsum(rng.integers(0, 2000, n))
+    prices = 100 + np.cumsum(rng.normal(0, 0.05, n))
+    quantities = rng.exponential(1.0, n)
+    sells = rng.random(n) < 0.45
+    return list(zip(timestamps.tolist(), prices.tolist(), quantities.tolist(), sells.tolist()))
+
+
+def _expected(trades, now_ms, span):
+    # 窗口覆盖 (当前秒 - span, 当前秒]
+    now = now_ms // 1000
+    inside = [t for t in trades if now - span < t[0] // 1000 <= now]
+    buy = sum(q for _, _, q, m in inside if not m)
+    sell = sum(q for _, _, q, m in inside if m)
+    return buy, sell, len(inside)
+
+
+def test_windows_match_direct_sum():
+    trades = _trades(20000)
+    flow = TradeFlow()
+    minutes = []
+    for t in trades:
+        minutes += flow.add(*t)
+
+    now_ms = trades[-1][0]
+    for window, span in flow.windows.items():
+        buy, sell, count = _expected(trades, now_ms, span)
+        result = flow.snapshot(window, now_ms)
+        assert result['buy_volume'] == pytest.approx(buy, rel=1e-9)
+        assert result['sell_volume'] == pytest.approx(sell, rel=1e-9)
+        assert result['trades'] == count
+        assert result['complete']
+
+    # 没有新成交时，旧数据随时间移出窗口
+    later = flow.snapshot('1m', now_ms + 61000)
+    assert later['trades'] == 0 and later['volume'] == 0
+
+    # 分钟汇总覆盖除最后一分钟外的全部成交
+    assert sum(row[3] + row[4] for row in minutes) + flow.minute_row()[3] + flow.minute_row()[4] == len(trades)
+
+
+def test_seed_from_rollup_matches_live(tmp_path):
+    db = connect(str(tmp_path / 'flow.db'))
+    db.execute('''
+        CREATE TABLE trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, timestamp INTEGER,
+            price REAL, quantity REAL, is_buyer_maker INTEGER, trade_id INTEGER
+        )
+    ''')
+    db.execute(CREATE_TABLE_SQL)
+    db.commit()
+    migrate(db)
+
+    trades = _trades(5000)
+    live = TradeFlowRegistry()
+    minutes = []
+    for t in trades:
+        minutes += live.add('ethusdt', *t)
+    with db:
+        db.executemany('INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker) VALUES (?, ?, ?, ?, ?)',
+                       [('ethusdt',) + t for t in trades])
+        db.executemany(MINUTE_UPSERT_SQL, [('ethusdt',) + row for row in minutes])
+
+    now_ms = trades[-1][0]
+    buy, sell, count = _expected(trades, now_ms, 3600)
+    # 汇总表 + 最后一分钟的原始成交；窗口起点按分钟对齐，边界附近允许多出不到一分钟
+    totals = flow_totals(db, 'ethusdt', 3600 * 1000, now_ms)
+    aligned = [t for t in trades if t[0] >= (now_ms - 3600 * 1000) // 60000 * 60000]
+    assert totals['trades'] == len(aligned) >= count
+    assert totals['buy_volume'] == pytest.approx(sum(q for _, _, q, m in aligned if not m))
+    assert flow_totals(db, None, 3600 * 1000, now_ms)['trades'] == totals['trades']
+
+    # 冷启动：只用汇总表预热
+    seeded = TradeFlowRegistry()
+    seeded.seed('ethusdt', load_minutes(db, 'ethusdt', 0), since_ms=now_ms - 4 * 3600 * 1000)
+    result = seeded.snapshot('ethusdt', '4h', now_ms)
+    assert result['trades'] == sum(row[3] + row[4] for row in minutes)
+    assert result['complete']
+    # 覆盖范围不足一个窗口时标记为不完整，调用方应改读汇总表
+    partial = TradeFlowRegistry()
+    partial.seed('ethusdt', since_ms=now_ms - 600 * 1000)
+    assert not partial.snapshot('ethusdt', '1h', now_ms)['complete']
+    assert partial.snapshot('ethusdt', '5m', now_ms)['complete']
+    db.close()
+
+
+def test_flow_totals_without_rollup_table(tmp_path):
+    # 没有 trades_1m 的旧库直接读原始成交；全市场统计包含只有原始成交的交易对
+    db = connect(str(tmp_path / 'old.db'))
+    db.execute('''
+        CREATE TABLE trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, timestamp INTEGER,
+            price REAL, quantity REAL, is_buyer_maker INTEGER, trade_id INTEGER
+        )
+    ''')
+    trades = _trades(500)
+    now_ms = trades[-1][0]
+    with db:
+        db.executemany('INSERT INTO trades (symbol, timestamp, price, quantity, is_buyer_maker) VALUES (?, ?, ?, ?, ?)',
+                       [('ethusdt',) + t for t in trades] + [('btcusdt', now_ms, 50000.0, 2.0, 0)])
+    inside = [t for t in trades if t[0] >= now_ms - 3600 * 1000]
+    assert flow_totals(db, 'ethusdt', 3600 * 1000, now_ms)['trades'] == len(inside)
+    assert flow_totals(db, None, 3600 * 1000, now_ms)['trades'] == len(inside) + 1
+
+    # 有汇总表但某个交易对还没有汇总行时，同样按原始成交计入全市场统计
+    db.execute(CREATE_TABLE_SQL)
+    migrate(db)
+    with db:
+        db.execute(MINUTE_UPSERT_SQL, ('solusdt', now_ms // 60000 * 60000 - 60000, 1.0, 1.0, 3, 4, 200.0))
+    assert flow_totals(db, None, 3600 * 1000, now_ms)['trades'] == len(inside) + 1 + 7
+    db.close()